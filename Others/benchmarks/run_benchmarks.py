@@ -0,0 +1,353 @@
+import io
+import os
+import sys
+import json
+import builtins
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import statistics
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))  # Others/
+
+import image_mapper as im
+from prefetch_io import IO_THREADS
+from synthetic_data import generate_tree, generate_pdf, fitz
+
+# --- Configuration ---
+DEFAULT_SCALES = (1,)
+DEFAULT_REPEAT = 3
+PDF_PAGES = 12
+CROPS_PER_PAGE = 3
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+RENDER_TIMEOUT = 60  # seconds to wait for one renderer result
+SLOW_FS_DELAY_MS = 2  # round-trip added to every stat/listing/open/rename in the slow_drive suite
+SUITES = ("parse", "update", "pair", "batch", "slow_drive", "cropper")
+
+def timed(fn, repeat=DEFAULT_REPEAT, setup=None):
+    """Runs fn() repeat times (setup() untimed before each) and returns (best, median) seconds."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times), statistics.median(times)
+
+def entry(name, scale, items, times, **extra):
+    best, median = times
+    row = {"name": name, "scale": scale, "items": items, "best_sec": round(best, 6), "median_sec": round(median, 6),
+           "per_item_us": round(best / items * 1e6, 3) if items else None}
+    row.update(extra)
+    return row
+
+def _image_names(image_root):
+    names = []
+    for dirpath, _, filenames in os.walk(image_root):
+        names.extend(n for n in filenames if os.path.splitext(n)[1].lower() in im.IMAGE_EXTENSIONS)
+    return names
+
+# --- Mapper benchmarks ---
+def bench_parse(stats, repeat):
+    names = _image_names(stats["image_root"])
+
+    def clear():
+        im._parse_name.cache_clear()
+        im.image_sort_key.cache_clear()
+
+    def parse_all():
+        for name in names:
+            im.parse_image_name(name)
+
+    rows = [entry("parse_image_name.cold", stats["scale"], len(names), timed(parse_all, repeat, clear))]
+    parse_all()
+    rows.append(entry("parse_image_name.warm", stats["scale"], len(names), timed(parse_all, repeat)))
+    rows.append(entry("parse_many.warm", stats["scale"], len(names), timed(lambda: im.parse_many(names), repeat)))
+    return rows
+
+def _largest_pair(stats):
+    pairs, _, _ = im.discover_pairs(stats["data_root"], stats["image_root"])
+    return max(pairs, key=lambda p: len(os.listdir(p[1])))
+
+def bench_update_entry(stats, repeat):
+    json_path, img_dir = _largest_pair(stats)
+    parsed = im.parse_many(sorted(os.listdir(img_dir))).records()
+    mapper = im.ImageMapper(json_path)
+
+    def one_by_one():
+        for p in parsed:
+            mapper.update_entry(p)
+
+    rows = [entry("update_entry.per_image", stats["scale"], len(parsed), timed(one_by_one, repeat, mapper.load_data))]
+    rows.append(entry("apply_images.bulk", stats["scale"], len(parsed),
+                      timed(lambda: mapper.apply_images(parsed), repeat, mapper.load_data)))
+    return rows
+
+def bench_process_pair(stats, repeat, workdir):
+    json_path, img_dir = _largest_pair(stats)
+    scratch = Path(workdir) / "pair.json"
+    n_images = len(os.listdir(img_dir))
+
+    def fresh_copy():
+        shutil.copyfile(json_path, scratch)
+
+    return [
+        entry("process_pair.dry_run", stats["scale"], n_images,
+              timed(lambda: im.map_pair(json_path, img_dir, dry_run=True), repeat)),
+        entry("process_pair.save", stats["scale"], n_images,
+              timed(lambda: im.map_pair(scratch, img_dir), repeat, fresh_copy)),
+    ]
+
+def bench_batch(stats, repeat, workdir, workers):
+    data_copy = Path(workdir) / "batch_data"
+    manifest = Path(workdir) / "batch_manifest.json"
+
+    def fresh_tree():
+        shutil.rmtree(data_copy, ignore_errors=True)
+        shutil.copytree(stats["data_root"], data_copy)
+        if manifest.exists():
+            manifest.unlink()
+
+    def run(n_workers, dry_run=False, use_manifest=True):
+        report = im.run_batch(data_copy, stats["image_root"], dry_run=dry_run, workers=n_workers,
+                              manifest_path=manifest if use_manifest else None)
+        assert not report["totals"].get("error"), report["totals"]
+
+    rows = []
+    scale, chapters = stats["scale"], stats["chapters"]
+    fresh_tree()
+    rows.append(entry("batch.dry_run.workers_1", scale, chapters, timed(lambda: run(1, dry_run=True), repeat)))
+    for n in sorted({1, workers}):
+        rows.append(entry(f"batch.cold.workers_{n}", scale, chapters, timed(lambda: run(n), repeat, fresh_tree)))
+    # Manifest already written by the last cold run: every chapter should be skipped
+    rows.append(entry(f"batch.noop_manifest.workers_{workers}", scale, chapters, timed(lambda: run(workers), repeat)))
+    return rows
+
+@contextmanager
+def slow_fs(delay_ms=SLOW_FS_DELAY_MS):
+    """
+    Simulates a synced/network drive in this process: os.stat, os.scandir,
+    os.open, open, os.replace and os.fsync sleep delay_ms first. Sleeping
+    releases the GIL, so concurrent calls overlap like real round-trips.
+    """
+    delay = delay_ms / 1000
+    targets = [(os, "stat"), (os, "scandir"), (os, "open"), (os, "replace"), (os, "fsync"),
+               (builtins, "open"), (io, "open")]
+    originals = [(module, name, getattr(module, name)) for module, name in targets]
+
+    def delayed(fn):
+        def call(*args, **kwargs):
+            time.sleep(delay)
+            return fn(*args, **kwargs)
+        return call
+
+    for module, name, fn in originals:
+        setattr(module, name, delayed(fn))
+    try:
+        yield
+    finally:
+        for module, name, fn in originals:
+            setattr(module, name, fn)
+
+def bench_slow_drive(stats, repeat, workdir, delay_ms=SLOW_FS_DELAY_MS):
+    """run_batch in-process on a simulated slow drive: one call at a time vs. PrefetchIO threads."""
+    data_copy = Path(workdir) / "slow_drive_data"
+    manifest = Path(workdir) / "slow_drive_manifest.json"
+
+    def fresh_tree():
+        shutil.rmtree(data_copy, ignore_errors=True)
+        shutil.copytree(stats["data_root"], data_copy)
+        if manifest.exists():
+            manifest.unlink()
+
+    def run(io_threads):
+        with slow_fs(delay_ms):
+            report = im.run_batch(data_copy, stats["image_root"], workers=1, manifest_path=manifest,
+                                  io_threads=io_threads)
+        assert not report["totals"].get("error"), report["totals"]
+
+    rows = []
+    scale, chapters = stats["scale"], stats["chapters"]
+    for n in (0, IO_THREADS):
+        rows.append(entry(f"slow_drive.cold.io_threads_{n}", scale, chapters,
+                          timed(lambda: run(n), repeat, fresh_tree), delay_ms=delay_ms))
+        rows.append(entry(f"slow_drive.noop.io_threads_{n}", scale, chapters,
+                          timed(lambda: run(n), repeat), delay_ms=delay_ms))
+    return rows
+
+# --- Cropper benchmarks ---
+def _wait_for(renderer, kind):
+    deadline = time.perf_counter() + RENDER_TIMEOUT
+    while time.perf_counter() < deadline:
+        try:
+            result_kind, _, payload = renderer.results.get(timeout=RENDER_TIMEOUT)
+        except Exception:
+            break
+        if result_kind in ("error", "export_failed"):
+            raise RuntimeError(f"Renderer error: {payload}")
+        if result_kind == kind:
+            return payload
+    raise TimeoutError(f"No '{kind}' result from the renderer")
+
+def bench_cropper(workdir, repeat, zoom=1.5):
+    """PDFCropperApp's render thread (PageRenderer) on a generated PDF: cold pages, cache hits, crop exports."""
+    if fitz is None:
+        return []
+    pdf_path = Path(workdir) / "bank.pdf"
+    if not pdf_path.exists():
+        generate_pdf(pdf_path, PDF_PAGES)
+    # pdf_screenshot_tool creates its SAVE_FOLDER on import; keep that inside the work dir
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import pdf_screenshot_tool as cropper
+    finally:
+        os.chdir(cwd)
+
+    out_dir = Path(workdir) / "crops"
+    out_dir.mkdir(exist_ok=True)
+    rows = []
+
+    @contextmanager
+    def rendered(disk_cache=None):
+        """A PageRenderer with every page rendered; closed (thread and writers stopped) on exit."""
+        renderer = cropper.PageRenderer(cache_pages=PDF_PAGES, disk_cache=disk_cache)
+        try:
+            renderer.open(str(pdf_path))
+            _wait_for(renderer, "opened")
+            for page in range(PDF_PAGES):
+                renderer.request(page, zoom)
+                _wait_for(renderer, "page")
+            yield renderer
+        finally:
+            renderer.close()
+
+    def render_all(disk_cache=None):
+        with rendered(disk_cache):
+            pass
+
+    rows.append(entry("cropper.render_page.cold", None, PDF_PAGES, timed(render_all, repeat), zoom=zoom))
+    # Reopening in a new session: empty memory cache, every page read back from the disk cache
+    disk_cache = cropper.RenderCache(Path(workdir) / "render_cache")
+    render_all(disk_cache)  # close() waits for the tile writes
+    rows.append(entry("cropper.render_page.disk_reopen", None, PDF_PAGES,
+                      timed(lambda: render_all(disk_cache), repeat), zoom=zoom))
+    clips = [(page, (60, 40 + k * 240, 300, 220 + k * 240)) for page in range(PDF_PAGES) for k in range(CROPS_PER_PAGE)]
+    with rendered() as renderer:
+        rows.append(entry("cropper.render_page.cached", None, PDF_PAGES,
+                          timed(lambda: [renderer.get_cached(p, zoom) for p in range(PDF_PAGES)], repeat), zoom=zoom))
+
+        def export_all():
+            for n, (page, clip) in enumerate(clips):
+                renderer.export(page, clip, cropper.EXPORT_DPI, out_dir / f"q{n + 1}_qu_1.png")
+                _wait_for(renderer, "exported")
+
+        rows.append(entry("cropper.export_crop", None, len(clips), timed(export_all, repeat),
+                          dpi=cropper.EXPORT_DPI, optimized=cropper.OPTIMIZE_EXPORTS))
+    return rows
+
+# --- Harness ---
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).resolve().parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def compare(current, previous_path):
+    """Prints best-time ratios against an earlier results file (>1.0 means slower now)."""
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = {(r["name"], r["scale"]): r for r in json.load(f)["benchmarks"]}
+    for row in current["benchmarks"]:
+        old = previous.get((row["name"], row["scale"]))
+        if old and old["best_sec"]:
+            ratio = row["best_sec"] / old["best_sec"]
+            flag = "  <-- slower" if ratio > 1.1 else ""
+            print(f"{row['name']:<36} x{row['scale'] or '-'!s:<5} {old['best_sec']:>10.4f}s -> {row['best_sec']:>10.4f}s"
+                  f"  ({ratio:.2f}){flag}", file=sys.stderr)
+
+def run_benchmarks(scales=DEFAULT_SCALES, repeat=DEFAULT_REPEAT, workers=im.DEFAULT_WORKERS, workdir=None,
+                   suites=SUITES):
+    """Generates (or reuses) one synthetic tree per scale and runs the selected suites. Returns a results dict."""
+    own_workdir = workdir is None
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="paper_nest_bench_"))
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workers": workers,
+            "repeat": repeat,
+        },
+        "datasets": [],
+        "benchmarks": [],
+    }
+    try:
+        for scale in scales:
+            tree = workdir / f"scale_{scale}"
+            started = time.perf_counter()
+            stats = generate_tree(tree, scale)
+            stats["generate_sec"] = round(time.perf_counter() - started, 3)
+            results["datasets"].append(stats)
+            print(f"Dataset x{scale}: {stats['chapters']} chapters, {stats['questions']} questions, "
+                  f"{stats['images']} images", file=sys.stderr)
+            scratch = tree / "scratch"
+            scratch.mkdir(exist_ok=True)
+            if "parse" in suites:
+                results["benchmarks"] += bench_parse(stats, repeat)
+            if "update" in suites:
+                results["benchmarks"] += bench_update_entry(stats, repeat)
+            if "pair" in suites:
+                results["benchmarks"] += bench_process_pair(stats, repeat, scratch)
+            if "batch" in suites:
+                results["benchmarks"] += bench_batch(stats, repeat, scratch, workers)
+            if "slow_drive" in suites:
+                results["benchmarks"] += bench_slow_drive(stats, repeat, scratch)
+        if "cropper" in suites:
+            cropper_dir = workdir / "cropper"
+            cropper_dir.mkdir(exist_ok=True)
+            results["benchmarks"] += bench_cropper(cropper_dir, repeat)
+    finally:
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the image mapper and PDF cropper on synthetic data.")
+    parser.add_argument("--scales", type=float, nargs="+", default=list(DEFAULT_SCALES),
+                        help="Dataset sizes relative to the real corpus, e.g. 1 5 50")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--workers", type=int, default=im.DEFAULT_WORKERS)
+    parser.add_argument("--suites", nargs="+", default=list(SUITES), choices=SUITES)
+    parser.add_argument("--workdir", help="Keep generated datasets here and reuse them across runs")
+    parser.add_argument("--out", help=f"Results file (default: {RESULTS_DIR.name}/<commit>_<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    scales = [int(s) if float(s).is_integer() else s for s in args.scales]
+    results = run_benchmarks(scales, args.repeat, args.workers, args.workdir, tuple(args.suites))
+    for row in results["benchmarks"]:
+        per_item = f"{row['per_item_us']:>10.2f} us/item" if row["per_item_us"] is not None else ""
+        print(f"{row['name']:<36} x{row['scale'] or '-'!s:<5} {row['best_sec']:>10.4f}s {per_item}", file=sys.stderr)
+
+    out = Path(args.out) if args.out else RESULTS_DIR / (
+        f"{results['meta']['commit'] or 'nogit'}_{results['meta']['timestamp'].replace(':', '')}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {out}", file=sys.stderr)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import sys
+import json
+import random
+import argparse
+from pathlib import Path
+
+try:
+    import fitz  # PyMuPDF, only needed for generate_pdf
+except ImportError:
+    fitz = None
+
+# --- Configuration ---
+# Shape of the real corpus (backend/data/data + Questions_Image_Data) at 1x
+CORPUS_CHAPTERS = 221
+QUESTIONS_PER_CHAPTER = (10, 164)   # uniform range, mean ~87 like the real files
+IMAGE_RATES = {                     # share of questions with images, and images per such question
+    "question_images": (0.105, (1, 2)),
+    "option_images": (0.018, (4, 5)),
+    "solution_images": (0.076, (1, 2)),
+}
+TEXT_LENGTHS = {"question": (40, 200), "solution": (60, 280), "option": (5, 40)}
+SUBJECT_DIRS = [(exam, cls, subject)
+                for exam in ("CET", "JEE", "NEET")
+                for cls in ("11", "12")
+                for subject in ("Physics", "Chemistry", "Maths", "Biology")]
+MAPPED_FRACTION = 0.5               # images already referenced in the JSON before mapping
+NOISE_FILES = ("scan_0001.png", "notes.png")  # unparseable names every folder has a few of
+MARKER_NAME = "synthetic.json"
+# Smallest valid PNG (1x1 grayscale), written for every image so Pillow-based tools can open them
+PNG_1X1 = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010800000000"
+    "3a7e9b550000000a49444154789c63f8ff1f0003ff01ff8b5e8e2b0000000049454e44ae426082"
+)
+
+_WORDS = ("force", "energy", "wave", "atom", "bond", "cell", "matrix", "limit", "field", "charge",
+          "motion", "acid", "enzyme", "graph", "vector", "orbit", "lens", "gene", "ion", "series")
+
+def _text(rng, length_range):
+    target = rng.randint(*length_range)
+    words = []
+    while sum(len(w) + 1 for w in words) < target:
+        words.append(rng.choice(_WORDS))
+    return " ".join(words)
+
+def _image_names(q_id, category, count):
+    if category == "question_images":
+        return [f"q{q_id}_qu_{k}.png" for k in range(1, count + 1)]
+    if category == "option_images":
+        return [f"{q_id}_op_{k}.PNG" if k % 2 else f"q{q_id}_op{k}_1.png" for k in range(1, count + 1)]
+    return [f"{q_id}_soD.jpg"] + [f"{q_id}_so_{k}.png" for k in range(2, count + 1)]
+
+def generate_chapter(rng, n_questions):
+    """Returns (questions, images): question dicts shaped like the real files and the image names they use."""
+    questions = []
+    images = []
+    for q_id in range(1, n_questions + 1):
+        options = [_text(rng, TEXT_LENGTHS["option"]) for _ in range(4)]
+        question = {
+            "id": q_id,
+            "chapter": "Chapter 1",
+            "question": _text(rng, TEXT_LENGTHS["question"]),
+            "question_latex": "",
+            "options": options,
+            "answer": rng.choice(options),
+            "solution": _text(rng, TEXT_LENGTHS["solution"]),
+            "difficulty": rng.choice(("easy", "medium", "hard", "Easy", "Medium")),
+            "marks": rng.choice((1, 4)),
+            "question_images": [],
+            "option_images": [],
+            "solution_images": [],
+        }
+        question["question_latex"] = question["question"]
+        for category, (rate, count_range) in IMAGE_RATES.items():
+            if rng.random() < rate:
+                names = _image_names(q_id, category, rng.randint(*count_range))
+                images.extend(names)
+                question[category] = [n for n in names if rng.random() < MAPPED_FRACTION]
+        questions.append(question)
+    return questions, images
+
+def generate_tree(root, scale=1.0, seed=0):
+    """
+    Writes <root>/data/<EXAM>/<CLASS>/<Subject>/<Chapter>.json and matching
+    <root>/Questions_Image_Data/<EXAM>/<CLASS>/<Subject>/<N. Chapter>/ folders
+    with scale x the real corpus' chapter count. Returns a stats dict (also
+    stored as <root>/synthetic.json, so an existing tree is reused).
+    """
+    root = Path(root)
+    marker = root / MARKER_NAME
+    if marker.exists():
+        stats = json.loads(marker.read_text(encoding="utf-8"))
+        if stats.get("scale") == scale and stats.get("seed") == seed:
+            return stats
+
+    rng = random.Random(seed)
+    data_root = root / "data"
+    image_root = root / "Questions_Image_Data"
+    stats = {"scale": scale, "seed": seed, "data_root": str(data_root), "image_root": str(image_root),
+             "chapters": 0, "questions": 0, "images": 0, "json_bytes": 0}
+    n_chapters = max(1, round(CORPUS_CHAPTERS * scale))
+    for n in range(n_chapters):
+        exam, cls, subject = SUBJECT_DIRS[n % len(SUBJECT_DIRS)]
+        words = [rng.choice(_WORDS).title() for _ in range(2)]
+        stem = f"{words[0]}_{words[1]}_{n}"
+        json_dir = data_root / exam / cls / subject
+        img_dir = image_root / exam / cls / subject / f"{n // len(SUBJECT_DIRS) + 1}. {words[0]} {words[1]} {n}"
+        json_dir.mkdir(parents=True, exist_ok=True)
+        img_dir.mkdir(parents=True, exist_ok=True)
+
+        questions, images = generate_chapter(rng, rng.randint(*QUESTIONS_PER_CHAPTER))
+        payload = json.dumps(questions, indent=4, ensure_ascii=False).encode("utf-8")
+        (json_dir / f"{stem}.json").write_bytes(payload)
+        for name in images + list(NOISE_FILES):
+            (img_dir / name).write_bytes(PNG_1X1)
+
+        stats["chapters"] += 1
+        stats["questions"] += len(questions)
+        stats["images"] += len(images)
+        stats["json_bytes"] += len(payload)
+
+    marker.write_text(json.dumps(stats, indent=4), encoding="utf-8")
+    return stats
+
+def generate_pdf(path, pages=20, questions_per_page=6, seed=0):
+    """Writes a question-bank-like PDF (numbered questions, options, a figure each). Needs PyMuPDF."""
+    if fitz is None:
+        raise RuntimeError("PyMuPDF (fitz) is not installed")
+    rng = random.Random(seed)
+    doc = fitz.open()
+    q_id = 1
+    for _ in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4 in points
+        y = 50
+        step = (842 - 100) / questions_per_page
+        for _ in range(questions_per_page):
+            page.insert_text((50, y + 12), f"{q_id}. {_text(rng, (60, 90))}", fontsize=10)
+            page.draw_rect(fitz.Rect(70, y + 22, 230, y + step - 40), color=(0, 0, 0), width=1)
+            page.draw_circle(fitz.Point(150, y + step / 2 - 10), 20, color=(0, 0, 0))
+            for k, label in enumerate("abcd"):
+                page.insert_text((260 + k * 75, y + step - 25), f"({label}) {_text(rng, (5, 9))}", fontsize=9)
+            y += step
+            q_id += 1
+    doc.save(str(path))
+    doc.close()
+    return {"pdf": str(path), "pages": pages, "questions": q_id - 1}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic data tree (and PDF) for the benchmarks.")
+    parser.add_argument("out", help="Directory to generate into")
+    parser.add_argument("--scale", type=float, default=1.0, help="Size relative to the real corpus (1 to 50)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pdf-pages", type=int, default=0, help="Also write <out>/bank.pdf with this many pages")
+    args = parser.parse_args(argv)
+
+    stats = generate_tree(args.out, args.scale, args.seed)
+    if args.pdf_pages:
+        stats["pdf"] = generate_pdf(Path(args.out) / "bank.pdf", args.pdf_pages, seed=args.seed)
+    print(json.dumps(stats, indent=4))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
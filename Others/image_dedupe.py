@@ -0,0 +1,391 @@
+import os
+import sys
+import json
+import time
+import argparse
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from image_mapper import (ImageMapper, discover_pairs, atomic_write_bytes, parse_image_name, IMAGE_EXTENSIONS,
+                          IMAGE_CATEGORIES, DEFAULT_JSON_ROOT, DEFAULT_IMAGE_ROOT, DEFAULT_WORKERS)
+
+# --- Configuration ---
+INDEX_NAME = ".phash_index.json"   # stored in the image root
+INDEX_VERSION = 1
+HASH_SIZE = 8                      # 8x8 -> 64-bit hashes
+PHASH_SIZE = 32                    # pHash DCT input size
+DEFAULT_THRESHOLD = 4              # max pHash and dHash Hamming distance for a near-duplicate
+DUPLICATES_DIR = ".duplicates"     # rewritten duplicates are moved here (ignored by the mapper)
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+_DCT = _dct_matrix(PHASH_SIZE)
+_BIT_WEIGHTS = (1 << np.arange(HASH_SIZE * HASH_SIZE - 1, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+def _bits_to_int(bits):
+    """(N, 64) bool -> list of python ints."""
+    return [int(v) for v in (bits.astype(np.uint64) * _BIT_WEIGHTS).sum(axis=1, dtype=np.uint64)]
+
+def load_gray(path, size):
+    """Grayscale float array of the image downscaled to size (w, h)."""
+    with Image.open(path) as img:
+        img.draft("L", (size[0] * 4, size[1] * 4))  # cheap JPEG downscale when possible
+        return np.asarray(img.convert("L").resize(size, Image.LANCZOS), dtype=np.float32)
+
+def hash_arrays(dhash_pixels, phash_pixels):
+    """
+    Vectorized hashes for a batch.
+    dhash_pixels: (N, 8, 9) arrays; phash_pixels: (N, 32, 32) arrays.
+    Returns (dhashes, phashes) as lists of ints.
+    """
+    dbits = (dhash_pixels[:, :, 1:] > dhash_pixels[:, :, :-1]).reshape(len(dhash_pixels), -1)
+    coeffs = np.einsum('ij,njk,lk->nil', _DCT, phash_pixels, _DCT)[:, :HASH_SIZE, :HASH_SIZE]
+    flat = coeffs.reshape(len(coeffs), -1)
+    medians = np.median(flat[:, 1:], axis=1, keepdims=True)  # skip the DC term
+    pbits = flat > medians
+    return _bits_to_int(dbits), _bits_to_int(pbits)
+
+def hash_files(paths):
+    """Hashes a batch of files (runs in worker processes). Returns {path: (dhash, phash) or None}."""
+    ok_paths, dpix, ppix = [], [], []
+    results = {}
+    for p in paths:
+        try:
+            dpix.append(load_gray(p, (HASH_SIZE + 1, HASH_SIZE)))
+            ppix.append(load_gray(p, (PHASH_SIZE, PHASH_SIZE)))
+            ok_paths.append(p)
+        except Exception:
+            results[p] = None
+    if ok_paths:
+        dh, ph = hash_arrays(np.stack(dpix), np.stack(ppix))
+        for p, d, h in zip(ok_paths, dh, ph):
+            results[p] = (d, h)
+    return results
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+class BKTree:
+    """BK-tree over 64-bit hashes with Hamming distance; finds all items within a radius."""
+    def __init__(self):
+        self.root = None  # [hash, [items], {distance: child}]
+
+    def add(self, h, item):
+        if self.root is None:
+            self.root = [h, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [item], {}]
+                return
+            node = child
+
+    def query(self, h, radius):
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                found.extend(node[1])
+            for dist, child in node[2].items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        return found
+
+# --- Persistent index ---
+class HashIndex:
+    """
+    {relative image path: [mtime_ns, size, dhash_hex, phash_hex]} cached next to the images.
+    Unreadable files are cached with null hashes so they are not retried until they change.
+    """
+    def __init__(self, image_root, path=None):
+        self.image_root = Path(image_root)
+        self.path = Path(path) if path else self.image_root / INDEX_NAME
+        self.images = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    raw = json.load(f)
+                if raw.get("version") == INDEX_VERSION:
+                    self.images = raw.get("images", {})
+            except Exception:
+                self.images = {}
+
+    def refresh(self, workers=DEFAULT_WORKERS, batch_size=128):
+        """Hashes new or modified images, drops deleted ones. Returns (hashed, reused)."""
+        current = {}
+        for dirpath, dirnames, filenames in os.walk(self.image_root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    full = os.path.join(dirpath, name)
+                    st = os.stat(full)
+                    current[Path(full).relative_to(self.image_root).as_posix()] = (st.st_mtime_ns, st.st_size)
+
+        todo = [rel for rel, (mtime, size) in current.items()
+                if rel not in self.images or self.images[rel][:2] != [mtime, size]]
+        fresh = {rel: entry for rel, entry in self.images.items() if rel in current and rel not in todo}
+        reused = len(fresh)
+
+        full_paths = [str(self.image_root / rel) for rel in todo]
+        batches = [full_paths[i:i + batch_size] for i in range(0, len(full_paths), batch_size)]
+        hashed = {}
+        if workers <= 1 or len(batches) <= 1:
+            for batch in batches:
+                hashed.update(hash_files(batch))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for part in pool.map(hash_files, batches):
+                    hashed.update(part)
+
+        for rel, full in zip(todo, full_paths):
+            if hashed.get(full):
+                d, p = hashed[full]
+                fresh[rel] = [current[rel][0], current[rel][1], f"{d:016x}", f"{p:016x}"]
+            else:
+                fresh[rel] = [current[rel][0], current[rel][1], None, None]
+        self.images = fresh
+        return len(todo), reused
+
+    def save(self):
+        payload = json.dumps({"version": INDEX_VERSION, "images": self.images}, separators=(',', ':'))
+        atomic_write_bytes(self.path, payload.encode('utf-8'))
+
+def find_duplicate_groups(images, threshold=DEFAULT_THRESHOLD):
+    """
+    Groups near-identical images (pHash and dHash distance both <= threshold)
+    with a BK-tree over the pHashes instead of comparing all pairs.
+    Returns sorted lists of relative paths. These are candidates only: images
+    that differ in one digit can hash identically (see exact_matches).
+    """
+    tree = BKTree()
+    parent = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for rel in sorted(images):
+        if images[rel][3] is None:
+            continue
+        phash = int(images[rel][3], 16)
+        dhash = int(images[rel][2], 16)
+        parent[rel] = rel
+        for other in tree.query(phash, threshold):
+            if hamming(dhash, int(images[other][2], 16)) > threshold:
+                continue
+            ra, rb = find(rel), find(other)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+        tree.add(phash, rel)
+
+    groups = {}
+    for rel in parent:
+        groups.setdefault(find(rel), []).append(rel)
+    return [sorted(g) for g in groups.values() if len(g) > 1]
+
+# --- Reference rewriting ---
+def same_pixels(path_a, path_b):
+    """True if both files decode to the same size and RGBA pixels."""
+    try:
+        with Image.open(path_a) as a, Image.open(path_b) as b:
+            if a.size != b.size:
+                return False
+            return np.array_equal(np.asarray(a.convert("RGBA")), np.asarray(b.convert("RGBA")))
+    except Exception:
+        return False
+
+def exact_matches(img_dir, names):
+    """
+    Splits a near-duplicate group (names in one folder) into classes of
+    files with identical bytes or identical decoded pixels. Returns the
+    classes with more than one name, each sorted.
+    """
+    by_digest = {}
+    for name in sorted(names):
+        try:
+            with open(Path(img_dir) / name, 'rb') as f:
+                digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        except OSError:
+            continue
+        by_digest.setdefault(digest, []).append(name)
+    classes = []
+    for same_bytes in by_digest.values():
+        for cls in classes:
+            if same_pixels(Path(img_dir) / cls[0], Path(img_dir) / same_bytes[0]):
+                cls.extend(same_bytes)
+                break
+        else:
+            classes.append(list(same_bytes))
+    return [sorted(cls) for cls in classes if len(cls) > 1]
+
+def _split_by_question(names, owners):
+    """
+    Splits an exact-match class so no two names of one part belong to the
+    same question (by name or by reference): merging those would collapse
+    e.g. two options of a question into one. owners: name -> set of question ids.
+    """
+    parts = []
+    for name in names:
+        for part, taken in parts:
+            if not owners[name] & taken:
+                part.append(name)
+                taken |= owners[name]
+                break
+        else:
+            parts.append(([name], set(owners[name])))
+    return [part for part, _ in parts if len(part) > 1]
+
+def rewrite_references(groups, data_root, image_root, dry_run=False):
+    """
+    Points *_images references at one canonical file per set of exact
+    duplicates. Image names are resolved per chapter folder by the backend
+    (Questions_Image_Data/<exam>/<class>/<subject>/<chapter>/<name>), so only
+    duplicates inside the same chapter folder can share a file; cross-chapter
+    duplicates are left alone. Within a folder only files with identical
+    bytes or pixels are merged, and never two from the same question;
+    near-matches are only counted. Once the JSON is saved, duplicates whose
+    references were rewritten are moved to DUPLICATES_DIR so the next
+    mapping run does not add them back; unreferenced ones stay in place.
+    """
+    image_root = Path(image_root)
+    pairs, _, _ = discover_pairs(data_root, image_root)
+    json_for_dir = {Path(img_dir).resolve(): json_path for json_path, img_dir in pairs}
+    report = {"chapters": 0, "references": 0, "moved": 0, "cross_chapter_groups": 0,
+              "near_matches": 0, "same_question": 0, "unreferenced": 0, "errors": []}
+
+    by_chapter = {}
+    for group in groups:
+        folders = {}
+        for rel in group:
+            folders.setdefault(str(Path(rel).parent), []).append(Path(rel).name)
+        if len(folders) > 1:
+            report["cross_chapter_groups"] += 1
+        for folder, names in folders.items():
+            if len(names) > 1:
+                by_chapter.setdefault(folder, []).append(sorted(names))
+
+    for folder, name_groups in by_chapter.items():
+        img_dir = (image_root / folder).resolve()
+        json_path = json_for_dir.get(img_dir)
+        if not json_path:
+            continue
+        mapper = ImageMapper(json_path)
+        owners = {}
+        for question in mapper.data:
+            if isinstance(question, dict):
+                for category in IMAGE_CATEGORIES:
+                    for name in question.get(category) or []:
+                        owners.setdefault(name, set()).add(question.get("id"))
+
+        replace = {}
+        for names in name_groups:
+            exact = exact_matches(img_dir, names)
+            report["near_matches"] += len(names) - sum(len(cls) for cls in exact)
+            for cls in exact:
+                for name in cls:
+                    parsed, _ = parse_image_name(name)
+                    owners.setdefault(name, set()).add(parsed["q_id"] if parsed else name)
+                parts = _split_by_question(cls, owners)
+                report["same_question"] += len(cls) - sum(len(part) for part in parts)
+                replace.update({dup: part[0] for part in parts for dup in part[1:]})
+        if not replace:
+            continue
+
+        changed = 0
+        rewritten_dups = set()
+        for question in mapper.data:
+            if not isinstance(question, dict):
+                continue
+            for category in IMAGE_CATEGORIES:
+                current = question.get(category)
+                if not current or not any(name in replace for name in current):
+                    continue
+                rewritten = []
+                for name in current:
+                    if name in replace:
+                        rewritten_dups.add(name)
+                    name = replace.get(name, name)
+                    if name not in rewritten:
+                        rewritten.append(name)
+                changed += sum(1 for name in current if name in replace)
+                question[category] = rewritten
+        # Not referenced yet (the mapper has not picked them up): moving them would lose their question's image
+        report["unreferenced"] += len(set(replace) - rewritten_dups)
+        if changed and not dry_run:
+            success, msg = mapper.save_json()
+            if not success:
+                report["errors"].append({"json": str(json_path), "error": msg})
+                continue
+            dup_dir = img_dir / DUPLICATES_DIR
+            dup_dir.mkdir(exist_ok=True)
+            for dup in sorted(rewritten_dups):
+                if (img_dir / dup).exists():
+                    os.replace(img_dir / dup, dup_dir / dup)
+                    report["moved"] += 1
+        report["chapters"] += 1 if changed else 0
+        report["references"] += changed
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find near-duplicate question images with perceptual hashes.")
+    parser.add_argument("--image-root", default=DEFAULT_IMAGE_ROOT)
+    parser.add_argument("--data-root", default=DEFAULT_JSON_ROOT)
+    parser.add_argument("--index", help=f"Hash index path (default: <image root>/{INDEX_NAME})")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD, help="Max pHash/dHash Hamming distance")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rewrite", action="store_true",
+                        help="Point exact same-chapter duplicates (same bytes or pixels, different "
+                             "questions) at one canonical file in the chapter JSON")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--report", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    index = HashIndex(args.image_root, args.index)
+    hashed, reused = index.refresh(workers=args.workers)
+    index.save()
+    groups = find_duplicate_groups(index.images, args.threshold)
+    report = {
+        "image_root": str(args.image_root),
+        "images": len(index.images),
+        "unreadable": sum(1 for entry in index.images.values() if entry[3] is None),
+        "hashed": hashed,
+        "reused": reused,
+        "threshold": args.threshold,
+        "groups": groups,
+    }
+    if args.rewrite:
+        report["rewrite"] = rewrite_references(groups, args.data_root, args.image_root, dry_run=args.dry_run)
+    report["elapsed_sec"] = round(time.perf_counter() - started, 3)
+
+    dup_files = sum(len(g) - 1 for g in groups)
+    print(f"{report['images']} images ({hashed} hashed, {reused} cached, {report['unreadable']} unreadable): "
+          f"{len(groups)} near-duplicate groups, "
+          f"{dup_files} candidate files in {report['elapsed_sec']}s", file=sys.stderr)
+    if "rewrite" in report:
+        print(f"Rewrite: {report['rewrite']}", file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    return 1 if report.get("rewrite", {}).get("errors") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,289 @@
 import json
 import re
 import os
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
-import datetime
+import csv
+import sys
+import time
+import argparse
+import hashlib
+import difflib
+import shutil
+import tempfile
+from array import array
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+from zip_packager import package_data_zip
+from metrics import Metrics, format_metrics, write_trace, profiled
+from prefetch_io import PrefetchIO, IO_THREADS
+
+try:
+    import orjson  # optional, speeds up the compact output format
+except ImportError:
+    orjson = None
+
 # --- Configuration ---
 # Default paths (can be changed in GUI)
 DEFAULT_JSON_ROOT = r"C:\BisugenTech\Projects\01_Paper-Nest\backend\data\data"
 DEFAULT_IMAGE_ROOT = r"C:\BisugenTech\Projects\01_Paper-Nest\backend\data\Questions_Image_Data"
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+NEW_FILE_MODE = 0o644
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Chapter aliases shared with the backend's S3 folder lookup (s3PathHelper.js)
+DEFAULT_ALIAS_MAP = Path(__file__).resolve().parent.parent / "backend" / "src" / "config" / "chapterFolderMap.json"
+FUZZY_CUTOFF = 0.85
+JSON_FORMATS = ("indent", "compact")  # "indent" matches the hand-edited files, "compact" is for machine-consumed output
+MANIFEST_NAME = ".image_mapper_manifest.json"  # stored next to the data root, outside the rglob
+MANIFEST_VERSION = 1
+IMAGE_CATEGORIES = ("question_images", "option_images", "solution_images")
+# Audit issue types, in report order
+AUDIT_ISSUES = ("dangling_reference", "duplicate_reference", "misplaced_reference", "duplicate_id",
+                "orphan_image", "unknown_type", "invalid_name")
+AUDIT_FAIL_DEFAULT = ("dangling_reference",)  # issues that break images in generated papers
+AUDIT_CSV_FIELDS = ("json", "image_dir", "issue", "name", "q_id", "category", "detail")
+
+# --- Image names ---
+PARSE_CACHE_SIZE = 1 << 16
+CATEGORY_INVALID = -2       # parse_many code: name does not follow ID_Type[_Number]
+CATEGORY_UNKNOWN_TYPE = -1  # parse_many code: valid ID but unknown type code
+
+_SORT_NUM_RE = re.compile(r"_(\d+)$")
+# [q|Q]ID_Type[_Number][_anything] on the stem (the last extension, any case, is dropped first)
+_IMAGE_NAME_RE = re.compile(r"(?P<id>[^_]*)_(?P<type>[^_]*)(?:_(?P<num>[^_]*))?(?:_.*)?", re.DOTALL)
+_IMAGE_ID_RE = re.compile(r"[qQ]?(\d+)")
+_TYPE_CATEGORIES = (("so", "solution_images"), ("op", "option_images"))  # prefix codes: so, so1, soD, op2 ...
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def image_sort_key(name):
+    """Trailing number of an image name: q34_qu_2.png -> 2, 38_soD.png -> 0."""
+    m = _SORT_NUM_RE.search(os.path.splitext(name)[0])
+    return int(m.group(1)) if m else 0
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_name(image_name_full):
+    """Memoized core of parse_image_name: (q_id, type, category, num) or (None, error)."""
+    base_name = Path(image_name_full).stem
+    m = _IMAGE_NAME_RE.fullmatch(base_name)
+    if not m:
+        return None, "Invalid format (needs at least ID_Type)"
+    id_match = _IMAGE_ID_RE.fullmatch(m["id"])
+    if not id_match:
+        return None, f"Invalid ID format: {m['id']}"
+    img_type_raw = m["type"]
+    if img_type_raw == "qu":
+        category = "question_images"
+    else:
+        category = next((c for prefix, c in _TYPE_CATEGORIES if img_type_raw.startswith(prefix)), None)
+        if not category:
+            return None, f"Unknown image type code: {img_type_raw}"
+    num = m["num"]
+    return (int(id_match[1]), img_type_raw, category, int(num) if num and num.isdigit() else 0), None
+
+def parse_image_name(image_name_full):
+    """
+    Parses an image name with one precompiled grammar: [q]ID_Type[_Number].ext
+    Example: q34_qu_1.png -> ID=34, Type=qu, Num=1
+    Example: 34_op2.PNG   -> ID=34, Type=op2 (option), Num=0
+    Example: 38_soD.jpg   -> ID=38, Type=soD (solution), Num=0
+    Results are cached per name. Returns (parsed dict, None) or (None, error).
+    """
+    parsed, error = _parse_name(image_name_full)
+    if error:
+        return None, error
+    q_id, img_type_raw, category, img_num = parsed
+    return {
+        "full_name": image_name_full,  # Store full name with extension
+        "q_id": q_id,
+        "type": img_type_raw,
+        "category": category,
+        "num": img_num
+    }, None
+
+class ParsedNames:
+    """
+    Columnar result of parse_many: names[i] parsed to ids[i], categories[i]
+    (index into IMAGE_CATEGORIES, or CATEGORY_UNKNOWN_TYPE / CATEGORY_INVALID)
+    and nums[i]. ids and nums are 0 where parsing failed.
+    """
+    __slots__ = ("names", "ids", "categories", "nums")
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.ids = array('q')
+        self.categories = array('b')
+        self.nums = array('q')
+
+    def __len__(self):
+        return len(self.names)
+
+    def valid(self):
+        """Indices of names that parsed."""
+        return [i for i, c in enumerate(self.categories) if c >= 0]
+
+    def failed(self):
+        """{name: error} for names that did not parse."""
+        return {self.names[i]: _parse_name(self.names[i])[1] for i, c in enumerate(self.categories) if c < 0}
+
+    def records(self, indices=None):
+        """parse_image_name-style dicts (for ImageMapper.apply_images) of the given or all valid indices."""
+        indices = self.valid() if indices is None else indices
+        return [parse_image_name(self.names[i])[0] for i in indices]
+
+_CATEGORY_CODES = {category: code for code, category in enumerate(IMAGE_CATEGORIES)}
+
+def parse_many(names):
+    """Parses a whole folder listing into a ParsedNames (ids, category codes, numbers as arrays)."""
+    result = ParsedNames(names)
+    ids, categories, nums = result.ids, result.categories, result.nums
+    for name in result.names:
+        parsed, error = _parse_name(name)
+        if error:
+            ids.append(0)
+            nums.append(0)
+            categories.append(CATEGORY_UNKNOWN_TYPE if error.startswith("Unknown") else CATEGORY_INVALID)
+        else:
+            ids.append(parsed[0])
+            categories.append(_CATEGORY_CODES[parsed[2]])
+            nums.append(parsed[3])
+    return result
+
+def serialize_json(data, json_format="indent"):
+    """Serializes question data to the exact bytes save_json writes."""
+    if json_format == "compact":
+        if orjson:
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    text = json.dumps(data, indent=4, ensure_ascii=False)
+    if os.linesep != "\n":
+        # Same bytes a text-mode json.dump produces on this platform
+        text = text.replace("\n", os.linesep)
+    return text.encode('utf-8')
+
+def atomic_write_bytes(path, payload):
+    """Writes payload to a temp file next to path, fsyncs it and renames it over path."""
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates 0600 files; keep the target's mode, or use a normal file mode
+        if path.exists():
+            shutil.copymode(path, tmp_name)
+        else:
+            os.chmod(tmp_name, NEW_FILE_MODE)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+def _digest(payload):
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def read_file(path):
+    """(bytes, os.stat_result) of a file, with a single open."""
+    with open(path, 'rb') as f:
+        return f.read(), os.fstat(f.fileno())
 
 # --- Logic Class ---
 class ImageMapper:
-    def __init__(self, json_path=None):
+    def __init__(self, json_path=None, json_format="indent", metrics=None, writer=None):
         self.json_path = Path(json_path) if json_path else None
+        self.json_format = json_format
+        self.metrics = metrics or Metrics()
+        self.writer = writer  # writer(path, payload) queues saves instead of writing (PrefetchIO.write)
         self.data = []
+        self._disk_state = None  # (mtime_ns, size, digest) of the file as last loaded/saved
+        self.index = {}          # id -> question object
+        self.duplicate_ids = []  # ids seen more than once (first occurrence wins)
+        self.missing_ids = 0     # questions without an "id"
         if self.json_path:
             self.load_data()
 
-    def set_json_path(self, json_path):
+    def set_json_path(self, json_path, preloaded=None):
         self.json_path = Path(json_path)
-        return self.load_data()
+        return self.load_data(preloaded)
 
-    def load_data(self):
-        """Loads JSON data from the file."""
-        if not self.json_path or not self.json_path.exists():
+    def load_data(self, preloaded=None):
+        """Loads JSON data from the file, or from preloaded (its bytes and stat, as returned by read_file)."""
+        self._disk_state = None
+        if preloaded is None and (not self.json_path or not self.json_path.exists()):
             self.data = []
+            self.build_index()
             return False, f"File not found: {self.json_path}"
         
         try:
-            with open(self.json_path, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
-            return True, "Data loaded successfully."
+            with self.metrics.stage("read_json"):
+                raw, st = preloaded if preloaded is not None else read_file(self.json_path)
+            with self.metrics.stage("parse_json"):
+                self.data = json.loads(raw.decode('utf-8'))
+            self._disk_state = (st.st_mtime_ns, st.st_size, _digest(raw))
+            self.metrics.count("files_loaded")
+            self.metrics.count("bytes_read", len(raw))
         except json.JSONDecodeError as e:
+            self.data = []
+            self.build_index()
             return False, f"JSON Decode Error in {self.json_path.name}: {e}"
         except Exception as e:
+            self.data = []
+            self.build_index()
             return False, f"Error loading file {self.json_path.name}: {e}"
 
+        with self.metrics.stage("build_index"):
+            self.build_index()
+        msg = "Data loaded successfully."
+        if self.duplicate_ids:
+            msg += f" {len(self.duplicate_ids)} duplicate ID(s), first occurrence used."
+        if self.missing_ids:
+            msg += f" {self.missing_ids} question(s) without an ID."
+        return True, msg
+
+    def build_index(self):
+        """Builds the id -> question index. Keeps the first object for duplicate IDs."""
+        self.index = {}
+        self.duplicate_ids = []
+        self.missing_ids = 0
+        for item in self.data:
+            q_id = item.get("id") if isinstance(item, dict) else None
+            if q_id is None:
+                self.missing_ids += 1
+            elif q_id in self.index:
+                self.duplicate_ids.append(q_id)
+            else:
+                self.index[q_id] = item
+
+    def get_question(self, q_id):
+        return self.index.get(q_id)
+
+    def add_question(self, question):
+        """Appends a question object and indexes it. Fails on a missing or duplicate ID."""
+        q_id = question.get("id")
+        if q_id is None:
+            return False, "Question has no ID."
+        if q_id in self.index:
+            return False, f"Question ID {q_id} already exists."
+        self.data.append(question)
+        self.index[q_id] = question
+        return True, f"Added question ID {q_id}"
+
+    def remove_question(self, q_id):
+        """Removes a question object by ID and drops it from the index."""
+        target_obj = self.index.pop(q_id, None)
+        if target_obj is None:
+            return False, f"Question ID {q_id} not found in JSON."
+        self.data.remove(target_obj)
+        # Promote a later duplicate, if any, so lookups keep matching the data
+        for item in self.data:
+            if isinstance(item, dict) and item.get("id") == q_id:
+                self.index[q_id] = item
+                break
+        return True, f"Removed question ID {q_id}"
+
     def parse_image_name(self, image_name_full):
         """
         Parses the image name using underscores as delimiters.
@@ -45,391 +291,975 @@ class ImageMapper:
         Example: q34_qu_1 -> ID=34, Type=qu, Num=1
         Example: 34_qu_1 -> ID=34, Type=qu, Num=1
         Example: 38_soD -> ID=38, Type=so (suffix D context), Num=0
+        See the module-level parse_image_name / parse_many.
         """
-        base_name = Path(image_name_full).stem
-        parts = base_name.split('_')
-        
-        if len(parts) < 2:
-            return None, "Invalid format (needs at least ID_Type)"
-
-        # 1. Parse ID (Handle optional 'q' prefix)
-        id_part = parts[0]
-        if id_part.lower().startswith('q') and id_part[1:].isdigit():
-            q_id = int(id_part[1:])
-        elif id_part.isdigit():
-            q_id = int(id_part)
-        else:
-            return None, f"Invalid ID format: {id_part}"
+        return parse_image_name(image_name_full)
 
-        # 2. Parse Type
-        img_type_raw = parts[1] 
-        
-        # 3. Parse Number (Optional)
-        img_num = 0
-        if len(parts) > 2:
-            num_part = parts[2]
-            if num_part.isdigit():
-                img_num = int(num_part)
-        
-        # Determine Category
-        category = None
-        if img_type_raw == 'qu':
-            category = "question_images"
-        elif img_type_raw.startswith('so'):
-             # matches so, so1, soD, etc.
-             category = "solution_images"
-        elif img_type_raw.startswith('op'):
-             category = "option_images"
-        
-        if not category:
-             return None, f"Unknown image type code: {img_type_raw}"
+    def update_entry(self, parsed_info, dry_run=False, remove_mode=False):
+        """Updates the JSON data in memory for a single parsed image."""
+        return self.apply_images([parsed_info], dry_run=dry_run, remove_mode=remove_mode)[0]
 
-        return {
-            "full_name": image_name_full, # Store full name with extension
-            "q_id": q_id,
-            "type": img_type_raw,
-            "category": category,
-            "num": img_num
-        }, None
+    def apply_images(self, parsed_list, dry_run=False, remove_mode=False):
+        """
+        Bulk version of update_entry.
+        Groups images by (question, category), dedupes with sets and sorts
+        each touched list once. Returns one (success, msg) per input, in order.
+        """
+        with self.metrics.stage("apply_images"):
+            results = self._apply_images(parsed_list, dry_run, remove_mode)
+        self.metrics.count("images_applied", len(parsed_list))
+        self.metrics.count("updates", sum(1 for success, _ in results if success))
+        return results
 
-    def update_entry(self, parsed_info, dry_run=False, remove_mode=False):
-        """Updates the JSON data in memory."""
-        q_id = parsed_info['q_id']
-        category = parsed_info['category']
-        name_to_store = parsed_info['full_name']
-        
-        # Find the question object
-        target_obj = next((item for item in self.data if item.get("id") == q_id), None)
-        
-        if not target_obj:
-            return False, f"Question ID {q_id} not found in JSON."
+    def _apply_images(self, parsed_list, dry_run, remove_mode):
+        results = [None] * len(parsed_list)
+        groups = {}
+        for i, parsed_info in enumerate(parsed_list):
+            key = (parsed_info['q_id'], parsed_info['category'])
+            groups.setdefault(key, []).append(i)
 
-        # Initialize list if missing
-        if category not in target_obj:
-            target_obj[category] = []
-            
-        current_list = target_obj[category]
-        
-        if remove_mode:
-            if name_to_store in current_list:
-                if not dry_run:
-                    current_list.remove(name_to_store)
-                return True, f"Removed {name_to_store} from ID {q_id} ({category})"
+        for (q_id, category), indices in groups.items():
+            target_obj = self.index.get(q_id)
+            if not target_obj:
+                for i in indices:
+                    results[i] = (False, f"Question ID {q_id} not found in JSON.")
+                continue
+
+            # Initialize list if missing
+            if category not in target_obj:
+                target_obj[category] = []
+
+            current_list = target_obj[category]
+            present = set(current_list)
+
+            if remove_mode:
+                to_remove = set()
+                for i in indices:
+                    name_to_store = parsed_list[i]['full_name']
+                    if name_to_store in present and name_to_store not in to_remove:
+                        to_remove.add(name_to_store)
+                        results[i] = (True, f"Removed {name_to_store} from ID {q_id} ({category})")
+                    else:
+                        results[i] = (False, f"Not found: {name_to_store} in ID {q_id}")
+                if to_remove and not dry_run:
+                    # Same as list.remove: drop the first occurrence of each name
+                    kept = []
+                    for name in current_list:
+                        if name in to_remove:
+                            to_remove.discard(name)
+                        else:
+                            kept.append(name)
+                    current_list[:] = kept
             else:
-                return False, f"Not found: {name_to_store} in ID {q_id}"
-        else:
-            # Add mode
-            if name_to_store in current_list:
-                return False, f"Duplicate: {name_to_store} already exists in ID {q_id}."
-            
-            if not dry_run:
-                current_list.append(name_to_store)
-                # Sort the list based on the trailing number
-                def sort_key(s):
-                    # Extract last number from string q..._..._{num}
-                    m = re.search(r"_(\d+)\.[a-zA-Z]+$", s) # match at end with extension
-                    if not m:
-                         m = re.search(r"_(\d+)$", Path(s).stem) # fallback to stem
-                    return int(m.group(1)) if m else 0
-                
-                current_list.sort(key=sort_key)
-                
-            return True, f"Added {name_to_store} to ID {q_id} ({category})"
+                added = []
+                for i in indices:
+                    name_to_store = parsed_list[i]['full_name']
+                    if name_to_store in present:
+                        results[i] = (False, f"Duplicate: {name_to_store} already exists in ID {q_id}.")
+                        continue
+                    present.add(name_to_store)
+                    added.append(name_to_store)
+                    results[i] = (True, f"Added {name_to_store} to ID {q_id} ({category})")
+                if added and not dry_run:
+                    with self.metrics.stage("sort_images"):
+                        current_list.extend(added)
+                        # Sort the list based on the trailing number, parsing each name once
+                        keys = [image_sort_key(name) for name in current_list]
+                        order = sorted(range(len(current_list)), key=keys.__getitem__)
+                        current_list[:] = [current_list[j] for j in order]
+
+        return results
 
     def save_json(self):
-        """Saves current memory data to file."""
+        """
+        Saves current memory data to file.
+        Writes atomically (temp file + fsync + rename) and skips the write
+        when the serialized bytes equal what is already on disk.
+        """
         if not self.json_path:
             return False, "No JSON path set."
         try:
-            with open(self.json_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=4, ensure_ascii=False)
+            with self.metrics.stage("serialize_json"):
+                payload = serialize_json(self.data, self.json_format)
+                digest = _digest(payload)
+            if self._disk_state and self._disk_state[2] == digest and self._disk_unchanged():
+                self.metrics.count("writes_skipped")
+                return True, "No changes to save."
+            if self.writer:
+                self.writer(self.json_path, payload)
+                self._disk_state = None  # known once the queued write is flushed
+                self.metrics.count("writes_queued")
+                return True, "File queued for writing."
+            with self.metrics.stage("write_json"):
+                atomic_write_bytes(self.json_path, payload)
+            self.metrics.count("files_written")
+            self.metrics.count("bytes_written", len(payload))
+            st = os.stat(self.json_path)
+            self._disk_state = (st.st_mtime_ns, st.st_size, digest)
             return True, "File saved successfully."
         except Exception as e:
             return False, f"Error saving file: {e}"
 
-# --- GUI Class ---
-class App:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Auto Image Mapper - Batch Edition")
-        self.root.geometry("900x700")
-        
-        self.mapper = ImageMapper()
-        
-        self.setup_ui()
+    def _disk_unchanged(self):
+        """True if the file still has the mtime/size recorded at load/save time."""
+        try:
+            st = os.stat(self.json_path)
+        except OSError:
+            return False
+        return (st.st_mtime_ns, st.st_size) == self._disk_state[:2]
 
-    def setup_ui(self):
-        # 1. Configuration (Root Folders)
-        frame_config = tk.LabelFrame(self.root, text="Global Configuration", padx=5, pady=5)
-        frame_config.pack(fill="x", padx=10, pady=5)
-        
-        # Data Root
-        tk.Label(frame_config, text="Data Root (JSON):").grid(row=0, column=0, sticky="w")
-        self.entry_data_root = tk.Entry(frame_config, width=60)
-        self.entry_data_root.insert(0, DEFAULT_JSON_ROOT)
-        self.entry_data_root.grid(row=0, column=1, padx=5, pady=5)
-        btn_browse_data = tk.Button(frame_config, text="Browse", command=lambda: self.browse_folder(self.entry_data_root))
-        btn_browse_data.grid(row=0, column=2, padx=5)
-
-        # Image Root
-        tk.Label(frame_config, text="Image Root:").grid(row=1, column=0, sticky="w")
-        self.entry_image_root = tk.Entry(frame_config, width=60)
-        self.entry_image_root.insert(0, DEFAULT_IMAGE_ROOT)
-        self.entry_image_root.grid(row=1, column=1, padx=5, pady=5)
-        btn_browse_img = tk.Button(frame_config, text="Browse", command=lambda: self.browse_folder(self.entry_image_root))
-        btn_browse_img.grid(row=1, column=2, padx=5)
-
-        # 2. Actions (Tabs)
-        import tkinter.ttk as ttk
-        notebook = ttk.Notebook(self.root)
-        notebook.pack(fill="both", expand=True, padx=10, pady=5)
-
-        # Tab 1: Batch Process (The new feature)
-        tab_batch = tk.Frame(notebook)
-        notebook.add(tab_batch, text="Batch Map All")
-        self.setup_batch_tab(tab_batch)
-
-        # Tab 2: Single File/Folder (Legacy-ish)
-        tab_single = tk.Frame(notebook)
-        notebook.add(tab_single, text="Single File Tool")
-        self.setup_single_tab(tab_single)
-
-        # 3. Log Area (Shared)
-        self.log_area = scrolledtext.ScrolledText(self.root, height=15)
-        self.log_area.pack(fill="both", expand=True, padx=10, pady=5)
-
-        btn_export = tk.Button(self.root, text="Export Log", command=self.export_log)
-        btn_export.pack(side="right", padx=10, pady=5)
-
-    def setup_batch_tab(self, parent):
-        frame_opts = tk.LabelFrame(parent, text="Batch Options", padx=5, pady=5)
-        frame_opts.pack(fill="x", padx=10, pady=10)
-
-        self.var_dry_run_batch = tk.BooleanVar(value=True)
-        chk_dry = tk.Checkbutton(frame_opts, text="Dry Run (Scanning only, no save)", variable=self.var_dry_run_batch)
-        chk_dry.pack(side="left", padx=10)
-
-        btn_run_all = tk.Button(frame_opts, text="RUN BATCH MAPPING", command=self.run_batch_mapping, bg="#ddffdd", font=("Arial", 10, "bold"))
-        btn_run_all.pack(side="left", padx=20)
-        
-        tk.Label(frame_opts, text="(Matches JSON filenames to Image folders automatically)").pack(side="left")
+    def disk_fingerprint(self):
+        """file_fingerprint of the file as last loaded/saved, without reading it again (None if unknown)."""
+        if not self._disk_state:
+            return None
+        mtime_ns, size, digest = self._disk_state
+        return {"mtime_ns": mtime_ns, "size": size, "hash": digest}
 
-    def setup_single_tab(self, parent):
-        # Legacy controls for specific file operations
-        frame_single_config = tk.LabelFrame(parent, text="Single Target", padx=5, pady=5)
-        frame_single_config.pack(fill="x", padx=10, pady=5)
-        
-        tk.Label(frame_single_config, text="Specific JSON File:").grid(row=0, column=0, sticky="w")
-        self.entry_single_json = tk.Entry(frame_single_config, width=50)
-        self.entry_single_json.grid(row=0, column=1, padx=5)
-        btn_browse_file = tk.Button(frame_single_config, text="Browse", command=self.browse_file)
-        btn_browse_file.grid(row=0, column=2, padx=5)
-
-        tk.Label(frame_single_config, text="Specific Image Folder:").grid(row=1, column=0, sticky="w")
-        self.entry_single_img = tk.Entry(frame_single_config, width=50)
-        self.entry_single_img.grid(row=1, column=1, padx=5)
-        btn_browse_folder = tk.Button(frame_single_config, text="Browse", command=lambda: self.browse_folder(self.entry_single_img))
-        btn_browse_folder.grid(row=1, column=2, padx=5)
-
-        # Single Image Processing
-        frame_proc = tk.LabelFrame(parent, text="Process", padx=5, pady=5)
-        frame_proc.pack(fill="x", padx=10, pady=5)
-
-        self.var_dry_run_single = tk.BooleanVar(value=False)
-        tk.Checkbutton(frame_proc, text="Dry Run", variable=self.var_dry_run_single).pack(side="left", padx=5)
-
-        tk.Label(frame_proc, text="Image Name:").pack(side="left", padx=5)
-        self.entry_single_img_name = tk.Entry(frame_proc, width=30)
-        self.entry_single_img_name.pack(side="left", padx=5)
-        
-        tk.Button(frame_proc, text="Process Single Image", command=self.process_single_entry).pack(side="left", padx=5)
-        tk.Button(frame_proc, text="Process Entire Folder", command=self.process_single_folder).pack(side="left", padx=5)
-
-
-    def browse_folder(self, entry_widget):
-        path = filedialog.askdirectory()
-        if path:
-            entry_widget.delete(0, tk.END)
-            entry_widget.insert(0, path)
-
-    def browse_file(self):
-        path = filedialog.askopenfilename(filetypes=[("JSON Files", "*.json")])
-        if path:
-            self.entry_single_json.delete(0, tk.END)
-            self.entry_single_json.insert(0, path)
-
-    def log(self, message):
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        self.log_area.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_area.see(tk.END)
-
-    # --- Batch Logic ---
-    def run_batch_mapping(self):
-        data_root = Path(self.entry_data_root.get().strip())
-        image_root = Path(self.entry_image_root.get().strip())
-        dry_run = self.var_dry_run_batch.get()
-
-        if not data_root.exists() or not image_root.exists():
-            messagebox.showerror("Error", "Check that Data Root and Image Root paths exist.")
-            return
-
-        self.log(f"=== STARTED BATCH MAPPING (Dry Run: {dry_run}) ===")
-        self.log(f"Data Source: {data_root}")
-        self.log(f"Image Source: {image_root}")
-
-        total_files = 0
-        total_mapped = 0
-
-        # Walk through the data root
-        for json_file in data_root.rglob("*.json"):
-            # Compute relative path to maintain structure if needed, or just strict name match
-            # Strategy: Match string of JSON filename (minus extension) to folder name in corresponding structure?
-            # Or simpler: Look for a folder in image_root that mostly matches the json filename.
-            
-            # 1. Determine expected image directory
-            # We blindly search for a folder in image_root that contains the stem of the json file
-            # e.g json: gravitation.json -> Look for folder "*gravitation*" or "3. Gravitation"
-            
-            # To do this efficiently, we can mirror the directory structure of data_root inside image_root?
-            # User path: backend/data/data/CET/11/Physics/gravitation.json
-            # Image path: backend/data/Questions_Image_Data/CET/11/Physics/3. Gravitation/
-            
-            # Relative path from root
-            rel_path = json_file.relative_to(data_root).parent # e.g. CET/11/Physics
-            candidate_img_base = image_root / rel_path
-            
-            if not candidate_img_base.exists():
-                self.log(f"SKIPPING: No matching image base folder for {rel_path}")
+# --- Batch Engine (headless) ---
+_CHAPTER_SEP_RE = re.compile(r'[_\-\s]+')
+_CHAPTER_NUM_RE = re.compile(r'^[0-9\.\s]+')
+_DIGITS_RE = re.compile(r'\d+')
+
+def normalize_chapter_name(name):
+    """
+    Normalizes JSON stems and folder names to one form:
+    "3. Gravitation" -> "gravitation", "Trigonometry_2" -> "trigonometry 2"
+    """
+    name = _CHAPTER_SEP_RE.sub(' ', name).strip()
+    return _CHAPTER_NUM_RE.sub('', name).lower().strip()
+
+class ChapterFolderIndex:
+    """
+    Resolves JSON chapters to image folders.
+    Each subject folder (e.g. CET/11/Physics) is listed once with os.scandir and
+    indexed by normalized chapter name. Lookups try exact, then the backend's
+    chapterFolderMap.json aliases, then a fuzzy match against unclaimed folders.
+    """
+    def __init__(self, image_root, alias_path=DEFAULT_ALIAS_MAP):
+        self.image_root = Path(image_root)
+        self.subjects = {}  # rel subject path -> {normalized name: folder} (None if missing)
+        self.aliases = {}
+        if alias_path and Path(alias_path).exists():
+            try:
+                with open(alias_path, 'r', encoding='utf-8') as f:
+                    self.aliases = {k.lower(): v for k, v in json.load(f).items()}
+            except Exception:
+                self.aliases = {}
+
+    def subject_folders(self, rel_path):
+        rel_key = Path(rel_path).as_posix()
+        if rel_key not in self.subjects:
+            folders = {}
+            try:
+                with os.scandir(self.image_root / rel_path) as it:
+                    for entry in sorted(it, key=lambda e: e.name):
+                        if entry.is_dir():
+                            folders.setdefault(normalize_chapter_name(entry.name), Path(entry.path))
+            except (FileNotFoundError, NotADirectoryError):
+                folders = None
+            self.subjects[rel_key] = folders
+        return self.subjects[rel_key]
+
+    def match_chapters(self, rel_path, stems):
+        """Returns {stem: (folder, how)} for every stem that could be matched."""
+        folders = self.subject_folders(rel_path)
+        if not folders:
+            return {}
+
+        by_name = {folder.name.lower(): folder for folder in folders.values()}
+        alias_prefix = "|".join(part.lower() for part in Path(rel_path).parts) + "|"
+        matched = {}
+        pending = []
+        for stem in stems:
+            norm = normalize_chapter_name(stem)
+            if norm in folders:
+                matched[stem] = (folders[norm], "exact")
+                continue
+            alias = self.aliases.get(alias_prefix + norm) or self.aliases.get(alias_prefix + stem.lower())
+            if alias and alias.lower() in by_name:
+                matched[stem] = (by_name[alias.lower()], "alias")
                 continue
+            pending.append((stem, norm))
 
-            # Now find the specific chapter folder. 
-            # Json Stem: "gravitation"
-            # Candidate folders in .../Physics/: "1. Motion in Plane", "3. Gravitation", etc.
-            
-            json_stem = json_file.stem.lower() # gravitation
-            target_img_dir = None
-            
-            for child in candidate_img_base.iterdir():
-                if child.is_dir():
-                    # Clean the child name: remove leading numbers, punctuation
-                    # "3. Gravitation" -> "Gravitation"
-                    # "10. Error Analysis" -> "Error Analysis"
-                    
-                    # Regex replacement to just get letters
-                    clean_name = re.sub(r'^[0-9\.\s]+', '', child.name).lower().strip()
-                    # Also replace underscores/spaces in json_stem if needed
-                    
-                    if clean_name == json_stem or clean_name.replace(' ', '_') == json_stem:
-                        target_img_dir = child
-                        break
-            
-            if not target_img_dir:
-                 self.log(f"WARNING: Could not find chapter folder for {json_file.name} in {candidate_img_base}")
-                 continue
-
-            # Found a pair!
-            self.log(f"MATCH: {json_file.name} <-> {target_img_dir.name}")
-            
-            # Process this pair
-            self.process_pair(json_file, target_img_dir, dry_run)
-            total_files += 1
-
-        self.log(f"=== BATCH COMPLETE. Processed {total_files} JSON files. ===")
-        messagebox.showinfo("Done", f"Batch processing complete.\nFiles touched: {total_files}")
-
-    def process_pair(self, json_path, img_dir, dry_run):
-        # 1. Load Data
-        success, msg = self.mapper.set_json_path(json_path)
-        if not success:
-            self.log(f"  FAILED to load JSON: {msg}")
-            return
-
-        changes = 0
-        img_files = [f for f in img_dir.iterdir() if f.suffix.lower() in {'.png', '.jpg', '.jpeg'}]
-        
-        if not img_files:
-            self.log(f"  No images found in {img_dir.name}")
-            return
-
-        for img_path in img_files:
-            parsed, error = self.mapper.parse_image_name(img_path.name)
-            if error:
-                # Log only if it looks like a relevant file, otherwise it might be unrelated noise
-                # self.log(f"    Skip {img_path.name}: {error}")
+        # Fuzzy pass only over folders no other chapter claimed
+        claimed = {folder for folder, _ in matched.values()}
+        free = {norm: folder for norm, folder in folders.items() if folder not in claimed}
+        for stem, norm in pending:
+            digits = _DIGITS_RE.findall(norm)
+            candidates = [name for name in free if _DIGITS_RE.findall(name) == digits]
+            close = difflib.get_close_matches(norm, candidates, n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                matched[stem] = (free.pop(close[0]), "fuzzy")
+        return matched
+
+def discover_pairs(data_root, image_root, alias_path=DEFAULT_ALIAS_MAP, index=None, io=None):
+    """
+    Walks data_root and matches every JSON file to its chapter image folder.
+    Mirrors the structure: data/CET/11/Physics/gravitation.json
+                       <-> Questions_Image_Data/CET/11/Physics/3. Gravitation/
+    Returns (pairs, skipped, inexact): pairs is a list of (json_path, img_dir),
+    skipped a list of {"json", "reason"} dicts and inexact a list of
+    {"json", "image_dir", "how"} for alias/fuzzy matches worth reviewing.
+    Pass a ChapterFolderIndex to inspect the listed subject folders afterwards.
+    With a PrefetchIO, the data tree and the subject folders are listed concurrently.
+    """
+    data_root = Path(data_root)
+    index = index or ChapterFolderIndex(image_root, alias_path)
+    by_subject = {}
+    json_files = io.walk(data_root, ".json") if io else sorted(data_root.rglob("*.json"))
+    for json_file in json_files:
+        by_subject.setdefault(json_file.relative_to(data_root).parent, []).append(json_file)
+    if io:
+        io.map(index.subject_folders, list(by_subject))
+
+    pairs = []
+    skipped = []
+    inexact = []
+    for rel_path, json_files in by_subject.items():
+        if index.subject_folders(rel_path) is None:
+            for json_file in json_files:
+                skipped.append({"json": str(json_file), "reason": f"No matching image base folder for {rel_path.as_posix()}"})
+            continue
+
+        matched = index.match_chapters(rel_path, [j.stem for j in json_files])
+        for json_file in json_files:
+            if json_file.stem not in matched:
+                skipped.append({"json": str(json_file), "reason": f"Could not find chapter folder in {rel_path.as_posix()}"})
                 continue
-            
-            # Attempt update
-            success, msg = self.mapper.update_entry(parsed, dry_run=dry_run)
-            if success:
-                # self.log(f"    {msg}") # Detailed logging can get spammy
-                changes += 1
-            else:
-                # Maybe log duplicates only if verbose?
-                # self.log(f"    Skip {img_path.name}: {msg}")
-                pass
-
-        if changes > 0:
-            if not dry_run:
-                save_success, save_msg = self.mapper.save_json()
-                if save_success:
-                    self.log(f"  -> SAVED {changes} changes to {json_path.name}")
-                else:
-                    self.log(f"  -> ERROR saving {json_path.name}: {save_msg}")
-            else:
-                self.log(f"  -> {changes} potential changes (DRY RUN)")
+            target_img_dir, how = matched[json_file.stem]
+            pairs.append((json_file, target_img_dir))
+            if how != "exact":
+                inexact.append({"json": str(json_file), "image_dir": str(target_img_dir), "how": how})
+
+    return pairs, skipped, inexact
+
+def summarize_unmatched(skipped, data_root):
+    """One line per subject folder listing the chapters that could not be matched."""
+    groups = {}
+    for entry in skipped:
+        rel = Path(entry["json"]).relative_to(data_root)
+        groups.setdefault(rel.parent.as_posix(), []).append(rel.stem)
+    return [f"{subject}: {', '.join(stems)}" for subject, stems in sorted(groups.items())]
+
+def file_fingerprint(path, with_hash=True):
+    """mtime/size (and content hash) of a file, as stored in the manifest."""
+    st = os.stat(path)
+    fp = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    if with_hash:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        fp["hash"] = h.hexdigest()
+    return fp
+
+def scan_pair(json_path, img_dir):
+    """The I/O MappingManifest.plan and map_pair need: (JSON fingerprint without hash, folder_fingerprint)."""
+    return file_fingerprint(json_path, with_hash=False), folder_fingerprint(img_dir)
+
+def folder_fingerprint(img_dir):
+    """{image name: mtime_ns} for every image file directly inside img_dir."""
+    images = {}
+    with os.scandir(img_dir) as it:
+        for entry in it:
+            if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS and entry.is_file():
+                images[entry.name] = entry.stat().st_mtime_ns
+    return images
+
+class MappingManifest:
+    """
+    On-disk record of what each chapter looked like after its last mapping run.
+    Keyed by the JSON path relative to the data root (e.g. CET/11/Physics/gravitation.json).
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.chapters = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        self.chapters = {}
+        if not self.path.exists():
+            return False, "No manifest yet."
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+        except Exception as e:
+            return False, f"Ignoring unreadable manifest {self.path.name}: {e}"
+        if raw.get("version") != MANIFEST_VERSION:
+            return False, "Ignoring manifest from another version."
+        self.chapters = raw.get("chapters", {})
+        return True, f"Manifest loaded ({len(self.chapters)} chapters)."
+
+    def save(self):
+        if not self.dirty:
+            return True, "Manifest unchanged."
+        try:
+            payload = json.dumps({"version": MANIFEST_VERSION, "chapters": self.chapters}, separators=(',', ':'))
+            atomic_write_bytes(self.path, payload.encode('utf-8'))
+            self.dirty = False
+            return True, "Manifest saved."
+        except Exception as e:
+            return False, f"Error saving manifest: {e}"
+
+    def plan(self, key, json_path, img_dir, scan=None):
+        """
+        Decides what a pair needs. Returns (action, known_images):
+          "skip"    - JSON and image folder unchanged since the last run
+          "partial" - JSON unchanged, only images not in known_images need mapping
+          "full"    - unknown or changed JSON, map everything
+        scan is the pair's scan_pair() result if it was already taken.
+        """
+        entry = self.chapters.get(key)
+        if not entry or entry.get("image_dir") != str(img_dir):
+            return "full", None
+
+        old_json = entry["json"]
+        json_fp, images = scan or (file_fingerprint(json_path, with_hash=False), None)
+        if json_fp["mtime_ns"] != old_json["mtime_ns"] or json_fp["size"] != old_json["size"]:
+            # Touched but maybe not changed (e.g. a sync client rewrote it)
+            if json_fp["size"] != old_json["size"] or file_fingerprint(json_path)["hash"] != old_json["hash"]:
+                return "full", None
+            old_json["mtime_ns"] = json_fp["mtime_ns"]
+            self.dirty = True
+
+        if (folder_fingerprint(img_dir) if images is None else images) == entry["images"]:
+            return "skip", None
+        return "partial", entry["images"]
+
+    def record(self, key, fingerprint):
+        self.chapters[key] = fingerprint
+        self.dirty = True
+
+def _apply_and_save(mapper, parsed_list, result, dry_run):
+    """Applies parsed images and saves if anything changed. Fills in result; returns False on a save error."""
+    changes = 0
+    for success, msg in mapper.apply_images(parsed_list, dry_run=dry_run):
+        if success:
+            changes += 1
         else:
-            self.log(f"  -> No changes needed.")
+            # Duplicates / unknown IDs
+            result["skipped"] += 1
 
+    result["changes"] = changes
+    json_name = Path(mapper.json_path).name
+    if changes == 0:
+        result["message"] = "No changes needed."
+    elif dry_run:
+        result.update(status="dry_run", message=f"{changes} potential changes (DRY RUN)")
+    else:
+        save_success, save_msg = mapper.save_json()
+        if save_success:
+            result.update(status="saved", message=f"SAVED {changes} changes to {json_name}")
+        else:
+            result.update(status="error", message=f"ERROR saving {json_name}: {save_msg}")
+            return False
+    return True
 
-    # --- Single Logic (Legacy) ---
-    def process_single_entry(self):
-        json_path = self.entry_single_json.get().strip()
-        img_name = self.entry_single_img_name.get().strip()
-        
-        if not json_path or not img_name:
-            messagebox.showwarning("Input", "JSON path and Image Name required")
-            return
-            
-        success, msg = self.mapper.set_json_path(json_path)
-        if not success:
-            self.log(f"Error: {msg}")
-            return
-
-        parsed, err = self.mapper.parse_image_name(img_name)
-        if err:
-            self.log(f"Parse Error: {err}")
-            return
-            
-        success, msg = self.mapper.update_entry(parsed, dry_run=self.var_dry_run_single.get())
-        self.log(msg)
-        
-        if success and not self.var_dry_run_single.get():
-            self.mapper.save_json()
+def map_pair(json_path, img_dir, dry_run=False, known_images=None, json_format="indent", trace=False,
+             preloaded=None, images=None, writer=None):
+    """
+    Maps every image in img_dir into json_path and saves the file.
+    known_images ({name: mtime_ns} from the manifest) limits mapping to new or changed images.
+    Module-level so it can run inside a worker process.
+    preloaded (read_file of json_path) and images (folder_fingerprint of
+    img_dir) skip that I/O when it was done ahead; a writer queues the save
+    (see ImageMapper), leaving fingerprint["json"] None until it is flushed.
+    Returns a result dict: json, image_dir, status, changes, skipped, message,
+    metrics (Metrics.to_dict(), with trace events if trace) and, for real
+    runs, the manifest fingerprint of the pair.
+    """
+    json_path = Path(json_path)
+    img_dir = Path(img_dir)
+    result = {
+        "json": str(json_path),
+        "image_dir": str(img_dir),
+        "status": "unchanged",
+        "changes": 0,
+        "skipped": 0,
+        "images": 0,
+        "message": "",
+    }
 
-    def process_single_folder(self):
-        json_path = self.entry_single_json.get().strip()
-        img_folder = self.entry_single_img.get().strip()
-        
-        if not json_path or not img_folder:
-             messagebox.showwarning("Input", "JSON path and Image Folder required")
-             return
+    metrics = Metrics(trace)
+    result["metrics"] = metrics.to_dict()  # live view, filled in as the stages run
+    mapper = ImageMapper(json_format=json_format, metrics=metrics, writer=writer)
+    success, msg = mapper.set_json_path(json_path, preloaded)
+    if not success:
+        result.update(status="error", message=f"FAILED to load JSON: {msg}")
+        return result
+
+    with metrics.stage("scan_folder"):
+        if images is None:
+            images = folder_fingerprint(img_dir)
+    metrics.count("files_scanned", len(images))
+    if not images:
+        result.update(status="no_images", message=f"No images found in {img_dir.name}")
+        return result
 
-        # Reuse the pair processor logic basically
-        self.process_pair(json_path, Path(img_folder), self.var_dry_run_single.get())
+    with metrics.stage("parse_names"):
+        names = [name for name, mtime_ns in images.items()
+                 if not (known_images and known_images.get(name) == mtime_ns)]
+        result["images"] = len(names)
+        parsed = parse_many(names)
+        valid = parsed.valid()
+        result["skipped"] += len(names) - len(valid)  # Unrelated noise in the folder
+        parsed_list = parsed.records(valid)
+    metrics.count("images_parsed", len(names))
+    metrics.count("names_invalid", len(names) - len(valid))
 
+    if not _apply_and_save(mapper, parsed_list, result, dry_run):
+        return result
 
-    def export_log(self):
-        content = self.log_area.get("1.0", tk.END)
-        path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text Files", "*.txt")])
-        if path:
+    if not dry_run:
+        with metrics.stage("fingerprint"):
+            result["fingerprint"] = {
+                "json": file_fingerprint(json_path) if preloaded is None else mapper.disk_fingerprint(),
+                "image_dir": str(img_dir),
+                "images": images,
+            }
+    return result
+
+def map_images(json_path, names, dry_run=False, json_format="indent"):
+    """
+    Maps only the given image names (e.g. crops that were just written) into
+    json_path, so only the questions they belong to change. Same result dict
+    as map_pair, without the folder fingerprint.
+    """
+    json_path = Path(json_path)
+    result = {
+        "json": str(json_path),
+        "status": "unchanged",
+        "changes": 0,
+        "skipped": 0,
+        "images": len(names),
+        "message": "",
+    }
+    mapper = ImageMapper(json_format=json_format)
+    success, msg = mapper.set_json_path(json_path)
+    if not success:
+        result.update(status="error", message=f"FAILED to load JSON: {msg}")
+        return result
+    parsed = parse_many(names)
+    valid = parsed.valid()
+    result["skipped"] += len(names) - len(valid)
+    _apply_and_save(mapper, parsed.records(valid), result, dry_run)
+    return result
+
+def find_chapter_json(img_dir, data_root=DEFAULT_JSON_ROOT, image_root=DEFAULT_IMAGE_ROOT,
+                      alias_path=DEFAULT_ALIAS_MAP, index=None):
+    """
+    The reverse of discover_pairs for one folder: the chapter JSON whose image
+    folder is img_dir, or None. Only img_dir's subject folder is matched.
+    """
+    img_dir = Path(img_dir).resolve()
+    try:
+        rel_path = img_dir.parent.relative_to(Path(image_root).resolve())
+    except ValueError:
+        return None
+    json_files = sorted((Path(data_root) / rel_path).glob("*.json"))
+    index = index or ChapterFolderIndex(image_root, alias_path)
+    matched = index.match_chapters(rel_path, [j.stem for j in json_files])
+    for json_file in json_files:
+        if json_file.stem in matched and Path(matched[json_file.stem][0]).resolve() == img_dir:
+            return json_file
+    return None
+
+def _map_prefetched(io, jobs, scans, dry_run, json_format, metrics, cancel, collect):
+    """
+    run_batch's in-process mapping loop on a PrefetchIO: chapter files are
+    read ahead of the one being mapped and saves are queued, then written
+    together. Saved chapters are collected once their write is done.
+    Returns the number of chapters cancelled.
+    """
+    queued = []
+    cancelled = 0
+    reads = io.prefetch(lambda job: read_file(job[0]), jobs)
+    try:
+        for n, ((json_path, img_dir, known_images), loaded) in enumerate(reads):
+            if cancel and cancel.is_set():
+                cancelled = len(jobs) - n
+                break
             try:
-                with open(path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                self.log(f"Log exported to {path}")
+                # A failed read is retried by map_pair, which reports it like any load error
+                result = map_pair(json_path, img_dir, dry_run, known_images, json_format, metrics.trace,
+                                  preloaded=None if isinstance(loaded, Exception) else loaded,
+                                  images=scans[(json_path, img_dir)][1], writer=None if dry_run else io.write)
             except Exception as e:
-                messagebox.showerror("Export Error", str(e))
+                result = {
+                    "json": str(json_path),
+                    "image_dir": str(img_dir),
+                    "status": "error",
+                    "changes": 0,
+                    "skipped": 0,
+                    "images": 0,
+                    "message": f"Mapping failed: {e}",
+                }
+            if result["status"] == "saved":
+                queued.append(result)
+            else:
+                collect(result)
+    finally:
+        reads.close()
 
-if __name__ == "__main__":
+    with metrics.stage("write_json"):
+        written = io.flush_writes(atomic_write_bytes)
+    for result in queued:
+        payload, st, error = written[result["json"]]
+        if error:
+            result.pop("fingerprint", None)
+            result.update(status="error", message=f"ERROR saving {Path(result['json']).name}: {error}")
+        else:
+            result["fingerprint"]["json"] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "hash": _digest(payload)}
+            metrics.count("files_written")
+            metrics.count("bytes_written", len(payload))
+        collect(result)
+    return cancelled
+
+def default_manifest_path(data_root):
+    return Path(data_root).parent / MANIFEST_NAME
+
+def run_batch(data_root, image_root, dry_run=False, workers=DEFAULT_WORKERS, on_result=None,
+              manifest_path=None, full=False, json_format="indent", on_start=None, cancel=None, metrics=None,
+              io_threads=0):
+    """
+    Discovers all (JSON, image folder) pairs and maps them on a process pool.
+    With a manifest_path, pairs unchanged since the last run are skipped and
+    only new or changed images are mapped (full=True ignores the manifest but still updates it).
+    json_format is one of JSON_FORMATS.
+    on_start(total_pairs) is called once pairs are discovered, on_result(result)
+    in the calling process as each file finishes.
+    cancel (e.g. a threading.Event) is checked between chapters: chapters not
+    yet started are dropped, running ones finish and save normally.
+    Stage timings and counters of all workers are merged into metrics (a
+    Metrics, created if not given; trace=True collects trace events) and
+    summarized in report["metrics"].
+    io_threads > 0 is for slow synced/network drives: chapters are mapped in
+    this process (workers is ignored) while a PrefetchIO with that many
+    threads lists folders, stats and reads files ahead of them, and changed
+    files are written together at the end of the run.
+    Returns a JSON-serializable report dict.
+    """
+    started = time.perf_counter()
+    data_root = Path(data_root)
+    metrics = metrics if metrics is not None else Metrics()
+    io = PrefetchIO(io_threads) if io_threads else None
+    with metrics.stage("resolve_folders"):
+        pairs, skipped, inexact = discover_pairs(data_root, image_root, io=io)
+    metrics.count("chapters_matched", len(pairs))
+    metrics.count("chapters_unmatched", len(skipped))
+    workers = 1 if io else max(1, int(workers or 1))
+    scans = {}
+    if io:
+        with metrics.stage("scan_folders"):
+            scans = dict(zip(pairs, io.map(lambda pair: scan_pair(*pair), pairs)))
+    manifest = MappingManifest(manifest_path) if manifest_path else None
+    results = []
+    keys = {}
+    cancelled = 0
+    cancelling = False
+    if on_start:
+        on_start(len(pairs))
+
+    def collect(result):
+        fingerprint = result.pop("fingerprint", None)
+        metrics.merge(result.pop("metrics", {}))
+        if manifest and fingerprint:
+            manifest.record(keys[result["json"]], fingerprint)
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    jobs = []
+    for json_path, img_dir in pairs:
+        key = json_path.relative_to(data_root).as_posix()
+        keys[str(json_path)] = key
+        with metrics.stage("manifest_plan"):
+            action, known_images = (("full", None) if not manifest or full
+                                    else manifest.plan(key, json_path, img_dir, scans.get((json_path, img_dir))))
+        if action == "skip":
+            collect({
+                "json": str(json_path),
+                "image_dir": str(img_dir),
+                "status": "up_to_date",
+                "changes": 0,
+                "skipped": 0,
+                "images": 0,
+                "message": "Up to date (manifest).",
+            })
+        else:
+            jobs.append((json_path, img_dir, known_images))
+
+    if io:
+        cancelled = _map_prefetched(io, jobs, scans, dry_run, json_format, metrics, cancel, collect)
+        io.close()
+    elif workers == 1 or len(jobs) <= 1:
+        for n, (json_path, img_dir, known_images) in enumerate(jobs):
+            if cancel and cancel.is_set():
+                cancelled = len(jobs) - n
+                break
+            collect(map_pair(json_path, img_dir, dry_run, known_images, json_format, metrics.trace))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(map_pair, j, d, dry_run, k, json_format, metrics.trace): (j, d)
+                       for j, d, k in jobs}
+            for future in as_completed(futures):
+                if cancel and cancel.is_set() and not cancelling:
+                    cancelling = True
+                    cancelled = sum(1 for f in futures if f.cancel())
+                if future.cancelled():
+                    continue
+                json_path, img_dir = futures[future]
+                try:
+                    collect(future.result())
+                except Exception as e:
+                    collect({
+                        "json": str(json_path),
+                        "image_dir": str(img_dir),
+                        "status": "error",
+                        "changes": 0,
+                        "skipped": 0,
+                        "images": 0,
+                        "message": f"Worker failed: {e}",
+                    })
+
+    manifest_msg = None
+    if manifest and not dry_run:
+        with metrics.stage("manifest_save"):
+            _, manifest_msg = manifest.save()
+
+    results.sort(key=lambda r: r["json"])
+    totals = {"pairs": len(pairs), "unmatched": len(skipped), "changes": 0}
+    if cancelled:
+        totals["cancelled"] = cancelled
+    for r in results:
+        totals["changes"] += r["changes"]
+        totals[r["status"]] = totals.get(r["status"], 0) + 1
+
+    return {
+        "data_root": str(data_root),
+        "image_root": str(image_root),
+        "dry_run": dry_run,
+        "workers": workers,
+        "io_threads": io.threads if io else 0,
+        "manifest": str(manifest_path) if manifest_path else None,
+        "manifest_status": manifest_msg,
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+        "totals": totals,
+        "metrics": metrics.report(),
+        "files": results,
+        "unmatched": skipped,
+        "inexact_matches": inexact,
+    }
+
+# --- Audit (read-only) ---
+def audit_pair(json_path, img_dir):
+    """
+    Reconciles one chapter JSON with its image folder in a single pass over both.
+    Never writes. Module-level so it can run inside a worker process.
+    Returns a result dict: json, image_dir, status, counts, issues, message.
+    Each issue is {"issue", "name", "q_id", "category", "detail"} with issue in AUDIT_ISSUES.
+    """
+    json_path = Path(json_path)
+    img_dir = Path(img_dir)
+    result = {
+        "json": str(json_path),
+        "image_dir": str(img_dir),
+        "status": "ok",
+        "images": 0,
+        "references": 0,
+        "counts": {},
+        "issues": [],
+        "message": "",
+    }
+    issues = result["issues"]
+
+    def add(issue, name=None, q_id=None, category=None, detail=""):
+        issues.append({"issue": issue, "name": name, "q_id": q_id, "category": category, "detail": detail})
+
+    mapper = ImageMapper()
+    success, msg = mapper.set_json_path(json_path)
+    if not success:
+        result.update(status="error", message=f"FAILED to load JSON: {msg}")
+        return result
+    try:
+        on_disk = set(folder_fingerprint(img_dir))
+    except OSError as e:
+        result.update(status="error", message=f"FAILED to list {img_dir}: {e}")
+        return result
+    by_lower = {}
+    for name in on_disk:
+        by_lower.setdefault(name.lower(), name)
+        by_lower.setdefault(os.path.splitext(name)[0].lower(), name)
+
+    for q_id in sorted(set(mapper.duplicate_ids)):
+        add("duplicate_id", q_id=q_id, detail=f"{mapper.duplicate_ids.count(q_id) + 1} questions share this ID")
+
+    # name -> [(q_id, category), ...] for every reference in the JSON
+    references = {}
+    for question in mapper.data:
+        if not isinstance(question, dict):
+            continue
+        for category in IMAGE_CATEGORIES:
+            for name in question.get(category) or []:
+                references.setdefault(name, []).append((question.get("id"), category))
+    result["images"] = len(on_disk)
+    result["references"] = sum(len(locs) for locs in references.values())
+
+    for name, locations in references.items():
+        q_id, category = locations[0]
+        if name not in on_disk:
+            # S3 keys are case-sensitive and use the name as stored, so near misses still break
+            near = by_lower.get(str(name).lower())
+            add("dangling_reference", name, q_id, category, f"on disk as {near}" if near else "")
+        if len(locations) > 1:
+            where = ", ".join(f"{i}/{c}" for i, c in locations)
+            add("duplicate_reference", name, q_id, category, f"referenced {len(locations)}x: {where}")
+        parsed, error = mapper.parse_image_name(str(name))
+        if not error:
+            for ref_id, ref_category in locations:
+                if parsed["q_id"] != ref_id or parsed["category"] != ref_category:
+                    add("misplaced_reference", name, ref_id, ref_category,
+                        f"name maps to ID {parsed['q_id']} ({parsed['category']})")
+
+    unreferenced = parse_many(sorted((n for n in on_disk if n not in references), key=lambda n: (image_sort_key(n), n)))
+    errors = unreferenced.failed()
+    for name, q_id, code in zip(unreferenced.names, unreferenced.ids, unreferenced.categories):
+        if code == CATEGORY_UNKNOWN_TYPE:
+            add("unknown_type", name, detail=errors[name])
+        elif code == CATEGORY_INVALID:
+            add("invalid_name", name, detail=errors[name])
+        else:
+            detail = "not referenced" if q_id in mapper.index else "question ID not in JSON"
+            add("orphan_image", name, q_id, IMAGE_CATEGORIES[code], detail)
+
+    for issue in issues:
+        result["counts"][issue["issue"]] = result["counts"].get(issue["issue"], 0) + 1
+    if issues:
+        result["status"] = "issues"
+        result["message"] = ", ".join(f"{result['counts'][k]} {k}" for k in AUDIT_ISSUES if k in result["counts"])
+    else:
+        result["message"] = "Consistent."
+    return result
+
+def run_audit(data_root, image_root, workers=DEFAULT_WORKERS, on_result=None, on_start=None, cancel=None):
+    """
+    Audits every (JSON, image folder) pair on a process pool without changing anything.
+    Besides per-chapter issues, reports JSON files with no image folder (unmatched)
+    and chapter folders no JSON file maps to (orphan_folders).
+    on_start, on_result and cancel work as in run_batch.
+    Returns a JSON-serializable report dict.
+    """
+    started = time.perf_counter()
+    data_root = Path(data_root)
+    folder_index = ChapterFolderIndex(image_root)
+    pairs, skipped, inexact = discover_pairs(data_root, image_root, index=folder_index)
+    workers = max(1, int(workers or 1))
+    results = []
+    cancelled = 0
+    cancelling = False
+    if on_start:
+        on_start(len(pairs))
+
+    def collect(result):
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    if workers == 1 or len(pairs) <= 1:
+        for n, (json_path, img_dir) in enumerate(pairs):
+            if cancel and cancel.is_set():
+                cancelled = len(pairs) - n
+                break
+            collect(audit_pair(json_path, img_dir))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(audit_pair, j, d): (j, d) for j, d in pairs}
+            for future in as_completed(futures):
+                if cancel and cancel.is_set() and not cancelling:
+                    cancelling = True
+                    cancelled = sum(1 for f in futures if f.cancel())
+                if future.cancelled():
+                    continue
+                json_path, img_dir = futures[future]
+                try:
+                    collect(future.result())
+                except Exception as e:
+                    collect({"json": str(json_path), "image_dir": str(img_dir), "status": "error", "images": 0,
+                             "references": 0, "counts": {}, "issues": [], "message": f"Worker failed: {e}"})
+
+    # Chapter folders live at <exam>/<class>/<subject>/<chapter>, like the backend's S3 keys
+    claimed = {Path(img_dir) for _, img_dir in pairs}
+    orphan_folders = sorted(str(folder) for rel, folders in folder_index.subjects.items()
+                            if folders and len(Path(rel).parts) == 3
+                            for folder in folders.values() if folder not in claimed)
+
+    results.sort(key=lambda r: r["json"])
+    totals = {"chapters": len(pairs), "unmatched": len(skipped), "orphan_folders": len(orphan_folders),
+              "images": 0, "references": 0}
+    if cancelled:
+        totals["cancelled"] = cancelled
+    for r in results:
+        totals["images"] += r["images"]
+        totals["references"] += r["references"]
+        totals[r["status"]] = totals.get(r["status"], 0) + 1
+        for issue, n in r["counts"].items():
+            totals[issue] = totals.get(issue, 0) + n
+
+    return {
+        "data_root": str(data_root),
+        "image_root": str(image_root),
+        "workers": workers,
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+        "totals": totals,
+        "files": results,
+        "unmatched": skipped,
+        "orphan_folders": orphan_folders,
+        "inexact_matches": inexact,
+    }
+
+def write_audit_csv(report, path):
+    """One row per issue (AUDIT_CSV_FIELDS); unmatched chapters and orphan folders are rows too."""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=AUDIT_CSV_FIELDS)
+        writer.writeheader()
+        for r in report["files"]:
+            if r["status"] == "error":
+                writer.writerow({"json": r["json"], "image_dir": r["image_dir"], "issue": "error", "detail": r["message"]})
+            for issue in r["issues"]:
+                writer.writerow({"json": r["json"], "image_dir": r["image_dir"], **issue})
+        for entry in report["unmatched"]:
+            writer.writerow({"json": entry["json"], "issue": "unmatched_chapter", "detail": entry["reason"]})
+        for folder in report["orphan_folders"]:
+            writer.writerow({"image_dir": folder, "issue": "orphan_folder"})
+
+def format_package_report(pkg):
+    return f"{pkg['message']} Archive {pkg['old_size']:,} -> {pkg['new_size']:,} bytes in {pkg['elapsed_sec']}s"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Auto Image Mapper. Runs the GUI when no command is given.")
+    sub = parser.add_subparsers(dest="command")
+
+    p_batch = sub.add_parser("batch", help="Map every JSON file to its image folder (headless)")
+    p_batch.add_argument("--data-root", default=DEFAULT_JSON_ROOT)
+    p_batch.add_argument("--image-root", default=DEFAULT_IMAGE_ROOT)
+    p_batch.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    p_batch.add_argument("--dry-run", action="store_true")
+    p_batch.add_argument("--manifest", help=f"Manifest path (default: <data root>/../{MANIFEST_NAME})")
+    p_batch.add_argument("--no-manifest", action="store_true", help="Do not read or write the manifest")
+    p_batch.add_argument("--full", action="store_true", help="Re-map every pair, then refresh the manifest")
+    p_batch.add_argument("--io-threads", type=int, nargs="?", const=IO_THREADS, default=0,
+                         help=f"For slow synced/network drives: overlap listings and reads on N threads "
+                              f"(default {IO_THREADS}) and write changed files at the end; maps in-process")
+    p_batch.add_argument("--json-format", choices=JSON_FORMATS, default="indent",
+                         help="'compact' writes minified JSON (orjson if installed)")
+    p_batch.add_argument("--report", help="Write the JSON report to this path ('-' for stdout)")
+
+    p_batch.add_argument("--index", help="Paper index path (default: <data root>_index.bin next to the data root)")
+    p_batch.add_argument("--no-index", action="store_true", help="Do not update the paper-generation index")
+    p_batch.add_argument("--package", action="store_true", help="Rebuild data.zip after mapping")
+    p_batch.add_argument("--zip", help="Archive path (default: <data root>.zip)")
+    p_batch.add_argument("--metrics", action="store_true", help="Print per-stage timings and counters")
+    p_batch.add_argument("--profile", help="Write cProfile stats to this path (plus a .txt summary); maps in-process")
+    p_batch.add_argument("--trace", help="Write a Chrome trace-event file (chrome://tracing, Perfetto) to this path")
+
+    p_pkg = sub.add_parser("package", help="Incrementally rebuild data.zip from the data root")
+    p_pkg.add_argument("--data-root", default=DEFAULT_JSON_ROOT)
+    p_pkg.add_argument("--zip", help="Archive path (default: <data root>.zip)")
+
+    p_audit = sub.add_parser("audit", help="Report JSON <-> image folder inconsistencies (read-only)")
+    p_audit.add_argument("--data-root", default=DEFAULT_JSON_ROOT)
+    p_audit.add_argument("--image-root", default=DEFAULT_IMAGE_ROOT)
+    p_audit.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    p_audit.add_argument("--report", help="Write the JSON report to this path ('-' for stdout)")
+    p_audit.add_argument("--csv", help="Write one CSV row per issue to this path")
+    p_audit.add_argument("--fail-on", nargs="*", choices=AUDIT_ISSUES, default=list(AUDIT_FAIL_DEFAULT),
+                         help="Exit with status 1 if any of these issues are found (default: %(default)s)")
+
+    # Options (and --help) after "watch" are parsed by image_watcher, which is only imported for that command
+    sub.add_parser("watch", add_help=False, help="Map new images into their chapter JSONs as they are saved")
+
+    args, extra = parser.parse_known_args(argv)
+
+    if args.command == "watch":
+        import image_watcher
+        return image_watcher.main(extra)
+    if extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+
+    if args.command == "audit":
+        report = run_audit(args.data_root, args.image_root, workers=args.workers)
+        for r in report["files"]:
+            if r["status"] != "ok":
+                print(f"[{r['status']}] {r['json']}: {r['message']}", file=sys.stderr)
+        print(f"Audit: {report['totals']} in {report['elapsed_sec']}s", file=sys.stderr)
+        if args.report == "-":
+            json.dump(report, sys.stdout, indent=4)
+        elif args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=4)
+        if args.csv:
+            write_audit_csv(report, args.csv)
+        failing = sum(report["totals"].get(issue, 0) for issue in args.fail_on)
+        return 1 if failing or report["totals"].get("error") else 0
+
+    if args.command == "package":
+        pkg = package_data_zip(args.data_root, args.zip)
+        print(format_package_report(pkg), file=sys.stderr)
+        return 0
+
+    if args.command == "batch":
+        def print_result(result):
+            print(f"[{result['status']}] {result['json']}: {result['message']}", file=sys.stderr)
+
+        manifest_path = None if args.no_manifest else (args.manifest or default_manifest_path(args.data_root))
+        workers = args.workers
+        if args.profile and workers != 1:
+            # cProfile only sees the calling process
+            print("--profile: mapping in-process (--workers 1)", file=sys.stderr)
+            workers = 1
+        metrics = Metrics(trace=bool(args.trace))
+        with profiled(args.profile):
+            report = run_batch(args.data_root, args.image_root, dry_run=args.dry_run,
+                               workers=workers, on_result=print_result,
+                               manifest_path=manifest_path, full=args.full, json_format=args.json_format,
+                               metrics=metrics, io_threads=args.io_threads)
+        if args.trace:
+            write_trace(metrics.events, args.trace)
+        if args.metrics or args.profile:
+            for line in format_metrics(report["metrics"]):
+                print(line, file=sys.stderr)
+        for entry in report["inexact_matches"]:
+            print(f"[{entry['how']}] {entry['json']} <-> {entry['image_dir']}", file=sys.stderr)
+        if report["unmatched"]:
+            print(f"Unmatched ({len(report['unmatched'])} chapters):", file=sys.stderr)
+            for line in summarize_unmatched(report["unmatched"], args.data_root):
+                print(f"  {line}", file=sys.stderr)
+        print(f"Done: {report['totals']} in {report['elapsed_sec']}s", file=sys.stderr)
+
+        if not args.dry_run and not args.no_index:
+            from paper_index import build_paper_index  # imports this module
+            report["paper_index"] = build_paper_index(args.data_root, args.index)
+            print(report["paper_index"]["message"], file=sys.stderr)
+
+        if args.package and not args.dry_run:
+            report["package"] = package_data_zip(args.data_root, args.zip)
+            print(format_package_report(report["package"]), file=sys.stderr)
+
+        if args.report == "-":
+            json.dump(report, sys.stdout, indent=4)
+        elif args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=4)
+        return 1 if report["totals"].get("error") else 0
+
+    # Tk is only needed here, so the engine and the CLI commands run on a Python without it
+    import tkinter as tk
+    from image_mapper_gui import App
     root = tk.Tk()
     app = App(root)
     root.mainloop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,454 @@
+import json
+import time
+import datetime
+import queue
+import threading
+import tkinter as tk
+from tkinter import filedialog, messagebox, scrolledtext, ttk
+from pathlib import Path
+
+from image_mapper import (DEFAULT_JSON_ROOT, DEFAULT_IMAGE_ROOT, DEFAULT_WORKERS, AUDIT_ISSUES, ImageMapper,
+                          map_pair, run_batch, run_audit, default_manifest_path,
+                          summarize_unmatched, write_audit_csv, format_package_report)
+from zip_packager import package_data_zip, default_zip_path
+from metrics import Metrics, format_metrics, write_trace
+from prefetch_io import IO_THREADS
+from paper_index import build_paper_index
+
+# --- Configuration ---
+UI_POLL_MS = 50            # how often the GUI drains worker events and log lines
+LOG_LINES_PER_TICK = 500   # log lines inserted per drain, keeps each frame short
+
+# --- GUI Class ---
+class App:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Auto Image Mapper - Batch Edition")
+        self.root.geometry("900x700")
+        
+        self.mapper = ImageMapper()
+
+        # Worker thread state; Tk is only touched from the main thread (see drain_events)
+        self.log_queue = queue.SimpleQueue()  # formatted log lines, from any thread
+        self.events = queue.SimpleQueue()     # (kind, payload) from the worker
+        self.worker = None
+        self.cancel_event = None
+        self.pending_done = None              # (callback, value) shown once the log has caught up
+        self.progress = {"total": 0, "done": 0, "images": 0, "started": 0.0}
+        self.last_metrics = None              # Metrics of the last batch run (with trace events)
+
+        self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(UI_POLL_MS, self.drain_events)
+
+    def setup_ui(self):
+        # 1. Configuration (Root Folders)
+        frame_config = tk.LabelFrame(self.root, text="Global Configuration", padx=5, pady=5)
+        frame_config.pack(fill="x", padx=10, pady=5)
+        
+        # Data Root
+        tk.Label(frame_config, text="Data Root (JSON):").grid(row=0, column=0, sticky="w")
+        self.entry_data_root = tk.Entry(frame_config, width=60)
+        self.entry_data_root.insert(0, DEFAULT_JSON_ROOT)
+        self.entry_data_root.grid(row=0, column=1, padx=5, pady=5)
+        btn_browse_data = tk.Button(frame_config, text="Browse", command=lambda: self.browse_folder(self.entry_data_root))
+        btn_browse_data.grid(row=0, column=2, padx=5)
+
+        # Image Root
+        tk.Label(frame_config, text="Image Root:").grid(row=1, column=0, sticky="w")
+        self.entry_image_root = tk.Entry(frame_config, width=60)
+        self.entry_image_root.insert(0, DEFAULT_IMAGE_ROOT)
+        self.entry_image_root.grid(row=1, column=1, padx=5, pady=5)
+        btn_browse_img = tk.Button(frame_config, text="Browse", command=lambda: self.browse_folder(self.entry_image_root))
+        btn_browse_img.grid(row=1, column=2, padx=5)
+
+        # 2. Actions (Tabs)
+        notebook = ttk.Notebook(self.root)
+        notebook.pack(fill="both", expand=True, padx=10, pady=5)
+
+        # Tab 1: Batch Process (The new feature)
+        tab_batch = tk.Frame(notebook)
+        notebook.add(tab_batch, text="Batch Map All")
+        self.setup_batch_tab(tab_batch)
+
+        # Tab 2: Single File/Folder (Legacy-ish)
+        tab_single = tk.Frame(notebook)
+        notebook.add(tab_single, text="Single File Tool")
+        self.setup_single_tab(tab_single)
+
+        # 3. Progress (Batch / Audit)
+        frame_progress = tk.Frame(self.root)
+        frame_progress.pack(fill="x", padx=10)
+        self.progress_bar = ttk.Progressbar(frame_progress, mode="determinate")
+        self.progress_bar.pack(side="left", fill="x", expand=True)
+        self.var_progress = tk.StringVar(value="Idle")
+        tk.Label(frame_progress, textvariable=self.var_progress, width=50, anchor="w").pack(side="left", padx=5)
+        self.btn_cancel = tk.Button(frame_progress, text="Cancel", command=self.cancel_worker, state="disabled")
+        self.btn_cancel.pack(side="left")
+
+        # 4. Log Area (Shared)
+        self.log_area = scrolledtext.ScrolledText(self.root, height=15)
+        self.log_area.pack(fill="both", expand=True, padx=10, pady=5)
+
+        btn_export = tk.Button(self.root, text="Export Log", command=self.export_log)
+        btn_export.pack(side="right", padx=10, pady=5)
+        btn_export_metrics = tk.Button(self.root, text="Export Metrics", command=self.export_metrics)
+        btn_export_metrics.pack(side="right", pady=5)
+
+    def setup_batch_tab(self, parent):
+        frame_opts = tk.LabelFrame(parent, text="Batch Options", padx=5, pady=5)
+        frame_opts.pack(fill="x", padx=10, pady=10)
+
+        self.var_dry_run_batch = tk.BooleanVar(value=True)
+        chk_dry = tk.Checkbutton(frame_opts, text="Dry Run (Scanning only, no save)", variable=self.var_dry_run_batch)
+        chk_dry.pack(side="left", padx=10)
+
+        self.var_full_batch = tk.BooleanVar(value=False)
+        tk.Checkbutton(frame_opts, text="Full (ignore manifest)", variable=self.var_full_batch).pack(side="left", padx=5)
+
+        self.var_package_batch = tk.BooleanVar(value=False)
+        tk.Checkbutton(frame_opts, text="Rebuild data.zip", variable=self.var_package_batch).pack(side="left", padx=5)
+
+        tk.Label(frame_opts, text="Workers:").pack(side="left")
+        self.var_workers = tk.IntVar(value=DEFAULT_WORKERS)
+        tk.Spinbox(frame_opts, from_=1, to=64, width=4, textvariable=self.var_workers).pack(side="left", padx=5)
+
+        self.var_slow_drive = tk.BooleanVar(value=False)
+        tk.Checkbutton(frame_opts, text="Slow drive (prefetch I/O)", variable=self.var_slow_drive).pack(side="left", padx=5)
+
+        self.btn_run_all = tk.Button(frame_opts, text="RUN BATCH MAPPING", command=self.run_batch_mapping, bg="#ddffdd", font=("Arial", 10, "bold"))
+        self.btn_run_all.pack(side="left", padx=20)
+
+        self.btn_audit = tk.Button(frame_opts, text="Audit", command=self.run_audit_report)
+        self.btn_audit.pack(side="left", padx=5)
+
+        tk.Label(frame_opts, text="(Matches JSON filenames to Image folders automatically)").pack(side="left")
+
+    def setup_single_tab(self, parent):
+        # Legacy controls for specific file operations
+        frame_single_config = tk.LabelFrame(parent, text="Single Target", padx=5, pady=5)
+        frame_single_config.pack(fill="x", padx=10, pady=5)
+        
+        tk.Label(frame_single_config, text="Specific JSON File:").grid(row=0, column=0, sticky="w")
+        self.entry_single_json = tk.Entry(frame_single_config, width=50)
+        self.entry_single_json.grid(row=0, column=1, padx=5)
+        btn_browse_file = tk.Button(frame_single_config, text="Browse", command=self.browse_file)
+        btn_browse_file.grid(row=0, column=2, padx=5)
+
+        tk.Label(frame_single_config, text="Specific Image Folder:").grid(row=1, column=0, sticky="w")
+        self.entry_single_img = tk.Entry(frame_single_config, width=50)
+        self.entry_single_img.grid(row=1, column=1, padx=5)
+        btn_browse_folder = tk.Button(frame_single_config, text="Browse", command=lambda: self.browse_folder(self.entry_single_img))
+        btn_browse_folder.grid(row=1, column=2, padx=5)
+
+        # Single Image Processing
+        frame_proc = tk.LabelFrame(parent, text="Process", padx=5, pady=5)
+        frame_proc.pack(fill="x", padx=10, pady=5)
+
+        self.var_dry_run_single = tk.BooleanVar(value=False)
+        tk.Checkbutton(frame_proc, text="Dry Run", variable=self.var_dry_run_single).pack(side="left", padx=5)
+
+        tk.Label(frame_proc, text="Image Name:").pack(side="left", padx=5)
+        self.entry_single_img_name = tk.Entry(frame_proc, width=30)
+        self.entry_single_img_name.pack(side="left", padx=5)
+        
+        tk.Button(frame_proc, text="Process Single Image", command=self.process_single_entry).pack(side="left", padx=5)
+        tk.Button(frame_proc, text="Process Entire Folder", command=self.process_single_folder).pack(side="left", padx=5)
+
+
+    def browse_folder(self, entry_widget):
+        path = filedialog.askdirectory()
+        if path:
+            entry_widget.delete(0, tk.END)
+            entry_widget.insert(0, path)
+
+    def browse_file(self):
+        path = filedialog.askopenfilename(filetypes=[("JSON Files", "*.json")])
+        if path:
+            self.entry_single_json.delete(0, tk.END)
+            self.entry_single_json.insert(0, path)
+
+    def log(self, message):
+        """Thread-safe: queues the line, drain_events appends queued lines in one insert."""
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        self.log_queue.put(f"[{timestamp}] {message}\n")
+
+    def flush_log(self, limit=None):
+        lines = []
+        while limit is None or len(lines) < limit:
+            try:
+                lines.append(self.log_queue.get_nowait())
+            except queue.Empty:
+                break
+        if lines:
+            self.log_area.insert(tk.END, "".join(lines))
+            self.log_area.see(tk.END)
+
+    # --- Worker thread ---
+    def drain_events(self):
+        """Runs on the Tk thread every UI_POLL_MS: applies worker events and flushes the log."""
+        while True:
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "start":
+                self.progress["total"] = payload
+                self.progress_bar.configure(maximum=max(1, payload), value=0)
+            elif kind == "result":
+                self.progress["done"] += 1
+                self.progress["images"] += payload.get("images", 0)
+                self.progress_bar.configure(value=self.progress["done"])
+            elif kind in ("done", "failed"):
+                self.worker = None
+                self.btn_run_all.configure(state="normal")
+                self.btn_audit.configure(state="normal")
+                self.btn_cancel.configure(state="disabled")
+                self.pending_done = payload
+            self.update_progress_label(finished=kind in ("done", "failed"))
+
+        self.flush_log(LOG_LINES_PER_TICK)
+        if self.pending_done and self.log_queue.empty():
+            callback, value = self.pending_done
+            self.pending_done = None
+            self.root.after_idle(callback, value)
+        self.root.after(UI_POLL_MS, self.drain_events)
+
+    def update_progress_label(self, finished=False):
+        p = self.progress
+        elapsed = time.perf_counter() - p["started"] if p["started"] else 0.0
+        text = f"{p['done']}/{p['total']} chapters, {p['images']:,} images, {elapsed:.1f}s"
+        if finished:
+            text += " (cancelled)" if self.cancel_event and self.cancel_event.is_set() else " (done)"
+        elif p["done"] and p["total"]:
+            text += f", ETA {elapsed / p['done'] * (p['total'] - p['done']):.0f}s"
+        self.var_progress.set(text)
+
+    def start_worker(self, job, on_done):
+        """
+        Runs job(cancel_event) on a background thread so mainloop stays responsive.
+        job reports progress through on_start/on_result (see run_batch); its
+        return value is passed to on_done(value) on the Tk thread.
+        """
+        if self.worker:
+            return False
+        self.cancel_event = threading.Event()
+        self.progress = {"total": 0, "done": 0, "images": 0, "started": time.perf_counter()}
+        self.progress_bar.configure(value=0)
+        self.btn_run_all.configure(state="disabled")
+        self.btn_audit.configure(state="disabled")
+        self.btn_cancel.configure(state="normal")
+
+        def target(cancel=self.cancel_event):
+            try:
+                self.events.put(("done", (on_done, job(cancel))))
+            except Exception as e:
+                self.log(f"ERROR: {e}")
+                self.events.put(("failed", (lambda msg: messagebox.showerror("Error", msg), str(e))))
+
+        self.worker = threading.Thread(target=target, daemon=True)
+        self.worker.start()
+        return True
+
+    def worker_callbacks(self, log_results=True):
+        """on_start/on_result for run_batch/run_audit, called on the worker thread."""
+        def on_start(total):
+            self.events.put(("start", total))
+
+        def on_result(result):
+            if log_results:
+                self.log_result(result)
+            self.events.put(("result", result))
+        return on_start, on_result
+
+    def cancel_worker(self):
+        if self.worker and not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self.btn_cancel.configure(state="disabled")
+            self.log("Cancelling: running chapters finish, the rest are skipped...")
+
+    def on_close(self):
+        if self.cancel_event:
+            self.cancel_event.set()
+        self.root.destroy()
+
+    # --- Batch Logic ---
+    def run_batch_mapping(self):
+        data_root = Path(self.entry_data_root.get().strip())
+        image_root = Path(self.entry_image_root.get().strip())
+        dry_run = self.var_dry_run_batch.get()
+        workers = self.var_workers.get()
+        full = self.var_full_batch.get()
+        package = self.var_package_batch.get() and not dry_run
+        io_threads = IO_THREADS if self.var_slow_drive.get() else 0
+
+        if not data_root.exists() or not image_root.exists():
+            messagebox.showerror("Error", "Check that Data Root and Image Root paths exist.")
+            return
+
+        mode = f"I/O threads: {io_threads}" if io_threads else f"Workers: {workers}"
+        self.log(f"=== STARTED BATCH MAPPING (Dry Run: {dry_run}, {mode}) ===")
+        self.log(f"Data Source: {data_root}")
+        self.log(f"Image Source: {image_root}")
+        on_start, on_result = self.worker_callbacks()
+
+        # Runs on the worker thread: only self.log and the event queue are used here
+        def job(cancel):
+            metrics = Metrics(trace=True)
+            report = run_batch(data_root, image_root, dry_run=dry_run, workers=workers,
+                               on_result=on_result, on_start=on_start, cancel=cancel,
+                               manifest_path=default_manifest_path(data_root), full=full,
+                               metrics=metrics, io_threads=io_threads)
+            self.last_metrics = metrics
+
+            for entry in report["inexact_matches"]:
+                self.log(f"{entry['how'].upper()} MATCH: {Path(entry['json']).name} <-> {Path(entry['image_dir']).name}")
+            if report["unmatched"]:
+                self.log(f"UNMATCHED ({len(report['unmatched'])} chapters, no image folder):")
+                for line in summarize_unmatched(report["unmatched"], data_root):
+                    self.log(f"  {line}")
+
+            if not dry_run:
+                try:
+                    self.log(build_paper_index(data_root)["message"])
+                except Exception as e:
+                    self.log(f"ERROR updating the paper index: {e}")
+
+            cancelled = report["totals"].get("cancelled", 0)
+            if cancelled:
+                self.log(f"CANCELLED: {cancelled} chapters not mapped (run again to finish them).")
+            elif package:
+                self.log(f"Packaging {default_zip_path(data_root)} ...")
+                try:
+                    self.log(format_package_report(package_data_zip(data_root)))
+                except Exception as e:
+                    self.log(f"ERROR packaging data.zip: {e}")
+
+            self.log("Stage timings:")
+            for line in format_metrics(report["metrics"]):
+                self.log(f"  {line}")
+            total_files = report["totals"]["pairs"] - cancelled
+            self.log(f"=== BATCH COMPLETE. Processed {total_files} JSON files in {report['elapsed_sec']}s. ===")
+            return total_files, cancelled
+
+        def done(value):
+            total_files, cancelled = value
+            note = f"\nCancelled: {cancelled} chapters skipped" if cancelled else ""
+            messagebox.showinfo("Done", f"Batch processing complete.\nFiles touched: {total_files}{note}")
+
+        self.start_worker(job, done)
+
+    def run_audit_report(self):
+        data_root = Path(self.entry_data_root.get().strip())
+        image_root = Path(self.entry_image_root.get().strip())
+        workers = self.var_workers.get()
+        if not data_root.exists() or not image_root.exists():
+            messagebox.showerror("Error", "Check that Data Root and Image Root paths exist.")
+            return
+
+        self.log("=== STARTED AUDIT (read-only) ===")
+        on_start, on_result = self.worker_callbacks(log_results=False)
+
+        def job(cancel):
+            report = run_audit(data_root, image_root, workers=workers,
+                               on_result=on_result, on_start=on_start, cancel=cancel)
+            for r in report["files"]:
+                if r["status"] != "ok":
+                    self.log(f"{Path(r['json']).name} <-> {Path(r['image_dir']).name}: {r['message']}")
+            for folder in report["orphan_folders"]:
+                self.log(f"ORPHAN FOLDER (no JSON): {folder}")
+            if report["unmatched"]:
+                self.log(f"UNMATCHED ({len(report['unmatched'])} chapters, no image folder)")
+            totals = report["totals"]
+            self.log(f"=== AUDIT COMPLETE in {report['elapsed_sec']}s: "
+                     + ", ".join(f"{totals[k]} {k}" for k in AUDIT_ISSUES if totals.get(k)) + " ===")
+            return report
+
+        def done(report):
+            path = filedialog.asksaveasfilename(title="Save audit report", defaultextension=".json",
+                                                filetypes=[("JSON", "*.json"), ("CSV", "*.csv")])
+            if path:
+                try:
+                    if path.lower().endswith(".csv"):
+                        write_audit_csv(report, path)
+                    else:
+                        with open(path, 'w', encoding='utf-8') as f:
+                            json.dump(report, f, indent=4)
+                    self.log(f"Audit report saved to {path}")
+                except Exception as e:
+                    messagebox.showerror("Export Error", str(e))
+
+        self.start_worker(job, done)
+
+    def log_result(self, result):
+        self.log(f"MATCH: {Path(result['json']).name} <-> {Path(result['image_dir']).name}")
+        self.log(f"  -> {result['message']}")
+
+    def process_pair(self, json_path, img_dir, dry_run):
+        self.log_result(map_pair(json_path, img_dir, dry_run))
+
+
+    # --- Single Logic (Legacy) ---
+    def process_single_entry(self):
+        json_path = self.entry_single_json.get().strip()
+        img_name = self.entry_single_img_name.get().strip()
+        
+        if not json_path or not img_name:
+            messagebox.showwarning("Input", "JSON path and Image Name required")
+            return
+            
+        success, msg = self.mapper.set_json_path(json_path)
+        if not success:
+            self.log(f"Error: {msg}")
+            return
+
+        parsed, err = self.mapper.parse_image_name(img_name)
+        if err:
+            self.log(f"Parse Error: {err}")
+            return
+            
+        success, msg = self.mapper.update_entry(parsed, dry_run=self.var_dry_run_single.get())
+        self.log(msg)
+        
+        if success and not self.var_dry_run_single.get():
+            self.mapper.save_json()
+
+    def process_single_folder(self):
+        json_path = self.entry_single_json.get().strip()
+        img_folder = self.entry_single_img.get().strip()
+        
+        if not json_path or not img_folder:
+             messagebox.showwarning("Input", "JSON path and Image Folder required")
+             return
+
+        # Reuse the pair processor logic basically
+        self.process_pair(json_path, Path(img_folder), self.var_dry_run_single.get())
+
+
+    def export_metrics(self):
+        """Saves the last batch run's stage timings/counters, plus a Chrome trace file next to it."""
+        if not self.last_metrics:
+            messagebox.showinfo("Export Metrics", "Run a batch first.")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON Files", "*.json")])
+        if path:
+            try:
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(self.last_metrics.report(), f, indent=4)
+                trace_path = str(Path(path).with_suffix(".trace.json"))
+                write_trace(self.last_metrics.events, trace_path)
+                self.log(f"Metrics exported to {path} (trace: {trace_path})")
+            except Exception as e:
+                messagebox.showerror("Export Error", str(e))
+
+    def export_log(self):
+        self.flush_log()
+        content = self.log_area.get("1.0", tk.END)
+        path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text Files", "*.txt")])
+        if path:
+            try:
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                self.log(f"Log exported to {path}")
+            except Exception as e:
+                messagebox.showerror("Export Error", str(e))
@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import argparse
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageOps
+
+# --- Configuration ---
+TRIM_THRESHOLD = 245     # pixels lighter than this (0-255 gray) count as background
+TRIM_PAD = 6             # whitespace kept around the content, in pixels
+MONO_CHROMA = 60         # pixels whose max-min channel spread exceeds this are colour ink
+MONO_COLOR_SHARE = 0.002 # monochrome if fewer than this share of the content pixels are colour ink
+QUANTIZE_COLORS = 16     # palette size for monochrome scans
+SIDECAR_QUALITY = 85     # WebP/AVIF quality for photos; monochrome sidecars are lossless
+DEFAULT_WORKERS = os.cpu_count() or 1
+NEW_FILE_MODE = 0o644
+OPTIMIZABLE_EXTENSIONS = {'.png'}               # rewritten in place (names are referenced by the JSON)
+SIDECAR_SOURCE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+
+def supported_sidecar_formats():
+    """Sidecar formats this Pillow build can write ("webp", "avif")."""
+    exts = Image.registered_extensions()
+    return [fmt for fmt in ("webp", "avif") if f".{fmt}" in exts and exts[f".{fmt}"] in Image.SAVE]
+
+def trim_whitespace(img, threshold=TRIM_THRESHOLD, pad=TRIM_PAD):
+    """Crops away near-white margins, keeping pad pixels around the content."""
+    gray = img.convert("L")
+    content = gray.point(lambda v: 255 if v < threshold else 0)
+    bbox = content.getbbox()
+    if not bbox:
+        return img  # blank image, leave it alone
+    x0, y0, x1, y1 = bbox
+    bbox = (max(0, x0 - pad), max(0, y0 - pad), min(img.width, x1 + pad), min(img.height, y1 + pad))
+    return img if bbox == (0, 0, img.width, img.height) else img.crop(bbox)
+
+def is_mostly_monochrome(img, chroma=MONO_CHROMA, share=MONO_COLOR_SHARE):
+    """
+    True for black-and-white or grayscale scans: almost none of the content
+    (non-background) pixels are coloured. Counted at full size, since thin
+    coloured lines on a white figure vanish in a mean or a thumbnail.
+    """
+    if img.mode in ("1", "L", "LA"):
+        return True
+    rgb = img.convert("RGB")
+    r, g, b = rgb.split()
+    # Channel spread rather than HSV saturation, which is high for dark JPEG noise
+    spread = ImageChops.subtract(ImageChops.lighter(ImageChops.lighter(r, g), b),
+                                 ImageChops.darker(ImageChops.darker(r, g), b))
+    colored = spread.point(lambda v: 255 if v > chroma else 0).histogram()[255]
+    content = rgb.convert("L").point(lambda v: 255 if v < TRIM_THRESHOLD else 0).histogram()[255]
+    return colored <= content * share
+
+def optimize_image(img, trim=True):
+    """
+    Returns (image, monochrome): trimmed and, for monochrome scans,
+    palette-quantized to QUANTIZE_COLORS grays.
+    """
+    if img.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white, crops are always shown on paper-white
+        background = Image.new("RGB", img.size, "white")
+        background.paste(img.convert("RGBA"), mask=img.convert("RGBA").getchannel("A"))
+        img = background
+    if trim:
+        img = trim_whitespace(img)
+    monochrome = is_mostly_monochrome(img)
+    if monochrome:
+        img = ImageOps.grayscale(img).quantize(colors=QUANTIZE_COLORS)
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+    return img, monochrome
+
+def _encode_to(path, img, fmt, **params):
+    """Saves to a temp file next to path and returns its name (caller renames or discards)."""
+    fd, tmp_name = tempfile.mkstemp(dir=Path(path).parent, prefix=f".{Path(path).name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        img.save(tmp_name, format=fmt, **params)
+        # mkstemp creates 0600 files; keep the target's mode, or use a normal file mode
+        if Path(path).exists():
+            shutil.copymode(path, tmp_name)
+        else:
+            os.chmod(tmp_name, NEW_FILE_MODE)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return tmp_name
+
+def write_sidecars(img, path, formats, monochrome=False):
+    """Writes path.webp / path.avif next to the image. Returns {format: bytes}."""
+    sizes = {}
+    available = supported_sidecar_formats()
+    for fmt in formats:
+        if fmt not in available:
+            continue
+        target = Path(path).with_suffix(f".{fmt}")
+        sidecar = img.convert("L") if monochrome else img
+        params = {"lossless": True} if monochrome and fmt == "webp" else {"quality": SIDECAR_QUALITY}
+        os.replace(_encode_to(target, sidecar, fmt.upper(), **params), target)
+        sizes[fmt] = target.stat().st_size
+    return sizes
+
+def save_optimized(img, path, sidecar_formats=(), trim=True):
+    """Export-path entry point: optimizes a freshly cropped image and saves it as PNG (+ sidecars)."""
+    img, monochrome = optimize_image(img, trim=trim)
+    os.replace(_encode_to(path, img, "PNG", optimize=True), path)
+    write_sidecars(img, path, sidecar_formats, monochrome)
+    return Path(path).stat().st_size
+
+def optimize_file(path, sidecar_formats=(), trim=True, dry_run=False):
+    """
+    Re-optimizes one existing image. PNGs are replaced only when the result is
+    smaller; JPEGs are never rewritten (that would be lossy) but get sidecars.
+    Returns a result dict with bytes before/after.
+    """
+    path = Path(path)
+    result = {"path": str(path), "before": path.stat().st_size, "after": None, "sidecars": {}, "status": "kept"}
+    try:
+        with Image.open(path) as src:
+            src.load()
+            img, monochrome = optimize_image(src, trim=trim)
+        if path.suffix.lower() in OPTIMIZABLE_EXTENSIONS:
+            tmp_name = _encode_to(path, img, "PNG", optimize=True)
+            new_size = os.path.getsize(tmp_name)
+            if new_size < result["before"] and not dry_run:
+                os.replace(tmp_name, path)
+                result["status"] = "optimized"
+            else:
+                os.unlink(tmp_name)
+                if new_size < result["before"]:
+                    result["status"] = "would_optimize"
+            result["after"] = min(new_size, result["before"])
+        else:
+            result["after"] = result["before"]
+        if sidecar_formats and not dry_run:
+            result["sidecars"] = write_sidecars(img, path, sidecar_formats, monochrome)
+    except Exception as e:
+        result.update(status="error", after=result["before"], error=str(e))
+    return result
+
+def _optimize_batch(paths, sidecar_formats, trim, dry_run):
+    return [optimize_file(p, sidecar_formats, trim, dry_run) for p in paths]
+
+def optimize_tree(image_root, workers=DEFAULT_WORKERS, sidecar_formats=(), trim=True, dry_run=False, batch_size=64):
+    """
+    Re-optimizes every image under image_root (e.g. Questions_Image_Data) on a
+    process pool. Returns a JSON-serializable report with bytes before/after.
+    """
+    started = time.perf_counter()
+    image_root = Path(image_root)
+    # Skips dot files and anything under dot folders (e.g. .duplicates/ from image_dedupe)
+    paths = sorted(str(p) for p in image_root.rglob("*")
+                   if p.suffix.lower() in SIDECAR_SOURCE_EXTENSIONS
+                   and not any(part.startswith(".") for part in p.relative_to(image_root).parts))
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    results = []
+    workers = max(1, int(workers or 1))
+    if workers == 1:
+        for batch in batches:
+            results.extend(_optimize_batch(batch, sidecar_formats, trim, dry_run))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            n = len(batches)
+            for part in pool.map(_optimize_batch, batches, [sidecar_formats] * n, [trim] * n, [dry_run] * n):
+                results.extend(part)
+
+    totals = {"files": len(results), "before": 0, "after": 0, "sidecar_bytes": 0}
+    for r in results:
+        totals["before"] += r["before"]
+        totals["after"] += r["after"]
+        totals["sidecar_bytes"] += sum(r["sidecars"].values())
+        totals[r["status"]] = totals.get(r["status"], 0) + 1
+    totals["saved"] = totals["before"] - totals["after"]
+    return {
+        "image_root": str(image_root),
+        "dry_run": dry_run,
+        "sidecar_formats": list(sidecar_formats),
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+        "totals": totals,
+        "files": results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trim and re-compress question images in place.")
+    parser.add_argument("image_root", help="e.g. backend/data/Questions_Image_Data")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--formats", nargs="*", default=[], choices=("webp", "avif"),
+                        help="Also write these formats next to each image")
+    parser.add_argument("--no-trim", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--report", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    missing = set(args.formats) - set(supported_sidecar_formats())
+    if missing:
+        print(f"Warning: this Pillow build cannot write {', '.join(sorted(missing))}; skipping.", file=sys.stderr)
+
+    report = optimize_tree(args.image_root, workers=args.workers, sidecar_formats=tuple(args.formats),
+                           trim=not args.no_trim, dry_run=args.dry_run)
+    t = report["totals"]
+    print(f"{t['files']} images: {t['before']:,} -> {t['after']:,} bytes ({t['saved']:,} saved), "
+          f"sidecars {t['sidecar_bytes']:,} bytes, {t.get('error', 0)} errors in {report['elapsed_sec']}s",
+          file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    return 1 if t.get("error") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import mimetypes
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from image_mapper import DEFAULT_IMAGE_ROOT, IMAGE_EXTENSIONS, atomic_write_bytes
+
+try:
+    import boto3  # optional, only needed for real S3 / S3-compatible targets
+    from boto3.s3.transfer import TransferConfig
+except ImportError:
+    boto3 = None
+
+# --- Configuration ---
+S3_PREFIX = "Questions_Image_Data"  # keys match s3PathHelper.js: <prefix>/<exam>/<std>/<subject>/<chapter folder>/<file>
+SYNC_MANIFEST_NAME = ".image_sync_manifest.json"  # stored next to the image root
+SYNC_MANIFEST_VERSION = 1
+SYNC_WORKERS = 16                   # concurrent hashes / uploads (network-bound, not CPU-bound)
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNK = 8 * 1024 * 1024
+HASH_CHUNK = 1 << 20
+MANIFEST_SAVE_EVERY = 500           # completed transfers between manifest checkpoints
+SKIP_PREFIXES = (".",)
+
+def default_sync_manifest_path(image_root):
+    image_root = Path(image_root)
+    return image_root.parent / SYNC_MANIFEST_NAME
+
+def file_md5(path):
+    """MD5 hex digest, streamed. MD5 so single-part uploads can be verified by S3 (Content-MD5 / ETag)."""
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def scan_images(image_root, prefix=S3_PREFIX):
+    """Returns {key: (path, mtime_ns, size)} for every image under image_root."""
+    image_root = Path(image_root)
+    files = {}
+    stack = [(str(image_root), prefix)]
+    while stack:
+        path, key_prefix = stack.pop()
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith(SKIP_PREFIXES):
+                    continue
+                key = f"{key_prefix}/{entry.name}" if key_prefix else entry.name
+                if entry.is_dir():
+                    stack.append((entry.path, key))
+                elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                    st = entry.stat()
+                    files[key] = (entry.path, st.st_mtime_ns, st.st_size)
+    return files
+
+# --- Targets ---
+class S3Target:
+    """A bucket on S3 or any S3-compatible server (MinIO, LocalStack, moto) via endpoint_url."""
+    def __init__(self, bucket, endpoint_url=None, region=None):
+        if boto3 is None:
+            raise RuntimeError("boto3 is not installed (pip install boto3), or use a directory target")
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url,
+                                   region_name=region or os.environ.get("AWS_REGION", "ap-south-1"))
+        # Our own pool uploads many files at once; parts of one large file go two at a time
+        self.transfer = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_CHUNK,
+                                       max_concurrency=2)
+        self.name = f"s3://{bucket}" + (f"@{endpoint_url}" if endpoint_url else "")
+
+    def upload(self, path, key, md5):
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        self.client.upload_file(str(path), self.bucket, key, Config=self.transfer,
+                                ExtraArgs={"ContentType": content_type, "Metadata": {"md5": md5}})
+
+    def copy(self, src_key, key):
+        self.client.copy_object(Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": src_key},
+                                MetadataDirective="COPY")
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def list_hashes(self, prefix):
+        """{key: md5} for objects under prefix. Multipart ETags are not MD5s and are left out (re-uploaded once)."""
+        hashes = {}
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=f"{prefix}/"):
+            for obj in page.get("Contents", []):
+                etag = obj["ETag"].strip('"')
+                if "-" not in etag:
+                    hashes[obj["Key"]] = etag
+        return hashes
+
+class DirectoryTarget:
+    """Plain directory laid out like the bucket; a stand-in for dry runs and tests without a server."""
+    def __init__(self, root):
+        self.root = Path(root)
+        self.name = f"dir://{self.root.resolve().as_posix()}"
+
+    def upload(self, path, key, md5):
+        dest = self.root / key
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as out, open(path, 'rb') as src:
+                shutil.copyfileobj(src, out, MULTIPART_CHUNK)
+            os.replace(tmp_name, dest)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+
+    def copy(self, src_key, key):
+        dest = self.root / key
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(self.root / src_key, dest)
+
+    def delete(self, key):
+        try:
+            (self.root / key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def list_hashes(self, prefix):
+        return {key: file_md5(path) for key, (path, _, _) in scan_images(self.root / prefix, prefix).items()}
+
+# --- Sync ---
+class SyncManifest:
+    """
+    Local record of the sync state, so a no-change run never hashes or lists the bucket:
+    files:  key -> [mtime_ns, size, md5]  (hash cache, valid while mtime and size match)
+    remote: key -> md5                    (what the target is known to hold)
+    """
+    def __init__(self, path, target_name):
+        self.path = Path(path)
+        self.target_name = target_name
+        self.files = {}
+        self.remote = {}
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != SYNC_MANIFEST_VERSION:
+            return
+        self.files = data.get("files", {})
+        # Another bucket or endpoint: the hash cache still holds, the remote state does not
+        if data.get("target") == self.target_name:
+            self.remote = data.get("remote", {})
+
+    def save(self):
+        payload = {"version": SYNC_MANIFEST_VERSION, "target": self.target_name,
+                   "files": self.files, "remote": self.remote}
+        atomic_write_bytes(self.path, json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+def sync_images(image_root, target, manifest_path=None, prefix=S3_PREFIX, workers=SYNC_WORKERS,
+                dry_run=False, delete=False, reconcile=False, on_progress=None):
+    """
+    Pushes new and changed images under image_root to target.
+    Files are hashed only when their mtime or size changed since the last run,
+    and only keys whose hash differs from the manifest's remote state are sent.
+    Content already on the target under another key is copied server-side.
+    With delete, keys no longer present locally are removed from the target.
+    With reconcile, the remote state is rebuilt from a listing of the target
+    first (e.g. the first sync against a bucket that was filled by hand).
+    Returns a JSON-serializable report.
+    """
+    started = time.perf_counter()
+    manifest = SyncManifest(manifest_path or default_sync_manifest_path(image_root), target.name)
+    manifest.load()
+    if reconcile:
+        manifest.remote = target.list_hashes(prefix)
+    report = {"target": target.name, "dry_run": dry_run, "files": 0, "hashed": 0, "unchanged": 0,
+              "uploaded": 0, "copied": 0, "deleted": 0, "failed": 0, "bytes_uploaded": 0, "errors": []}
+
+    local = scan_images(image_root, prefix)
+    report["files"] = len(local)
+    hashes = {}
+    to_hash = []
+    for key, (path, mtime_ns, size) in local.items():
+        cached = manifest.files.get(key)
+        if cached and cached[0] == mtime_ns and cached[1] == size:
+            hashes[key] = cached[2]
+        else:
+            to_hash.append(key)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(file_md5, local[key][0]): key for key in to_hash}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                hashes[key] = future.result()
+            except OSError as e:
+                report["errors"].append({"key": key, "action": "hash", "error": str(e)})
+                continue
+            path, mtime_ns, size = local[key]
+            manifest.files[key] = [mtime_ns, size, hashes[key]]
+        report["hashed"] = len(to_hash)
+        for key in set(manifest.files) - set(local):
+            del manifest.files[key]
+
+        # Plan: copy content the target already holds, upload the rest. A copy source must keep its
+        # content for the whole run: keys re-uploaded or copied over in this run are not used
+        on_target = {md5: key for key, md5 in manifest.remote.items() if hashes.get(key, md5) == md5}
+        plan = []
+        for key, md5 in sorted(hashes.items()):
+            if manifest.remote.get(key) == md5:
+                report["unchanged"] += 1
+            elif md5 in on_target:
+                plan.append(("copy", key, md5, on_target[md5]))
+            else:
+                plan.append(("upload", key, md5, None))
+                on_target[md5] = key  # later duplicates in this run are copied from it
+        deletions = sorted(set(manifest.remote) - set(local)) if delete else []
+        report["planned"] = {"upload": sum(1 for j in plan if j[0] == "upload"),
+                             "copy": sum(1 for j in plan if j[0] == "copy"), "delete": len(deletions)}
+
+        if not dry_run:
+            # Copies may read keys uploaded in this run, so they go after the uploads
+            uploads = [job for job in plan if job[0] == "upload"]
+            copies = [job for job in plan if job[0] == "copy"]
+            for batch in (uploads, copies):
+                _run_transfers(pool, target, batch, local, manifest, report, on_progress)
+            for key in deletions:
+                try:
+                    target.delete(key)
+                    manifest.remote.pop(key, None)
+                    report["deleted"] += 1
+                except Exception as e:
+                    report["errors"].append({"key": key, "action": "delete", "error": str(e)})
+
+    if to_hash or not dry_run:
+        manifest.save()  # even a dry run keeps the hashes it computed
+    report["failed"] = len(report["errors"])
+    report["elapsed_sec"] = round(time.perf_counter() - started, 3)
+    return report
+
+def _run_transfers(pool, target, jobs, local, manifest, report, on_progress):
+    def transfer(job):
+        action, key, md5, src_key = job
+        if action == "upload":
+            target.upload(local[key][0], key, md5)
+        else:
+            target.copy(src_key, key)
+        return job
+
+    futures = {pool.submit(transfer, job): job for job in jobs}
+    for done, future in enumerate(as_completed(futures), 1):
+        try:
+            action, key, md5, _ = future.result()
+        except Exception as e:
+            action, key = futures[future][:2]
+            report["errors"].append({"key": key, "action": action, "error": str(e)})
+            continue
+        manifest.remote[key] = md5
+        if action == "upload":
+            report["uploaded"] += 1
+            report["bytes_uploaded"] += local[key][2]
+        else:
+            report["copied"] += 1
+        if done % MANIFEST_SAVE_EVERY == 0:
+            manifest.save()  # an interrupted sync resumes from here
+        if on_progress:
+            on_progress(action, key)
+
+def format_sync_report(report):
+    planned = report.get("planned", {})
+    if report["dry_run"]:
+        return (f"DRY RUN {report['target']}: {report['files']:,} images, {report['hashed']:,} hashed, "
+                f"would upload {planned.get('upload', 0):,}, copy {planned.get('copy', 0):,}, "
+                f"delete {planned.get('delete', 0):,} in {report['elapsed_sec']}s")
+    return (f"{report['target']}: {report['files']:,} images, {report['hashed']:,} hashed, "
+            f"{report['uploaded']:,} uploaded ({report['bytes_uploaded']:,} bytes), {report['copied']:,} copied, "
+            f"{report['deleted']:,} deleted, {report['unchanged']:,} unchanged, {report['failed']} failed "
+            f"in {report['elapsed_sec']}s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upload new and changed question images to the S3 bucket layout.")
+    parser.add_argument("--image-root", default=DEFAULT_IMAGE_ROOT)
+    parser.add_argument("--bucket", default=os.environ.get("S3_BUCKET_NAME") or os.environ.get("AWS_BUCKET_NAME"))
+    parser.add_argument("--endpoint-url", help="S3-compatible server, e.g. http://localhost:9000 for MinIO")
+    parser.add_argument("--region")
+    parser.add_argument("--target-dir", help="Sync into a local directory instead of a bucket")
+    parser.add_argument("--prefix", default=S3_PREFIX)
+    parser.add_argument("--manifest", help=f"Sync manifest path (default: <image root>/../{SYNC_MANIFEST_NAME})")
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--delete", action="store_true", help="Remove uploaded keys whose local file is gone")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="List the target first instead of trusting the manifest (first sync of a filled bucket)")
+    parser.add_argument("--report", help="Write the JSON report to this path ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    if args.target_dir:
+        target = DirectoryTarget(args.target_dir)
+    elif args.bucket:
+        target = S3Target(args.bucket, args.endpoint_url, args.region)
+    else:
+        parser.error("Give --bucket (or set S3_BUCKET_NAME) or --target-dir")
+
+    report = sync_images(args.image_root, target, args.manifest, prefix=args.prefix, workers=args.workers,
+                         dry_run=args.dry_run, delete=args.delete, reconcile=args.reconcile)
+    for error in report["errors"]:
+        print(f"[{error['action']} failed] {error['key']}: {error['error']}", file=sys.stderr)
+    print(format_sync_report(report), file=sys.stderr)
+    if args.report == "-":
+        json.dump(report, sys.stdout, indent=4)
+    elif args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    return 1 if report["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
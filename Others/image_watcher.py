@@ -0,0 +1,283 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from pathlib import Path
+
+from image_mapper import (DEFAULT_JSON_ROOT, DEFAULT_IMAGE_ROOT, DEFAULT_ALIAS_MAP, IMAGE_EXTENSIONS, JSON_FORMATS,
+                          ChapterFolderIndex, find_chapter_json, map_images)
+from paper_index import build_paper_index, default_index_path
+
+try:
+    # File system events (inotify on Linux, ReadDirectoryChangesW on Windows); polling is used without it
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# --- Configuration ---
+WATCH_DEBOUNCE_SEC = 0.4   # quiet time after the last new file before a chapter is mapped
+WATCH_MAX_DELAY_SEC = 2.0  # map anyway after this long, even while files keep arriving
+WATCH_POLL_SEC = 0.5       # polling fallback: how often directory mtimes are checked
+
+class FolderJsonMap:
+    """
+    Cached image folder -> chapter JSON lookups (find_chapter_json per folder,
+    one shared ChapterFolderIndex). Misses are retried with a fresh listing of
+    the subject folder, since a new chapter folder may just have been created.
+    """
+    def __init__(self, data_root, image_root, alias_path=DEFAULT_ALIAS_MAP):
+        self.data_root = Path(data_root)
+        self.image_root = Path(image_root)
+        self.index = ChapterFolderIndex(image_root, alias_path)
+        self.cache = {}  # img_dir -> json path
+
+    def lookup(self, img_dir):
+        img_dir = Path(img_dir)
+        json_path = self.cache.get(img_dir)
+        if json_path is None:
+            json_path = self._resolve(img_dir)
+            if json_path is None:
+                self.forget_subject(img_dir)
+                json_path = self._resolve(img_dir)
+            if json_path is not None:
+                self.cache[img_dir] = json_path
+        return json_path
+
+    def _resolve(self, img_dir):
+        return find_chapter_json(img_dir, self.data_root, self.image_root, index=self.index)
+
+    def forget_subject(self, img_dir):
+        try:
+            rel_path = Path(img_dir).resolve().parent.relative_to(self.image_root.resolve())
+        except ValueError:
+            return
+        self.index.subjects.pop(rel_path.as_posix(), None)
+
+class PollingSource:
+    """
+    Fallback change source: rescans only directories whose mtime changed
+    (adding or renaming a file bumps its folder's mtime), and reports names
+    that were not there on the previous scan.
+    """
+    def __init__(self, image_root, on_file, interval=WATCH_POLL_SEC):
+        self.image_root = Path(image_root)
+        self.on_file = on_file
+        self.interval = interval
+        self.dirs = {}  # dir path -> (mtime_ns, set of file names, list of subdirs)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def scan(self, report=True):
+        seen = set()
+        stack = [str(self.image_root)]
+        while stack:
+            path = stack.pop()
+            seen.add(path)
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            known = self.dirs.get(path)
+            if known and known[0] == mtime_ns:
+                stack.extend(known[2])
+                continue
+            files, subdirs = set(), []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir():
+                            subdirs.append(entry.path)
+                        else:
+                            files.add(entry.name)
+            except OSError:
+                continue
+            if report:
+                for name in files - (known[1] if known else set()):
+                    self.on_file(os.path.join(path, name))
+            self.dirs[path] = (mtime_ns, files, subdirs)
+            stack.extend(subdirs)
+        for path in set(self.dirs) - seen:
+            del self.dirs[path]
+
+    def start(self):
+        self.scan(report=False)  # files already on disk are the batch mapper's job
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.scan()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, on_file):
+        super().__init__()
+        self.on_file = on_file
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.on_file(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.on_file(event.dest_path)
+
+class EventSource:
+    """watchdog observer over the image root; reports created and moved-in files."""
+    def __init__(self, image_root, on_file):
+        self.observer = Observer()
+        self.observer.schedule(_EventHandler(on_file), str(image_root), recursive=True)
+
+    def start(self):
+        self.observer.start()
+
+    def stop(self):
+        self.observer.stop()
+        self.observer.join()
+
+class ImageWatcher:
+    """
+    Maps new images under image_root into their chapter JSONs as they appear.
+    New names are collected per folder; once no file has arrived for
+    debounce seconds (or max_delay has passed) each touched chapter is
+    mapped with map_images, i.e. loaded, updated and saved once. With an
+    index_path, the paper index is then updated for the saved chapters.
+    """
+    def __init__(self, data_root, image_root, debounce=WATCH_DEBOUNCE_SEC, max_delay=WATCH_MAX_DELAY_SEC,
+                 poll_interval=WATCH_POLL_SEC, json_format="indent", alias_path=DEFAULT_ALIAS_MAP,
+                 on_result=None, use_events=True, index_path=None):
+        self.data_root = Path(data_root)
+        self.image_root = Path(image_root)
+        self.index_path = index_path
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.json_format = json_format
+        self.on_result = on_result
+        self.folders = FolderJsonMap(data_root, image_root, alias_path)
+        self.pending = {}  # img_dir -> set of new image names
+        self.first_event = None
+        self.last_event = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        if use_events and Observer is not None:
+            self.source = EventSource(self.image_root, self.add_file)
+        else:
+            self.source = PollingSource(self.image_root, self.add_file, poll_interval)
+        self.totals = {}
+        self.index_report = None  # last build_paper_index report
+
+    @property
+    def mode(self):
+        return "events" if isinstance(self.source, EventSource) else "polling"
+
+    def add_file(self, path):
+        """Called from the event/poll thread for every new file."""
+        path = Path(path)
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            return
+        now = time.monotonic()
+        with self.lock:
+            self.pending.setdefault(path.parent, set()).add(path.name)
+            if self.first_event is None:
+                self.first_event = now
+            self.last_event = now
+        self.wakeup.set()
+
+    def due(self, now=None):
+        """Seconds until the pending batch should be flushed (0 when due), None if nothing is pending."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if not self.pending:
+                return None
+            return max(0.0, min(self.last_event + self.debounce, self.first_event + self.max_delay) - now)
+
+    def flush(self):
+        """Maps everything pending, one map_images call (and save) per chapter. Returns the results."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.first_event = self.last_event = None
+        results = []
+        for img_dir, names in sorted(pending.items()):
+            json_path = self.folders.lookup(img_dir)
+            if json_path is None:
+                result = {"json": None, "image_dir": str(img_dir), "status": "unmatched", "changes": 0,
+                          "skipped": len(names), "images": len(names),
+                          "message": f"No chapter JSON for {img_dir.name} ({len(names)} new images)"}
+            else:
+                try:
+                    result = map_images(json_path, sorted(names), json_format=self.json_format)
+                except Exception as e:
+                    result = {"json": str(json_path), "status": "error", "changes": 0, "skipped": 0,
+                              "images": len(names), "message": f"CRASH: {e}"}
+                result["image_dir"] = str(img_dir)
+            self.totals[result["status"]] = self.totals.get(result["status"], 0) + 1
+            results.append(result)
+            if self.on_result:
+                self.on_result(result)
+        if self.index_path and any(r["status"] == "saved" for r in results):
+            try:
+                self.index_report = build_paper_index(self.data_root, self.index_path)
+            except Exception as e:
+                self.index_report = {"status": "error", "message": f"ERROR updating the paper index: {e}"}
+        return results
+
+    def run(self):
+        """Watches until stop() (or Ctrl+C). Flushes anything still pending on the way out."""
+        self.source.start()
+        try:
+            while not self.stop_event.is_set():
+                wait = self.due()
+                if wait == 0:
+                    self.flush()
+                    continue
+                self.wakeup.wait(wait)
+                self.wakeup.clear()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.source.stop()
+            self.flush()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+
+def add_watch_arguments(parser):
+    parser.add_argument("--data-root", default=DEFAULT_JSON_ROOT)
+    parser.add_argument("--image-root", default=DEFAULT_IMAGE_ROOT)
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE_SEC, help="Quiet seconds before mapping")
+    parser.add_argument("--poll", action="store_true", help="Poll directory mtimes even if watchdog is installed")
+    parser.add_argument("--poll-interval", type=float, default=WATCH_POLL_SEC)
+    parser.add_argument("--json-format", choices=JSON_FORMATS, default="indent")
+    parser.add_argument("--index", help="Paper index path (default: <data root>_index.bin next to the data root)")
+    parser.add_argument("--no-index", action="store_true", help="Do not update the paper-generation index")
+
+def run_watch(args):
+    """Runs a watcher from parsed add_watch_arguments() options until Ctrl+C. Returns the exit status."""
+    def print_result(result):
+        print(f"[{result['status']}] {result['json'] or result['image_dir']}: {result['message']}", file=sys.stderr)
+
+    watcher = ImageWatcher(args.data_root, args.image_root, debounce=args.debounce,
+                           poll_interval=args.poll_interval, json_format=args.json_format,
+                           on_result=print_result, use_events=not args.poll,
+                           index_path=None if args.no_index else (args.index or default_index_path(args.data_root)))
+    print(f"Watching {args.image_root} ({watcher.mode}); Ctrl+C to stop", file=sys.stderr)
+    watcher.run()
+    print(f"Stopped: {watcher.totals}", file=sys.stderr)
+    return 1 if watcher.totals.get("error") else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Map new images into their chapter JSONs as they are saved.")
+    add_watch_arguments(parser)
+    return run_watch(parser.parse_args(argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import threading
+import cProfile
+import pstats
+from contextlib import contextmanager
+
+# --- Configuration ---
+PROFILE_TOP = 40  # functions listed in the text summary written next to a .prof file
+
+class Metrics:
+    """
+    Per-stage timers and counters for the mapper and batch runner.
+    Plain dicts inside, so a worker process can return to_dict() and the
+    parent can merge() it. With trace=True every stage is also recorded as a
+    Chrome trace event (chrome://tracing, Perfetto).
+    """
+    def __init__(self, trace=False):
+        self.stages = {}    # name -> {"count", "total_sec", "max_sec"}
+        self.counters = {}  # name -> int
+        self.trace = trace
+        self.events = []
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            s = self.stages.get(name)
+            if s is None:
+                s = self.stages[name] = {"count": 0, "total_sec": 0.0, "max_sec": 0.0}
+            s["count"] += 1
+            s["total_sec"] += elapsed
+            s["max_sec"] = max(s["max_sec"], elapsed)
+            if self.trace:
+                self.events.append({"name": name, "ph": "X", "ts": round(started * 1e6, 1),
+                                    "dur": round(elapsed * 1e6, 1), "pid": os.getpid(),
+                                    "tid": threading.get_ident()})
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self):
+        data = {"stages": self.stages, "counters": self.counters}
+        if self.trace:
+            data["events"] = self.events
+        return data
+
+    def merge(self, other):
+        """Adds another Metrics or to_dict() result (e.g. from a worker process)."""
+        if isinstance(other, Metrics):
+            other = other.to_dict()
+        for name, s in other.get("stages", {}).items():
+            mine = self.stages.setdefault(name, {"count": 0, "total_sec": 0.0, "max_sec": 0.0})
+            mine["count"] += s["count"]
+            mine["total_sec"] += s["total_sec"]
+            mine["max_sec"] = max(mine["max_sec"], s["max_sec"])
+        for name, n in other.get("counters", {}).items():
+            self.count(name, n)
+        if self.trace:
+            self.events.extend(other.get("events", []))
+
+    def report(self):
+        """JSON-serializable summary (no trace events), stages sorted by total time."""
+        stages = {name: {"count": s["count"], "total_sec": round(s["total_sec"], 4), "max_sec": round(s["max_sec"], 4)}
+                  for name, s in sorted(self.stages.items(), key=lambda kv: -kv[1]["total_sec"])}
+        return {"stages": stages, "counters": dict(sorted(self.counters.items()))}
+
+def format_metrics(summary):
+    """Human-readable lines for a Metrics.report() dict."""
+    lines = []
+    for name, s in summary["stages"].items():
+        lines.append(f"{name:<16} {s['count']:>7} calls {s['total_sec']:>9.3f}s total {s['max_sec']:>8.4f}s max")
+    if summary["counters"]:
+        lines.append(", ".join(f"{name}={n:,}" for name, n in summary["counters"].items()))
+    return lines
+
+def write_trace(events, path):
+    """Writes Chrome trace-event JSON (open in chrome://tracing or ui.perfetto.dev)."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+@contextmanager
+def profiled(path):
+    """
+    Runs the block under cProfile and writes path (pstats, for snakeviz/pstats)
+    plus path.txt with the top PROFILE_TOP functions by cumulative time.
+    Does nothing when path is None.
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        with open(f"{path}.txt", 'w', encoding='utf-8') as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(PROFILE_TOP)
@@ -0,0 +1,219 @@
+import sys
+import json
+import time
+import struct
+import argparse
+from pathlib import Path
+
+from image_mapper import IMAGE_CATEGORIES, DEFAULT_JSON_ROOT, atomic_write_bytes
+from question_store import iter_question_spans
+
+# --- Configuration ---
+# File layout: INDEX_MAGIC, uint32 header length, UTF-8 JSON header, then one
+# RECORD per question, grouped by chapter in header["chapters"] order.
+# Records are fixed-width little-endian, so a reader can slice
+# records[first_row * size:(first_row + rows) * size] for a chapter and decode
+# it with Buffer.readInt32LE & co. without parsing any question JSON.
+INDEX_MAGIC = b"PNIDX\x00\x00\x01"
+INDEX_VERSION = 1
+RECORD = struct.Struct("<iIIBBBx")  # id, byte_start, byte_length, difficulty code, marks code, image flags
+RECORD_FIELDS = ("id", "byte_start", "byte_length", "difficulty", "marks", "image_flags")
+CODED_FIELDS = ("difficulty", "marks")  # header[field] lists the distinct values; the code is the list index
+MISSING_CODE = 0xFF  # field absent or null
+MISSING_ID = -1
+IMAGE_FLAGS = {category: 1 << k for k, category in enumerate(IMAGE_CATEGORIES)}  # set when the list is non-empty
+
+def default_index_path(data_root):
+    """backend/data/data -> backend/data/data_index.bin (next to data.zip, outside the archive)."""
+    data_root = Path(data_root)
+    return data_root.parent / f"{data_root.name}_index.bin"
+
+class PaperIndex:
+    """A loaded index: the JSON header plus the raw record bytes."""
+    def __init__(self, header, records):
+        self.header = header
+        self.records = records
+        self.chapters = {c["path"]: c for c in header["chapters"]}
+
+    def __len__(self):
+        return len(self.records) // RECORD.size
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        if raw[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            raise ValueError(f"{Path(path).name} is not a paper index")
+        start = len(INDEX_MAGIC) + 4
+        (header_len,) = struct.unpack_from("<I", raw, len(INDEX_MAGIC))
+        header = json.loads(raw[start:start + header_len].decode('utf-8'))
+        if header.get("version") != INDEX_VERSION or header.get("record_size") != RECORD.size:
+            raise ValueError(f"Unsupported paper index version in {Path(path).name}")
+        return cls(header, raw[start + header_len:])
+
+    def chapter_records(self, chapter):
+        """Raw record bytes of one header["chapters"] entry."""
+        return self.records[chapter["first_row"] * RECORD.size:(chapter["first_row"] + chapter["rows"]) * RECORD.size]
+
+    def select(self, chapter_keys=None, difficulty=None, marks=None, images=None):
+        """
+        Yields (chapter, record dict) for questions matching every given filter:
+        chapter_keys ("CET/11/Physics/Sound"), difficulty and marks (sets of
+        raw values) and images (set of IMAGE_CATEGORIES that must be present).
+        """
+        wanted = {}
+        for field, accepted in (("difficulty", difficulty), ("marks", marks)):
+            if accepted is not None:
+                wanted[field] = {code for code, value in enumerate(self.header[field]) if value in accepted}
+        flags = sum(IMAGE_FLAGS[c] for c in images) if images else 0
+        for chapter in self.header["chapters"]:
+            if chapter_keys is not None and chapter["key"] not in chapter_keys:
+                continue
+            for values in RECORD.iter_unpack(self.chapter_records(chapter)):
+                rec = dict(zip(RECORD_FIELDS, values))
+                if all(rec[field] in codes for field, codes in wanted.items()) and rec["image_flags"] & flags == flags:
+                    yield chapter, rec
+
+    def decode(self, rec):
+        """A record with difficulty/marks codes replaced by their values."""
+        rec = dict(rec)
+        for field in CODED_FIELDS:
+            rec[field] = None if rec[field] == MISSING_CODE else self.header[field][rec[field]]
+        return rec
+
+def _table_key(value):
+    """Keeps 4 and "4" (and True and 1) apart in the code tables."""
+    return (type(value).__name__, value) if isinstance(value, (str, int, float, bool)) else repr(value)
+
+def _chapter_entry(data_root, json_file, st):
+    rel = json_file.relative_to(data_root)
+    parts = list(rel.parts[:-1]) + [None] * max(0, 4 - len(rel.parts))
+    return {"key": "/".join(p for p in parts[:3] + [json_file.stem] if p), "path": rel.as_posix(),
+            "exam": parts[0], "standard": parts[1], "subject": parts[2], "chapter": json_file.stem,
+            "mtime_ns": st.st_mtime_ns, "size": st.st_size, "first_row": 0, "rows": 0}
+
+def _encode_chapter(raw, tables):
+    """Record bytes for one chapter file; new difficulty/marks values are appended to tables."""
+    out = bytearray()
+    for question, start, end in iter_question_spans(raw):
+        if not isinstance(question, dict):
+            question = {}
+        q_id = question.get("id")
+        codes = []
+        for field in CODED_FIELDS:
+            value = question.get(field)
+            if value is None:
+                codes.append(MISSING_CODE)
+                continue
+            lookup = tables[field]
+            key = _table_key(value)
+            if key not in lookup:
+                if len(lookup) >= MISSING_CODE:
+                    raise ValueError(f"More than {MISSING_CODE} distinct '{field}' values")
+                lookup[key] = (len(lookup), value)
+            codes.append(lookup[key][0])
+        flags = 0
+        for category, bit in IMAGE_FLAGS.items():
+            if question.get(category):
+                flags |= bit
+        out += RECORD.pack(q_id if isinstance(q_id, int) and -2**31 <= q_id < 2**31 else MISSING_ID,
+                           start, end - start, codes[0], codes[1], flags)
+    return out
+
+def build_paper_index(data_root, index_path=None, full=False):
+    """
+    Writes the paper-generation index for every chapter JSON under data_root.
+    Chapters whose size and mtime match the existing index keep their records;
+    only changed or new files are re-read. The file is replaced atomically,
+    and not at all when nothing changed. Returns a JSON-serializable report.
+    """
+    started = time.perf_counter()
+    data_root = Path(data_root)
+    index_path = Path(index_path) if index_path else default_index_path(data_root)
+    report = {"index": str(index_path), "status": "unchanged", "chapters": 0, "questions": 0,
+              "reused": 0, "rebuilt": 0, "removed": 0, "errors": [], "size": 0, "message": ""}
+
+    old = None
+    if index_path.exists() and not full:
+        try:
+            old = PaperIndex.load(index_path)
+        except (OSError, ValueError) as e:
+            report["old_index_error"] = str(e)  # rebuilt from scratch below
+
+    # Code tables only grow, so codes in reused records stay valid
+    tables = {field: {} for field in CODED_FIELDS}
+    if old:
+        for field in CODED_FIELDS:
+            for code, value in enumerate(old.header[field]):
+                tables[field][_table_key(value)] = (code, value)
+
+    chapters = []
+    records = bytearray()
+    for json_file in sorted(data_root.rglob("*.json")):
+        st = json_file.stat()
+        entry = _chapter_entry(data_root, json_file, st)
+        previous = old.chapters.get(entry["path"]) if old else None
+        if previous and (previous["mtime_ns"], previous["size"]) == (st.st_mtime_ns, st.st_size):
+            chunk = old.chapter_records(previous)
+            report["reused"] += 1
+        else:
+            try:
+                with open(json_file, 'rb') as f:
+                    chunk = _encode_chapter(f.read(), tables)
+            except Exception as e:
+                report["errors"].append({"json": str(json_file), "error": str(e)})
+                continue
+            report["rebuilt"] += 1
+        entry["first_row"] = len(records) // RECORD.size
+        entry["rows"] = len(chunk) // RECORD.size
+        records += chunk
+        chapters.append(entry)
+
+    report["chapters"] = len(chapters)
+    report["questions"] = len(records) // RECORD.size
+    if old:
+        report["removed"] = len(set(old.chapters) - {c["path"] for c in chapters})
+    if old and not report["rebuilt"] and not report["removed"]:
+        report["size"] = index_path.stat().st_size
+        report["message"] = f"{index_path.name} is up to date."
+        report["elapsed_sec"] = round(time.perf_counter() - started, 3)
+        return report
+
+    header = {
+        "version": INDEX_VERSION,
+        "record_format": RECORD.format,
+        "record_size": RECORD.size,
+        "record_fields": list(RECORD_FIELDS),
+        "missing_code": MISSING_CODE,
+        "missing_id": MISSING_ID,
+        "image_flags": IMAGE_FLAGS,
+        "chapters": chapters,
+    }
+    for field in CODED_FIELDS:
+        header[field] = [value for _, value in sorted(tables[field].values(), key=lambda cv: cv[0])]
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    payload = INDEX_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes + bytes(records)
+    atomic_write_bytes(index_path, payload)
+
+    report["status"] = "rebuilt" if old else "created"
+    report["size"] = len(payload)
+    report["message"] = (f"{index_path.name}: {report['questions']:,} questions in {report['chapters']} chapters "
+                         f"({report['rebuilt']} re-read, {report['reused']} reused, {report['removed']} removed).")
+    report["elapsed_sec"] = round(time.perf_counter() - started, 3)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the paper-generation index for a data tree.")
+    parser.add_argument("--data-root", default=DEFAULT_JSON_ROOT)
+    parser.add_argument("--index", help="Index path (default: <data root>_index.bin next to the data root)")
+    parser.add_argument("--full", action="store_true", help="Re-read every chapter instead of reusing unchanged ones")
+    args = parser.parse_args(argv)
+
+    report = build_paper_index(args.data_root, args.index, full=args.full)
+    for error in report["errors"]:
+        print(f"Error: {error['json']}: {error['error']}", file=sys.stderr)
+    print(f"{report['message']} {report['size']:,} bytes in {report['elapsed_sec']}s", file=sys.stderr)
+    return 1 if report["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
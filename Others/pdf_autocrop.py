@@ -0,0 +1,285 @@
+import re
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+# --- Configuration ---
+EXPORT_DPI = 300
+DEFAULT_WORKERS = 4
+PAD_PT = 4                # padding around every crop, in PDF points
+MIN_FIGURE_PT = 20        # ignore drawings/images smaller than this in either direction
+MERGE_GAP_PT = 6          # drawing rects closer than this belong to one figure
+ANCHOR_INDENT_PT = 18     # an anchor must start this close to its column's left edge
+CATEGORY_CODES = {"question": "qu", "option": "op", "solution": "so"}
+
+# "34.", "34)", "Q34", "Q.34", "Q 34" at the start of a line (but not "3.5 m/s"); group 3 marks "34)",
+# which option and solution lines use too ("1) 5 m/s"), see plan_crops
+ANCHOR_RE = re.compile(r'^\s*(?:Q\.?\s*(\d{1,4})\b|(\d{1,4})\s*(?:\.|(\)))(?!\d))', re.IGNORECASE)
+# "(a)", "a)", "(A)", "(1)" at the start of a line
+OPTION_RE = re.compile(r'^\s*(?:\(([a-dA-D1-4])\)|([a-dA-D])\))')
+
+# --- Page analysis (runs in worker processes) ---
+_worker_doc = None
+
+def _open_doc(pdf_path):
+    """One open document per worker process, reused across its pages."""
+    global _worker_doc
+    if _worker_doc is None or _worker_doc.name != str(pdf_path):
+        _close_doc()
+        _worker_doc = fitz.open(pdf_path)
+    return _worker_doc
+
+def _close_doc():
+    global _worker_doc
+    if _worker_doc is not None:
+        _worker_doc.close()
+        _worker_doc = None
+
+def _merge_rects(rects, gap=MERGE_GAP_PT):
+    """Merges overlapping or nearby rectangles into clusters (x0, y0, x1, y1)."""
+    clusters = []
+    for r in sorted(rects, key=lambda r: (r[1], r[0])):
+        r = list(r)
+        merged = True
+        while merged:
+            merged = False
+            for c in clusters:
+                if r[0] <= c[2] + gap and c[0] <= r[2] + gap and r[1] <= c[3] + gap and c[1] <= r[3] + gap:
+                    clusters.remove(c)
+                    r = [min(r[0], c[0]), min(r[1], c[1]), max(r[2], c[2]), max(r[3], c[3])]
+                    merged = True
+                    break
+        clusters.append(r)
+    return [tuple(c) for c in clusters]
+
+def _columns(lines, width):
+    """Returns the x split between two text columns, or None for single-column pages."""
+    if not lines:
+        return None
+    mid = width / 2
+    right = sum(1 for l in lines if l["bbox"][0] >= mid * 0.95)
+    crossing = sum(1 for l in lines if l["bbox"][0] < mid - 5 and l["bbox"][2] > mid + 5)
+    if right > len(lines) * 0.25 and crossing < len(lines) * 0.1:
+        return mid
+    return None
+
+def analyze_page(pdf_path, page_num):
+    """
+    Extracts question anchors, option markers and figure regions of one page.
+    Returns plain data so it can cross the process boundary.
+    """
+    doc = _open_doc(pdf_path)
+    page = doc.load_page(page_num)
+    width, height = page.rect.width, page.rect.height
+
+    lines = []
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        for line in block.get("lines", []):
+            text = "".join(span["text"] for span in line["spans"])
+            if text.strip():
+                lines.append({"bbox": tuple(line["bbox"]), "text": text})
+
+    split = _columns(lines, width)
+    col_of = (lambda x: 0) if split is None else (lambda x: 0 if x < split else 1)
+    col_left = {}
+    for l in lines:
+        c = col_of(l["bbox"][0])
+        col_left[c] = min(col_left.get(c, width), l["bbox"][0])
+
+    items = []
+    for l in lines:
+        x0, y0 = l["bbox"][0], l["bbox"][1]
+        c = col_of(x0)
+        m = ANCHOR_RE.match(l["text"])
+        if m and x0 <= col_left[c] + ANCHOR_INDENT_PT:
+            items.append({"kind": "anchor", "col": c, "y": y0, "q_id": int(m.group(1) or m.group(2)),
+                          "paren": bool(m.group(3))})
+        elif OPTION_RE.match(l["text"]):
+            items.append({"kind": "option", "col": c, "y": y0})
+
+    figure_rects = [tuple(info["bbox"]) for info in page.get_image_info()]
+    drawing_rects = []
+    for path in page.get_drawings():
+        r = path["rect"]
+        drawing_rects.append((r.x0, r.y0, r.x1, r.y1))
+    for r in _merge_rects(drawing_rects) + figure_rects:
+        if r[2] - r[0] >= MIN_FIGURE_PT and r[3] - r[1] >= MIN_FIGURE_PT:
+            # Full-page frames and backgrounds are not figures
+            if r[2] - r[0] > width * 0.9 and r[3] - r[1] > height * 0.9:
+                continue
+            items.append({"kind": "figure", "col": col_of(r[0]), "y": r[1], "rect": r})
+
+    col_bounds = [(0, split or width)] if split is None else [(0, split), (split, width)]
+    # Where content starts in each column, so carried-over questions skip the top margin
+    tops = [height] * len(col_bounds)
+    for l in lines:
+        c = col_of(l["bbox"][0])
+        tops[c] = min(tops[c], l["bbox"][1])
+    for item in items:
+        tops[item["col"]] = min(tops[item["col"]], item["y"])
+    return {"page": page_num, "width": width, "height": height, "columns": col_bounds, "tops": tops, "items": items}
+
+# --- Assignment (main process, sequential so questions can run across pages) ---
+def plan_crops(pages, kind="question", whole_questions=False):
+    """
+    Walks page analyses in reading order and assigns figures to the question
+    anchor before them. Returns (crops, unassigned) where each crop is
+    {"page", "rect", "q_id", "category", "name"} named in the ImageMapper
+    convention (q34_qu_1, q34_op_2, q34_so_1).
+    "N)" anchors start a question only in documents that mostly number
+    questions that way, and only when N is past the current question, so a
+    "1)" line inside an option or solution does not.
+    """
+    crops = []
+    unassigned = 0
+    counters = {}
+    current = None          # q_id of the question being read
+    in_options = False      # an option marker was seen for the current question
+    region_top = None       # whole_questions: y where the running question starts in this column
+    anchors = [i for p in pages for i in p["items"] if i["kind"] == "anchor"]
+    paren_style = sum(1 for i in anchors if i.get("paren")) * 2 > len(anchors)
+
+    def add(page_num, rect, q_id, category):
+        code = CATEGORY_CODES[category]
+        n = counters.get((q_id, code), 0) + 1
+        counters[(q_id, code)] = n
+        crops.append({"page": page_num, "rect": rect, "q_id": q_id, "category": category,
+                      "name": f"q{q_id}_{code}_{n}"})
+
+    def close_region(page, col, y_end):
+        x0, x1 = page["columns"][col]
+        if region_top is not None and y_end - region_top >= MIN_FIGURE_PT:
+            add(page["page"], (x0, region_top, x1, y_end), current, kind)
+
+    for page in sorted(pages, key=lambda p: p["page"]):
+        for col in range(len(page["columns"])):
+            # A question carried over from the previous column/page continues at the top
+            region_top = page["tops"][col] if current is not None else None
+            col_items = sorted((i for i in page["items"] if i["col"] == col), key=lambda i: i["y"])
+            for item in col_items:
+                if item["kind"] == "anchor" and item.get("paren") and not (
+                        paren_style and (current is None or item["q_id"] > current)):
+                    continue  # "1) ..." inside an option or solution
+                if item["kind"] == "anchor":
+                    if whole_questions:
+                        close_region(page, col, item["y"])
+                    current = item["q_id"]
+                    in_options = False
+                    region_top = item["y"]
+                elif item["kind"] == "option":
+                    in_options = True
+                elif not whole_questions:
+                    if current is None:
+                        unassigned += 1
+                        continue
+                    category = kind if kind == "solution" else ("option" if in_options else "question")
+                    add(page["page"], item["rect"], current, category)
+            if whole_questions:
+                close_region(page, col, page["height"])
+    return crops, unassigned
+
+# --- Rendering (worker processes) ---
+def render_crops(pdf_path, crops, out_dir, dpi=EXPORT_DPI, overwrite=False, ext="png"):
+    """Renders each crop's clip rectangle at dpi and saves it. Returns written paths."""
+    doc = _open_doc(pdf_path)
+    scale = dpi / 72.0
+    matrix = fitz.Matrix(scale, scale)
+    written = []
+    for crop in crops:
+        path = Path(out_dir) / f"{crop['name']}.{ext}"
+        if path.exists() and not overwrite:
+            continue
+        page = doc.load_page(crop["page"])
+        x0, y0, x1, y1 = crop["rect"]
+        clip = fitz.Rect(x0 - PAD_PT, y0 - PAD_PT, x1 + PAD_PT, y1 + PAD_PT) & page.rect
+        page.get_pixmap(matrix=matrix, clip=clip).save(str(path))
+        written.append(str(path))
+    return written
+
+def _chunks(seq, n):
+    size = max(1, -(-len(seq) // n))
+    return [seq[i:i + size] for i in range(0, len(seq), size)]
+
+def _analyze_pages(pdf_path, page_numbers):
+    return [analyze_page(pdf_path, n) for n in page_numbers]
+
+def auto_crop(pdf_path, out_dir, kind="question", whole_questions=False, dpi=EXPORT_DPI,
+              workers=DEFAULT_WORKERS, overwrite=False, pages=None):
+    """
+    Headless auto-crop of a whole PDF:
+      1. analyze pages across a process pool,
+      2. assign figures to question numbers in reading order,
+      3. render the crops across the pool.
+    Returns a JSON-serializable report dict.
+    """
+    started = time.perf_counter()
+    pdf_path = str(Path(pdf_path).resolve())
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with fitz.open(pdf_path) as doc:
+        page_numbers = list(pages) if pages is not None else list(range(len(doc)))
+    workers = max(1, int(workers or 1))
+
+    if workers == 1:
+        try:
+            analyses = _analyze_pages(pdf_path, page_numbers)
+            crops, unassigned = plan_crops(analyses, kind, whole_questions)
+            written = render_crops(pdf_path, crops, out_dir, dpi, overwrite)
+        finally:
+            _close_doc()  # the "worker" document was opened in this process
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            analyses = []
+            for part in pool.map(_analyze_pages, [pdf_path] * workers, _chunks(page_numbers, workers)):
+                analyses.extend(part)
+            crops, unassigned = plan_crops(analyses, kind, whole_questions)
+            # Group by page so each worker renders contiguous pages
+            crops_by_page = sorted(crops, key=lambda c: c["page"])
+            written = []
+            for part in pool.map(render_crops, [pdf_path] * workers, _chunks(crops_by_page, workers),
+                                 [out_dir] * workers, [dpi] * workers, [overwrite] * workers):
+                written.extend(part)
+
+    return {
+        "pdf": pdf_path,
+        "out_dir": str(out_dir),
+        "pages": len(page_numbers),
+        "questions": len({c["q_id"] for c in crops}),
+        "crops": crops,
+        "written": len(written),
+        "skipped_existing": len(crops) - len(written),
+        "unassigned_figures": unassigned,
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crop question figures out of a PDF without the mouse.")
+    parser.add_argument("pdf")
+    parser.add_argument("--out", required=True, help="Chapter image folder to write crops into")
+    parser.add_argument("--kind", choices=("question", "solution"), default="question",
+                        help="'solution' names every crop qN_so_K")
+    parser.add_argument("--whole-questions", action="store_true",
+                        help="Crop each full question block instead of only its figures")
+    parser.add_argument("--dpi", type=int, default=EXPORT_DPI)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--overwrite", action="store_true")
+    parser.add_argument("--report", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    report = auto_crop(args.pdf, args.out, kind=args.kind, whole_questions=args.whole_questions,
+                       dpi=args.dpi, workers=args.workers, overwrite=args.overwrite)
+    print(f"{report['pages']} pages, {report['questions']} questions, {report['written']} crops written, "
+          f"{report['skipped_existing']} existing skipped, {report['unassigned_figures']} unassigned figures "
+          f"in {report['elapsed_sec']}s", file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
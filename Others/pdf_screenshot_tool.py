@@ -2,16 +2,277 @@ import fitz  # PyMuPDF
 import tkinter as tk
 from tkinter import simpledialog, filedialog, messagebox, Canvas, Scrollbar
 from PIL import Image, ImageTk
+from image_optimizer import save_optimized
+from image_mapper import find_chapter_json, map_images, parse_image_name
+from render_cache import RenderCache, DEFAULT_CACHE_DIR, PRERENDER_CHUNK, prerender_pages
 from pathlib import Path
-import io
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import os
+import threading
+import string
+import queue
 
 # --- Configuration ---
 SAVE_FOLDER = Path("C:\\Users\\bhoge\\OneDrive\\Documents\\Desktop\\QPG\\backend\\data\\data_structure\\CET\\11\\Physics\\10. Error Analysis")
 FILENAME_PREFIX = ""
+CACHE_PAGES = 24     # rendered pages kept in memory (LRU)
+PREFETCH_PAGES = 2   # pages rendered ahead/behind the current one
+POLL_MS = 30         # how often the UI picks up finished renders
+EXPORT_DPI = 300     # crops are re-rendered from the PDF at this resolution
+OPTIMIZE_EXPORTS = True   # trim margins and palette-quantize monochrome crops on save
+EXPORT_SIDECARS = ()      # extra formats written next to each PNG, e.g. ("webp",) or ("webp", "avif")
+ZOOM_STEPS = (0.75, 1.0, 1.25, 1.5, 2.0, 2.5, 3.0)  # preview zoom levels
+WRITER_THREADS = 4        # crops encoded and written in parallel (Pillow releases the GIL while encoding)
+CAPTURE_TAGS = ("qu", "op", "so", "")  # capture mode name tag: 12_qu_1.png, or 12.png untagged (not mapped)
+MAP_AFTER_CAPTURE = True  # map captured images into the chapter JSON of SAVE_FOLDER once written
+DISK_CACHE_DIR = DEFAULT_CACHE_DIR  # rendered pages kept across sessions, keyed by PDF content hash
+DISK_CACHE_MB = 2048      # LRU size cap of the disk cache; 0 disables it
+PRERENDER_ON_OPEN = False  # render every page not yet on disk on a process pool when a PDF is opened
+PRERENDER_WORKERS = max(1, (os.cpu_count() or 2) - 1)
 
 # --- Setup ---
 SAVE_FOLDER.mkdir(parents=True, exist_ok=True)
 
+# --- Rendering ---
+def pixmap_to_pil(pix):
+    """Wraps pix.samples directly, no PPM encode/decode round-trip."""
+    img_mode = "RGB" if pix.alpha == 0 else "RGBA"
+    return Image.frombytes(img_mode, (pix.width, pix.height), pix.samples)
+
+class PageRenderer:
+    """
+    Owns the fitz document on a single background thread (PyMuPDF is not
+    thread-safe) and renders pages into a bounded LRU cache keyed by (page, zoom).
+    Crops are rendered on that thread too, then encoded and written by a small
+    writer pool. With a RenderCache, pages are looked up on disk before being
+    rendered, and prerender() fills it for the whole document on a process pool.
+    Finished work is posted to self.results, which the Tk thread drains.
+    """
+    def __init__(self, cache_pages=CACHE_PAGES, writer_threads=WRITER_THREADS, disk_cache=None,
+                 prerender_workers=PRERENDER_WORKERS):
+        self.cache_pages = cache_pages
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.pending = deque()
+        self.cond = threading.Condition()
+        self.results = queue.Queue()
+        self.generation = 0
+        self.doc = None  # only touched on the worker thread
+        self.doc_path = None
+        self.doc_key = None  # content hash of the open PDF (disk cache key)
+        self.disk_cache = disk_cache
+        self.prerender_workers = prerender_workers
+        self.prerender_lock = threading.Lock()  # pool and futures: submitted on the worker thread, cancelled from Tk
+        self.prerender_pool = None
+        self.prerender_futures = []
+        self.closed = False
+        self.writer = ThreadPoolExecutor(max_workers=writer_threads, thread_name_prefix="crop-writer")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # Called from the Tk thread
+    def open(self, file_path):
+        with self.cond:
+            self.generation += 1
+            # Queued exports still belong to the old document, so they run before it is closed
+            self.pending = deque(job for job in self.pending if job[0] == "export")
+            self.pending.append(("open", self.generation, file_path))
+            self.cond.notify()
+        with self.cache_lock:
+            self.cache.clear()
+        self._cancel_prerender()
+
+    def get_cached(self, page_num, zoom):
+        with self.cache_lock:
+            image = self.cache.get((page_num, zoom))
+            if image is not None:
+                self.cache.move_to_end((page_num, zoom))
+            return image
+
+    def request(self, page_num, zoom):
+        """Renders a page ahead of any queued prefetch work."""
+        with self.cond:
+            self.pending.appendleft(("render", self.generation, (page_num, zoom)))
+            self.cond.notify()
+
+    def prefetch(self, page_num, zoom, total_pages, count=PREFETCH_PAGES):
+        with self.cond:
+            # Drop prefetches queued for pages we have moved away from
+            self.pending = deque(job for job in self.pending if job[0] != "prefetch")
+            for offset in range(1, count + 1):
+                for neighbour in (page_num + offset, page_num - offset):
+                    if 0 <= neighbour < total_pages:
+                        self.pending.append(("prefetch", self.generation, (neighbour, zoom)))
+            self.cond.notify()
+
+    def prerender(self, zoom):
+        """Renders every page of the open document missing from the disk cache, on a process pool."""
+        if self.disk_cache is None:
+            return
+        with self.cond:
+            self.pending.append(("prerender", self.generation, zoom))
+            self.cond.notify()
+
+    def close(self):
+        """Stops the render thread after queued exports, cancels pre-rendering and waits for the writers."""
+        with self.prerender_lock:
+            self.closed = True
+            self._cancel_prerender_locked()
+            if self.prerender_pool:
+                self.prerender_pool.shutdown(wait=False, cancel_futures=True)
+        with self.cond:
+            self.pending = deque(job for job in self.pending if job[0] == "export")
+            self.pending.append(("close", self.generation, None))
+            self.cond.notify()
+        self.thread.join()
+        self.writer.shutdown(wait=True)  # let queued crops finish writing
+
+    def _cancel_prerender(self):
+        with self.prerender_lock:
+            self._cancel_prerender_locked()
+
+    def _cancel_prerender_locked(self):
+        for future in self.prerender_futures:
+            future.cancel()
+        self.prerender_futures = []
+
+    def export(self, page_num, clip, dpi, filepath):
+        """
+        Re-renders only the clip rectangle (PDF points) of a page at dpi and saves it.
+        Posts ("exported", generation, filepath) once written, or
+        ("export_failed", generation, (filepath, error)).
+        """
+        with self.cond:
+            self.pending.appendleft(("export", self.generation, (page_num, clip, dpi, filepath)))
+            self.cond.notify()
+
+    # Worker thread
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                kind, generation, payload = self.pending.popleft()
+                if generation != self.generation and kind != "export":
+                    continue
+            if kind == "close":
+                if self.doc:
+                    self.doc.close()
+                    self.doc = None
+                return
+            try:
+                if kind == "export":
+                    self._export(generation, *payload)
+                elif kind == "open":
+                    if self.doc:
+                        self.doc.close()
+                    self.doc = fitz.open(payload)
+                    self.doc_path = payload
+                    self.doc_key = self.disk_cache.document_key(payload) if self.disk_cache else None
+                    self.results.put(("opened", generation, len(self.doc)))
+                elif kind == "prerender":
+                    self._start_prerender(generation, payload)
+                else:
+                    if self.get_cached(*payload) is not None:
+                        if kind == "render":
+                            self.results.put(("page", generation, payload))
+                        continue
+                    image = self._load_or_render(*payload)
+                    self._store(generation, payload, image)
+                    if kind == "render":
+                        self.results.put(("page", generation, payload))
+            except Exception as e:
+                if kind == "export":
+                    self.results.put(("export_failed", generation, (payload[3], e)))
+                else:
+                    self.results.put(("error", generation, (kind, e)))
+
+    def _render(self, page_num, zoom):
+        page = self.doc.load_page(page_num)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        return pixmap_to_pil(pix)
+
+    def _load_or_render(self, page_num, zoom):
+        if self.doc_key:
+            image = self.disk_cache.get(self.doc_key, page_num, zoom)
+            if image is not None:
+                return image
+        image = self._render(page_num, zoom)
+        if self.doc_key:
+            self.writer.submit(self._save_tile, self.doc_key, page_num, zoom, image)
+        return image
+
+    def _save_tile(self, doc_key, page_num, zoom, image):
+        """Writer pool: stores a rendered page in the disk cache."""
+        try:
+            self.disk_cache.put(doc_key, page_num, zoom, image)
+        except Exception as e:
+            print(f"Disk cache write failed: {e}")
+
+    def _start_prerender(self, generation, zoom):
+        doc_dir = self.disk_cache.root / self.doc_key
+        missing = [page_num for page_num in range(len(self.doc))
+                   if not self.disk_cache.tile_path(self.doc_key, page_num, zoom).exists()]
+        if not missing:
+            return
+        doc_dir.mkdir(exist_ok=True)
+        chunks = [missing[i:i + PRERENDER_CHUNK] for i in range(0, len(missing), PRERENDER_CHUNK)]
+        remaining = [len(chunks)]
+        rendered = [0]
+        lock = threading.Lock()
+
+        def chunk_done(future):
+            with lock:
+                remaining[0] -= 1
+                if not future.cancelled() and future.exception() is None:
+                    rendered[0] += future.result()[0]
+                last = remaining[0] == 0
+            if last:
+                self.disk_cache.enforce_cap()  # tiles from the workers were not counted yet
+                self.results.put(("prerendered", generation, (rendered[0], len(missing))))
+
+        with self.prerender_lock:
+            # open() bumps the generation before cancelling, so a stale request is dropped here
+            if self.closed or generation != self.generation:
+                return
+            if self.prerender_pool is None:
+                self.prerender_pool = ProcessPoolExecutor(max_workers=self.prerender_workers)
+            futures = [self.prerender_pool.submit(prerender_pages, self.doc_path, self.doc_key, chunk, zoom,
+                                                  self.disk_cache.root, self.disk_cache.compress_level)
+                       for chunk in chunks]
+            self.prerender_futures.extend(futures)
+        for future in futures:
+            future.add_done_callback(chunk_done)
+
+    def _export(self, generation, page_num, clip, dpi, filepath):
+        page = self.doc.load_page(page_num)
+        clip_rect = fitz.Rect(*clip) & page.rect
+        scale = dpi / 72.0
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip_rect)
+        # Encoding is the slow part; hand it off so the next crop can render meanwhile
+        self.writer.submit(self._write, generation, pixmap_to_pil(pix), filepath)
+
+    def _write(self, generation, image, filepath):
+        """Writer pool: encodes and saves one crop."""
+        try:
+            if OPTIMIZE_EXPORTS:
+                save_optimized(image, filepath, EXPORT_SIDECARS)
+            else:
+                image.save(filepath)
+            self.results.put(("exported", generation, filepath))
+        except Exception as e:
+            self.results.put(("export_failed", generation, (filepath, e)))
+
+    def _store(self, generation, key, image):
+        with self.cache_lock:
+            if generation != self.generation:
+                return
+            self.cache[key] = image
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_pages:
+                self.cache.popitem(last=False)
+
 class PDFCropperApp:
     def __init__(self, root):
         self.root = root
@@ -19,12 +280,23 @@ class PDFCropperApp:
         self.root.geometry("1200x800")
 
         # Configuration State
-        self.doc = None
         self.current_page_num = 0
         self.total_pages = 0
         self.tk_image = None  # Keep reference
         self.pil_image = None
+        self.displayed_key = None  # (page, zoom) of the image on the canvas
         self.zoom_level = 1.5  # Initial zoom
+        disk_cache = RenderCache(DISK_CACHE_DIR, DISK_CACHE_MB) if DISK_CACHE_MB else None
+        self.renderer = PageRenderer(disk_cache=disk_cache)
+
+        # Capture mode: regions queued across pages, written together by the writer pool
+        self.capture_regions = []   # {"page", "clip" (PDF points), "name", "q_num"}
+        self.capture_writing = set()  # filepaths of the batch being written
+        self.capture_written = []
+        self.capture_failed = []    # (filepath, error)
+        self.chapter_json = None    # chapter JSON of SAVE_FOLDER, resolved on first mapping (False if none)
+        # One thread maps every batch, so two batches never load and save the chapter JSON at the same time
+        self.mapping_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture-mapper")
 
         # UI Components
         self.create_widgets()
@@ -36,6 +308,13 @@ class PDFCropperApp:
 
         # Load PDF immediately
         self.root.after(100, self.load_pdf)
+        self.root.after(POLL_MS, self.poll_renderer)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        self.renderer.close()
+        self.mapping_pool.shutdown(wait=True)  # finish saving the chapter JSON
+        self.root.destroy()
 
     def create_widgets(self):
         # Toolbar
@@ -54,6 +333,31 @@ class PDFCropperApp:
         self.btn_next = tk.Button(toolbar, text="Next Page >>", command=self.next_page, state=tk.DISABLED)
         self.btn_next.pack(side=tk.LEFT, padx=5)
 
+        # Zoom (preview only, crops are exported at the export DPI)
+        tk.Button(toolbar, text="-", width=2, command=lambda: self.change_zoom(-1)).pack(side=tk.LEFT, padx=(15, 0))
+        self.lbl_zoom = tk.Label(toolbar, text=f"{int(self.zoom_level * 100)}%", width=5)
+        self.lbl_zoom.pack(side=tk.LEFT)
+        tk.Button(toolbar, text="+", width=2, command=lambda: self.change_zoom(1)).pack(side=tk.LEFT)
+
+        tk.Label(toolbar, text="Export DPI:").pack(side=tk.LEFT, padx=(15, 0))
+        self.var_export_dpi = tk.IntVar(value=EXPORT_DPI)
+        tk.Spinbox(toolbar, values=(150, 200, 300, 400, 600), width=5, textvariable=self.var_export_dpi).pack(side=tk.LEFT, padx=5)
+
+        # Capture mode: every drag queues a region named from the running counter
+        self.var_capture = tk.BooleanVar(value=False)
+        tk.Checkbutton(toolbar, text="Capture mode", variable=self.var_capture).pack(side=tk.LEFT, padx=(15, 0))
+        tk.Label(toolbar, text="Next Q:").pack(side=tk.LEFT)
+        self.var_next_q = tk.IntVar(value=1)
+        tk.Spinbox(toolbar, from_=1, to=99999, width=6, textvariable=self.var_next_q).pack(side=tk.LEFT)
+        self.var_tag = tk.StringVar(value=CAPTURE_TAGS[0])
+        tk.OptionMenu(toolbar, self.var_tag, *CAPTURE_TAGS).pack(side=tk.LEFT)
+        self.var_auto_advance = tk.BooleanVar(value=True)
+        tk.Checkbutton(toolbar, text="Auto +1", variable=self.var_auto_advance).pack(side=tk.LEFT)
+        self.btn_save_regions = tk.Button(toolbar, text="Save Regions", command=self.flush_captures, state=tk.DISABLED)
+        self.btn_save_regions.pack(side=tk.LEFT, padx=5)
+        self.lbl_capture = tk.Label(toolbar, text="")
+        self.lbl_capture.pack(side=tk.LEFT, padx=5)
+
         # Scrollable Canvas
         frame_canvas = tk.Frame(self.root)
         frame_canvas.pack(fill=tk.BOTH, expand=True)
@@ -84,6 +388,11 @@ class PDFCropperApp:
         # Keyboard Navigation
         self.root.bind("<Left>", lambda e: self.prev_page())
         self.root.bind("<Right>", lambda e: self.next_page())
+        self.root.bind("<Control-plus>", lambda e: self.change_zoom(1))
+        self.root.bind("<Control-equal>", lambda e: self.change_zoom(1))
+        self.root.bind("<Control-minus>", lambda e: self.change_zoom(-1))
+        self.root.bind("<Return>", lambda e: self.flush_captures())
+        self.root.bind("<Control-z>", lambda e: self.undo_capture())
 
     def on_mousewheel(self, event):
         self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
@@ -99,40 +408,91 @@ class PDFCropperApp:
         if not file_path:
             return
         
+        # Opening happens on the render thread; poll_renderer picks up the result
+        self.renderer.open(file_path)
+        self.lbl_page.config(text="Loading...")
+
+    def poll_renderer(self):
+        """Drains finished work from the render thread (runs on the Tk thread)."""
         try:
-            self.doc = fitz.open(file_path)
-            self.total_pages = len(self.doc)
-            self.current_page_num = 0
-            self.show_page()
-            self.update_nav_buttons()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load PDF: {e}")
+            while True:
+                kind, generation, payload = self.renderer.results.get_nowait()
+                # Pages from a previous document are stale; export results always count
+                if generation != self.renderer.generation and kind in ("opened", "page"):
+                    continue
+                if kind == "opened":
+                    self.total_pages = payload
+                    self.current_page_num = 0
+                    self.show_page()
+                    self.update_nav_buttons()
+                    if PRERENDER_ON_OPEN:
+                        self.renderer.prerender(self.zoom_level)
+                elif kind == "page":
+                    if payload == (self.current_page_num, self.zoom_level):
+                        self.display_image(self.renderer.get_cached(*payload))
+                elif kind == "exported":
+                    print(f"Saved: {payload}")
+                    self.root.title(f"PDF Screenshot Tool - Saved: {Path(payload).name}")
+                    self.capture_finished(payload)
+                elif kind == "export_failed":
+                    filepath, error = payload
+                    if filepath in self.capture_writing:
+                        self.capture_finished(filepath, error)
+                    else:
+                        messagebox.showerror("Error", f"Could not save: {error}")
+                elif kind == "prerendered":
+                    if generation == self.renderer.generation:
+                        rendered, missing = payload
+                        print(f"Pre-rendered {rendered}/{missing} pages to the disk cache")
+                elif kind == "mapped":
+                    print(payload)
+                    self.root.title(f"PDF Screenshot Tool - {payload}")
+                elif kind == "error":
+                    job_kind, error = payload
+                    if job_kind == "open":
+                        messagebox.showerror("Error", f"Failed to load PDF: {error}")
+                    else:
+                        print(f"Render error: {error}")
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self.poll_renderer)
 
     def show_page(self):
-        if not self.doc: return
+        if not self.total_pages: return
         
-        try:
-            page = self.doc.load_page(self.current_page_num)
-            mat = fitz.Matrix(self.zoom_level, self.zoom_level)
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Convert to PIL
-            # PyMuPDF pymap to image
-            # pix.samples is bytes
-            img_mode = "RGB" if pix.alpha == 0 else "RGBA"
-            img_data = pix.tobytes("ppm") # Safe generic format
-            self.pil_image = Image.open(io.BytesIO(img_data))
-            self.tk_image = ImageTk.PhotoImage(self.pil_image)
-            
-            # Update Canvas
-            self.canvas.delete("all")
-            self.canvas.config(scrollregion=(0, 0, self.tk_image.width(), self.tk_image.height()))
-            self.canvas.create_image(0, 0, image=self.tk_image, anchor=tk.NW)
-            
-            self.lbl_page.config(text=f"Page: {self.current_page_num + 1}/{self.total_pages}")
+        self.lbl_page.config(text=f"Page: {self.current_page_num + 1}/{self.total_pages}")
+        image = self.renderer.get_cached(self.current_page_num, self.zoom_level)
+        if image is None:
+            self.renderer.request(self.current_page_num, self.zoom_level)
+        else:
+            self.display_image(image)
+        self.renderer.prefetch(self.current_page_num, self.zoom_level, self.total_pages)
+
+    def change_zoom(self, step):
+        """Steps through ZOOM_STEPS; pages come from the cache or are re-rendered, the PDF stays open."""
+        levels = list(ZOOM_STEPS)
+        if self.zoom_level not in levels:
+            levels = sorted(levels + [self.zoom_level])
+        idx = max(0, min(len(levels) - 1, levels.index(self.zoom_level) + step))
+        if levels[idx] == self.zoom_level:
+            return
+        self.zoom_level = levels[idx]
+        self.lbl_zoom.config(text=f"{int(self.zoom_level * 100)}%")
+        self.show_page()
 
-        except Exception as e:
-            print(f"Render error: {e}")
+    def display_image(self, image):
+        if image is None: return
+        
+        self.pil_image = image
+        self.displayed_key = (self.current_page_num, self.zoom_level)
+        self.tk_image = ImageTk.PhotoImage(self.pil_image)
+        
+        # Update Canvas
+        self.canvas.delete("all")
+        self.rect_id = None
+        self.canvas.config(scrollregion=(0, 0, self.tk_image.width(), self.tk_image.height()))
+        self.canvas.create_image(0, 0, image=self.tk_image, anchor=tk.NW)
+        self.draw_capture_regions()
 
     def update_nav_buttons(self):
         self.btn_prev.config(state=tk.NORMAL if self.current_page_num > 0 else tk.DISABLED)
@@ -180,10 +540,25 @@ class PDFCropperApp:
             self.canvas.delete(self.rect_id)
             return
             
-        self.save_crop(x1, y1, x2, y2)
+        if self.var_capture.get():
+            self.add_capture_region(x1, y1, x2, y2)
+        else:
+            self.save_crop(x1, y1, x2, y2)
         self.canvas.delete(self.rect_id)
 
+    def export_dpi(self):
+        try:
+            return int(self.var_export_dpi.get())
+        except (tk.TclError, ValueError):
+            return EXPORT_DPI
+
     def save_crop(self, x1, y1, x2, y2):
+        if not self.displayed_key:
+            return
+        # Canvas pixels -> PDF points of the page that is actually on screen
+        page_num, zoom = self.displayed_key
+        clip = (x1 / zoom, y1 / zoom, x2 / zoom, y2 / zoom)
+
         q_num = simpledialog.askstring("Input", "Enter Question Number (e.g., 5, 5a):", parent=self.root)
         
         if q_num:
@@ -194,16 +569,134 @@ class PDFCropperApp:
                 if not messagebox.askyesno("Overwrite?", f"{filename} exists. Overwrite?"):
                     return
 
-            try:
-                # Crop from PIL image
-                crop_img = self.pil_image.crop((x1, y1, x2, y2))
-                crop_img.save(filepath)
-                print(f"Saved: {filepath}")
-                # Optional: Show a quick feedback label or message
-                self.root.title(f"PDF Screenshot Tool - Saved: {filename}")
-                self.root.focus_set() 
-            except Exception as e:
-                messagebox.showerror("Error", f"Could not save: {e}")
+            # Rendered on the render thread and written by its writer pool; poll_renderer reports the result
+            self.renderer.export(page_num, clip, self.export_dpi(), filepath)
+            self.root.focus_set() 
+
+    # --- Capture Mode ---
+    def capture_name(self, q_num, tag):
+        """Next free file name for a question: 12_qu_1.png, 12_qu_2.png ... or 12.png, 12a.png ... untagged."""
+        taken = {r["name"] for r in self.capture_regions} | {Path(p).name for p in self.capture_writing}
+        if tag:
+            candidates = (f"{FILENAME_PREFIX}{q_num}_{tag}_{k}.png" for k in range(1, 1000))
+        else:
+            candidates = (f"{FILENAME_PREFIX}{q_num}{suffix}.png" for suffix in [""] + list(string.ascii_lowercase))
+        for name in candidates:
+            if name not in taken and not (SAVE_FOLDER / name).exists():
+                return name
+        return None
+
+    def add_capture_region(self, x1, y1, x2, y2):
+        if not self.displayed_key:
+            return
+        page_num, zoom = self.displayed_key
+        try:
+            q_num = int(self.var_next_q.get())
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Error", "Next Q must be a number.")
+            return
+        name = self.capture_name(q_num, self.var_tag.get())
+        if name is None:
+            messagebox.showerror("Error", f"No free file name left for question {q_num}.")
+            return
+        self.capture_regions.append({"page": page_num, "clip": (x1 / zoom, y1 / zoom, x2 / zoom, y2 / zoom),
+                                     "name": name, "q_num": q_num})
+        if self.var_auto_advance.get():
+            self.var_next_q.set(q_num + 1)
+        self.draw_capture_regions()
+        self.update_capture_label()
+
+    def undo_capture(self):
+        """Drops the last queued region (and rewinds the counter if it advanced for it)."""
+        if not self.capture_regions:
+            return
+        region = self.capture_regions.pop()
+        try:
+            if self.var_auto_advance.get() and int(self.var_next_q.get()) == region["q_num"] + 1:
+                self.var_next_q.set(region["q_num"])
+        except (tk.TclError, ValueError):
+            pass
+        self.draw_capture_regions()
+        self.update_capture_label()
+
+    def draw_capture_regions(self):
+        """Outlines the queued regions of the page on screen (the canvas is cleared on every page change)."""
+        self.canvas.delete("capture")
+        if not self.displayed_key:
+            return
+        page_num, zoom = self.displayed_key
+        for region in self.capture_regions:
+            if region["page"] != page_num:
+                continue
+            x1, y1, x2, y2 = (v * zoom for v in region["clip"])
+            self.canvas.create_rectangle(x1, y1, x2, y2, outline="blue", width=2, tags="capture")
+            self.canvas.create_text(x1 + 4, y1 + 4, anchor=tk.NW, text=Path(region["name"]).stem,
+                                    fill="blue", tags="capture")
+
+    def update_capture_label(self):
+        parts = []
+        if self.capture_regions:
+            parts.append(f"{len(self.capture_regions)} queued")
+        if self.capture_writing:
+            parts.append(f"{len(self.capture_writing)} writing")
+        self.lbl_capture.config(text=", ".join(parts))
+        self.btn_save_regions.config(state=tk.NORMAL if self.capture_regions else tk.DISABLED)
+
+    def flush_captures(self):
+        """Hands every queued region to the renderer; the writer pool encodes and saves them."""
+        if not self.capture_regions:
+            return
+        dpi = self.export_dpi()
+        # export() queues at the front, so submit in reverse to write in drawing order
+        for region in reversed(self.capture_regions):
+            filepath = SAVE_FOLDER / region["name"]
+            self.capture_writing.add(filepath)
+            self.renderer.export(region["page"], region["clip"], dpi, filepath)
+        self.capture_regions = []
+        self.draw_capture_regions()
+        self.update_capture_label()
+
+    def capture_finished(self, filepath, error=None):
+        """Called per written (or failed) crop; maps the batch once the last one is done."""
+        if filepath not in self.capture_writing:
+            return
+        self.capture_writing.discard(filepath)
+        if error is None:
+            self.capture_written.append(filepath)
+        else:
+            self.capture_failed.append((filepath, error))
+        self.update_capture_label()
+        if self.capture_writing:
+            return
+
+        written, failed = self.capture_written, self.capture_failed
+        self.capture_written, self.capture_failed = [], []
+        if failed:
+            messagebox.showerror("Error", f"Could not save {len(failed)} crop(s):\n" +
+                                 "\n".join(f"{Path(p).name}: {e}" for p, e in failed))
+        if written and MAP_AFTER_CAPTURE:
+            names = [Path(p).name for p in written]
+            # Untagged names (12.png, 12a.png) have no image type, so the mapper cannot place them
+            mappable = [name for name in names if parse_image_name(name)[0] is not None]
+            if len(mappable) < len(names):
+                message = f"{len(names) - len(mappable)} untagged crop(s) saved but not mapped; pick a qu/op/so tag to map them"
+                print(message)
+                self.root.title(f"PDF Screenshot Tool - {message}")
+            if mappable:
+                self.mapping_pool.submit(self.map_captured, mappable)
+
+    def map_captured(self, names):
+        """Runs on mapping_pool: maps just the new images into SAVE_FOLDER's chapter JSON."""
+        try:
+            if self.chapter_json is None:
+                self.chapter_json = find_chapter_json(SAVE_FOLDER) or False
+            if self.chapter_json:
+                message = map_images(self.chapter_json, names)["message"]
+            else:
+                message = f"Saved {len(names)} crops; no chapter JSON found for {SAVE_FOLDER.name}, not mapped"
+        except Exception as e:
+            message = f"Mapping failed: {e}"
+        self.renderer.results.put(("mapped", self.renderer.generation, message))
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# --- Configuration ---
+IO_THREADS = 16  # concurrent listings/stats/reads; on a synced or network drive each one is a round-trip
+READ_AHEAD = 8   # chapters read ahead of the one being mapped
+
+class PrefetchIO:
+    """
+    Thread pool for the batch mapper's file system calls on slow drives
+    (OneDrive / network shares), where every scandir, stat and open waits on
+    a round-trip. Listings and stats are issued together, chapter files are
+    read a few ahead of the one being mapped, and writes are queued and
+    issued together by flush_writes() at the end of the run.
+    """
+    def __init__(self, threads=IO_THREADS, read_ahead=READ_AHEAD):
+        self.threads = max(1, int(threads))
+        self.read_ahead = max(1, int(read_ahead))
+        self.pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="prefetch_io")
+        self.lock = threading.Lock()
+        self.writes = {}  # path -> payload; a later write to the same path replaces the earlier one
+
+    def map(self, fn, items):
+        """[fn(item) for item in items], run concurrently. Raises the first exception, like Executor.map."""
+        return list(self.pool.map(fn, items))
+
+    def walk(self, root, suffix):
+        """Sorted paths of the files under root whose name ends with suffix, each directory listed on the pool."""
+        found = []
+        pending = {self.pool.submit(_list_dir, str(root))}
+        while pending:
+            future = pending.pop()
+            files, subdirs = future.result()
+            found.extend(path for path in files if os.path.normcase(path).endswith(suffix))
+            pending.update(self.pool.submit(_list_dir, path) for path in subdirs)
+        return sorted(Path(path) for path in found)
+
+    def prefetch(self, fn, items):
+        """
+        Yields (item, outcome) in order, with fn running up to read_ahead items
+        ahead of the consumer. outcome is fn(item), or the exception it raised.
+        Items not yet consumed when the generator is closed are cancelled.
+        """
+        items = iter(items)
+        window = deque()
+
+        def refill():
+            while len(window) < self.read_ahead:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                window.append((item, self.pool.submit(fn, item)))
+
+        refill()
+        try:
+            while window:
+                item, future = window.popleft()
+                refill()
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = e
+                yield item, outcome
+        finally:
+            for _, future in window:
+                future.cancel()
+
+    def write(self, path, payload):
+        """Queues payload for path; nothing touches the disk until flush_writes()."""
+        with self.lock:
+            self.writes[str(path)] = payload
+
+    def flush_writes(self, write_fn):
+        """
+        Writes every queued payload with write_fn(path, payload) (e.g.
+        atomic_write_bytes), concurrently. Returns {path: (payload, os.stat_result
+        or None, error or None)}.
+        """
+        with self.lock:
+            writes, self.writes = self.writes, {}
+
+        def flush_one(item):
+            path, payload = item
+            try:
+                write_fn(path, payload)
+                return path, (payload, os.stat(path), None)
+            except Exception as e:
+                return path, (payload, None, e)
+
+        return dict(self.map(flush_one, writes.items()))
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+def _list_dir(path):
+    files, subdirs = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            (subdirs if entry.is_dir() else files).append(entry.path)
+    return files, subdirs
@@ -0,0 +1,253 @@
+import re
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from array import array
+from pathlib import Path
+
+from image_mapper import IMAGE_CATEGORIES, DEFAULT_JSON_ROOT
+
+# --- Configuration ---
+# Scalar fields kept in memory; everything else stays on disk behind the byte offsets
+STORE_FIELDS = ("chapter", "difficulty", "marks", "answer")
+MISSING_ID = -1
+
+_WS_RE = re.compile(r'[ \t\n\r]*')
+
+def iter_question_spans(raw):
+    """
+    Yields (question, byte_start, byte_end) for every element of a top-level JSON array.
+    Each element is decoded on its own, so only one full question object is alive at a time.
+    """
+    text = raw.decode('utf-8')
+    decoder = json.JSONDecoder()
+    ascii_only = raw.isascii()
+    pos = _WS_RE.match(text, 0).end()
+    if text[pos:pos + 1] != '[':
+        raise ValueError("Top-level JSON value is not a list")
+    pos = _WS_RE.match(text, pos + 1).end()
+    char_mark, byte_mark = 0, 0  # last char position converted to a byte offset
+
+    def byte_offset(char_pos):
+        nonlocal char_mark, byte_mark
+        if ascii_only:
+            return char_pos
+        byte_mark += len(text[char_mark:char_pos].encode('utf-8'))
+        char_mark = char_pos
+        return byte_mark
+
+    if text[pos:pos + 1] == ']':
+        return
+    while True:
+        obj, end = decoder.raw_decode(text, pos)
+        yield obj, byte_offset(pos), byte_offset(end)
+        pos = _WS_RE.match(text, end).end()
+        if text[pos:pos + 1] == ',':
+            pos = _WS_RE.match(text, pos + 1).end()
+        elif text[pos:pos + 1] == ']':
+            return
+        else:
+            raise ValueError(f"Expected ',' or ']' at character {pos}")
+
+class InternedColumn:
+    """One small code per row plus a table of distinct values ("easy", 4, "Chapter 1", ...)."""
+    __slots__ = ("codes", "values", "_lookup")
+
+    def __init__(self):
+        self.codes = array('I')
+        self.values = []
+        self._lookup = {}
+
+    def append(self, value):
+        key = (type(value).__name__, value) if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        code = self._lookup.get(key)
+        if code is None:
+            code = self._lookup[key] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def rows_matching(self, wanted):
+        """Row numbers whose value is in wanted."""
+        codes = {code for code, value in enumerate(self.values) if value in wanted}
+        return [row for row, code in enumerate(self.codes) if code in codes]
+
+class ChapterRef:
+    """One chapter JSON file in the store: data/<exam>/<class>/<subject>/<chapter>.json."""
+    __slots__ = ("path", "exam", "cls", "subject", "chapter", "first_row", "rows")
+
+    def __init__(self, path, rel_parts, first_row):
+        self.path = Path(path)
+        parts = list(rel_parts[:-1]) + [None] * max(0, 4 - len(rel_parts))
+        self.exam, self.cls, self.subject = parts[:3]
+        self.chapter = Path(rel_parts[-1]).stem
+        self.first_row = first_row
+        self.rows = 0
+
+    def key(self):
+        return "/".join(p for p in (self.exam, self.cls, self.subject, self.chapter) if p)
+
+class QuestionStore:
+    """
+    Compact, read-only view of every question in a data tree.
+    Keeps ids, the STORE_FIELDS scalars (interned) and the image lists in flat
+    arrays, plus the byte span of each question in its source file, so text
+    fields (question, solution, options, ...) are read back only on demand.
+    """
+    __slots__ = ("data_root", "chapters", "row_chapter", "ids", "columns", "image_names",
+                 "image_starts", "byte_starts", "byte_ends", "errors")
+
+    def __init__(self, data_root=None):
+        self.data_root = Path(data_root) if data_root else None
+        self.chapters = []                 # ChapterRef per JSON file
+        self.row_chapter = array('I')      # row -> index into chapters
+        self.ids = array('q')              # row -> question id (MISSING_ID if absent)
+        self.columns = {field: InternedColumn() for field in STORE_FIELDS}
+        self.image_names = []              # all image names, flattened
+        # image_starts[row * 3 + k] .. image_starts[row * 3 + k + 1] slices image_names for IMAGE_CATEGORIES[k]
+        self.image_starts = array('I', [0])
+        self.byte_starts = array('Q')
+        self.byte_ends = array('Q')
+        self.errors = []                   # {"json", "error"} for files that could not be loaded
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- Loading ---
+    def add_file(self, json_path, rel_parts=None):
+        """Appends every question of one chapter file. Returns (success, msg)."""
+        json_path = Path(json_path)
+        if rel_parts is None:
+            rel_parts = json_path.relative_to(self.data_root).parts if self.data_root else (json_path.name,)
+        chapter = ChapterRef(json_path, rel_parts, len(self.ids))
+        chapter_index = len(self.chapters)
+        try:
+            with open(json_path, 'rb') as f:
+                raw = f.read()
+            spans = list(self._compact(iter_question_spans(raw)))
+        except Exception as e:
+            self.errors.append({"json": str(json_path), "error": str(e)})
+            return False, f"Error loading {json_path.name}: {e}"
+
+        for q_id, scalars, images, start, end in spans:
+            self.row_chapter.append(chapter_index)
+            self.ids.append(q_id)
+            for field, value in zip(STORE_FIELDS, scalars):
+                self.columns[field].append(value)
+            for names in images:
+                self.image_names.extend(names)
+                self.image_starts.append(len(self.image_names))
+            self.byte_starts.append(start)
+            self.byte_ends.append(end)
+        chapter.rows = len(spans)
+        self.chapters.append(chapter)
+        return True, f"Loaded {len(spans)} questions from {json_path.name}"
+
+    @staticmethod
+    def _compact(spans):
+        """Drops everything but the stored fields as each question is decoded."""
+        for question, start, end in spans:
+            if not isinstance(question, dict):
+                question = {}
+            q_id = question.get("id")
+            yield (q_id if isinstance(q_id, int) else MISSING_ID,
+                   tuple(question.get(field) for field in STORE_FIELDS),
+                   [list(question.get(category) or []) for category in IMAGE_CATEGORIES],
+                   start, end)
+
+    @classmethod
+    def load_tree(cls, data_root):
+        """Loads every chapter JSON under data_root (all exams, classes and subjects)."""
+        store = cls(data_root)
+        for json_file in sorted(Path(data_root).rglob("*.json")):
+            store.add_file(json_file)
+        return store
+
+    # --- Access ---
+    def chapter_of(self, row):
+        return self.chapters[self.row_chapter[row]]
+
+    def images(self, row, category):
+        k = row * len(IMAGE_CATEGORIES) + IMAGE_CATEGORIES.index(category)
+        return self.image_names[self.image_starts[k]:self.image_starts[k + 1]]
+
+    def record(self, row):
+        """The stored fields of one row as a dict (no text fields)."""
+        rec = {"id": self.ids[row] if self.ids[row] != MISSING_ID else None}
+        for field in STORE_FIELDS:
+            rec[field] = self.columns[field][row]
+        for category in IMAGE_CATEGORIES:
+            rec[category] = self.images(row, category)
+        return rec
+
+    def load_question(self, row):
+        """Reads the full question object of a row back from its source file."""
+        with open(self.chapter_of(row).path, 'rb') as f:
+            f.seek(self.byte_starts[row])
+            return json.loads(f.read(self.byte_ends[row] - self.byte_starts[row]).decode('utf-8'))
+
+    def text(self, row, field):
+        """One on-disk-only field (e.g. "question", "solution", "options") of a row."""
+        return self.load_question(row).get(field)
+
+    def find(self, chapter_key, q_id):
+        """Row of question q_id in a chapter ("CET/11/Physics/gravitation"), or None."""
+        for chapter in self.chapters:
+            if chapter.key() == chapter_key:
+                for row in range(chapter.first_row, chapter.first_row + chapter.rows):
+                    if self.ids[row] == q_id:
+                        return row
+        return None
+
+    def select(self, chapter_keys=None, **filters):
+        """
+        Rows matching all filters, e.g. select({"CET/11/Physics/gravitation"}, difficulty={"easy", "Easy"}, marks={4}).
+        Filter values are sets of accepted values for STORE_FIELDS.
+        """
+        rows = None
+        if chapter_keys is not None:
+            wanted = {i for i, c in enumerate(self.chapters) if c.key() in chapter_keys}
+            rows = {row for row, c in enumerate(self.row_chapter) if c in wanted}
+        for field, accepted in filters.items():
+            if field not in self.columns:
+                raise KeyError(f"Unknown store field: {field}")
+            matched = set(self.columns[field].rows_matching(set(accepted)))
+            rows = matched if rows is None else rows & matched
+        return sorted(rows) if rows is not None else list(range(len(self)))
+
+    def stats(self):
+        return {
+            "chapters": len(self.chapters),
+            "questions": len(self),
+            "images": len(self.image_names),
+            "source_bytes": sum(c.path.stat().st_size for c in self.chapters),
+            "distinct": {field: len(col.values) for field, col in self.columns.items()},
+            "errors": len(self.errors),
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load every chapter JSON into a compact question store.")
+    parser.add_argument("--data-root", default=DEFAULT_JSON_ROOT)
+    parser.add_argument("--memory", action="store_true", help="Also measure the store's memory with tracemalloc")
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    store = QuestionStore.load_tree(args.data_root)
+    report = store.stats()
+    report["elapsed_sec"] = round(time.perf_counter() - started, 3)
+    if args.memory:
+        report["memory_bytes"], report["peak_bytes"] = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    for error in store.errors:
+        print(f"Error: {error['json']}: {error['error']}", file=sys.stderr)
+    print(json.dumps(report, indent=4))
+    return 1 if store.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
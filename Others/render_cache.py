@@ -0,0 +1,200 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+
+from PIL import Image
+
+try:
+    import fitz  # PyMuPDF, only needed to pre-render pages
+except ImportError:
+    fitz = None
+
+# --- Configuration ---
+DEFAULT_CACHE_DIR = Path.home() / ".paper_nest" / "render_cache"
+DEFAULT_CACHE_MB = 2048        # LRU size cap for all cached pages
+COMPRESS_LEVEL = 1             # zlib level for tiles (0 = raw, read back zero-copy from the mmap)
+HASH_CHUNK = 1 << 20
+DOCUMENTS_NAME = "documents.json"  # path -> (mtime_ns, size, content hash), so unchanged PDFs are not re-hashed
+PRERENDER_CHUNK = 8            # pages per pre-render task
+# Tile file: magic, width, height, channels (3 RGB / 4 RGBA), compressed flag, then the pixels
+TILE_HEADER = struct.Struct("<4sIIBB2x")
+TILE_MAGIC = b"PNRT"
+TILE_SUFFIX = ".tile"
+
+def tile_name(page_num, zoom):
+    return f"p{page_num:05d}_z{int(round(zoom * 1000)):05d}{TILE_SUFFIX}"
+
+def write_tile(path, image, compress_level=COMPRESS_LEVEL):
+    """Writes a PIL image as a tile (temp file + rename, safe with concurrent writers). Returns the file size."""
+    channels = 4 if image.mode == "RGBA" else 3
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    pixels = image.tobytes()
+    if compress_level:
+        pixels = zlib.compress(pixels, compress_level)
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(TILE_HEADER.pack(TILE_MAGIC, image.width, image.height, channels, 1 if compress_level else 0))
+            f.write(pixels)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+    return TILE_HEADER.size + len(pixels)
+
+def read_tile(path):
+    """
+    Reads a tile through a memory map. Raw tiles are wrapped without copying
+    (the image keeps the map open); compressed ones are inflated straight from it.
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, width, height, channels, compressed = TILE_HEADER.unpack_from(mm, 0)
+    if magic != TILE_MAGIC:
+        mm.close()
+        raise ValueError(f"Not a render tile: {path}")
+    mode = "RGBA" if channels == 4 else "RGB"
+    if compressed:
+        try:
+            return Image.frombytes(mode, (width, height), zlib.decompress(memoryview(mm)[TILE_HEADER.size:]))
+        finally:
+            mm.close()
+    return Image.frombuffer(mode, (width, height), memoryview(mm)[TILE_HEADER.size:], "raw", mode, 0, 1)
+
+def file_hash(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class RenderCache:
+    """
+    Rendered pages on disk under <root>/<PDF content hash>/, one tile per
+    (page, zoom), so a PDF reopened in a later session (or a copy of it under
+    another name) is shown without rendering. Least recently used tiles are
+    deleted once the cache grows past max_mb; a hit refreshes a tile's mtime.
+    """
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_mb=DEFAULT_CACHE_MB, compress_level=COMPRESS_LEVEL):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.compress_level = compress_level
+        self.lock = threading.Lock()
+        self.documents = {}
+        try:
+            with open(self.root / DOCUMENTS_NAME, 'r', encoding='utf-8') as f:
+                self.documents = json.load(f)
+        except (OSError, ValueError):
+            pass
+        self.size = sum(size for _, size, _ in self._tiles())
+
+    def _tiles(self):
+        """(path, size, mtime_ns) of every tile."""
+        tiles = []
+        with os.scandir(self.root) as docs:
+            for doc in docs:
+                if not doc.is_dir():
+                    continue
+                with os.scandir(doc.path) as it:
+                    for entry in it:
+                        if entry.name.endswith(TILE_SUFFIX):
+                            try:
+                                st = entry.stat()
+                            except OSError:
+                                continue
+                            tiles.append((entry.path, st.st_size, st.st_mtime_ns))
+        return tiles
+
+    def document_key(self, pdf_path):
+        """Content hash of a PDF, re-computed only when its size or mtime changed."""
+        pdf_path = str(Path(pdf_path).resolve())
+        st = os.stat(pdf_path)
+        with self.lock:
+            known = self.documents.get(pdf_path)
+        if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+            return known[2]
+        key = file_hash(pdf_path)
+        with self.lock:
+            self.documents[pdf_path] = [st.st_mtime_ns, st.st_size, key]
+            payload = json.dumps(self.documents).encode('utf-8')
+        tmp = self.root / f".{DOCUMENTS_NAME}.{os.getpid()}.tmp"
+        tmp.write_bytes(payload)
+        os.replace(tmp, self.root / DOCUMENTS_NAME)
+        return key
+
+    def tile_path(self, doc_key, page_num, zoom):
+        return self.root / doc_key / tile_name(page_num, zoom)
+
+    def get(self, doc_key, page_num, zoom):
+        path = self.tile_path(doc_key, page_num, zoom)
+        try:
+            image = read_tile(path)
+            os.utime(path)  # LRU: mtime is the last use
+            return image
+        except (OSError, ValueError, zlib.error, struct.error):
+            return None
+
+    def put(self, doc_key, page_num, zoom, image):
+        path = self.tile_path(doc_key, page_num, zoom)
+        path.parent.mkdir(exist_ok=True)
+        try:
+            replaced = path.stat().st_size  # the render thread and a pre-render worker can write the same page
+        except OSError:
+            replaced = 0
+        size = write_tile(path, image, self.compress_level)
+        with self.lock:
+            self.size += size - replaced
+            over = self.size > self.max_bytes
+        if over:
+            self.enforce_cap()
+
+    def enforce_cap(self):
+        """Deletes least recently used tiles until the cache is under 90% of max_bytes."""
+        with self.lock:
+            tiles = sorted(self._tiles(), key=lambda t: t[2])
+            total = sum(size for _, size, _ in tiles)
+            target = self.max_bytes * 0.9 if total > self.max_bytes else total
+            for path, size, _ in tiles:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue  # still mapped (Windows) or already gone
+                total -= size
+            self.size = total
+
+def prerender_pages(pdf_path, doc_key, pages, zoom, root, compress_level=COMPRESS_LEVEL):
+    """
+    Worker-process task: renders pages at zoom into the cache, skipping tiles
+    that already exist. Module-level so it pickles. Returns (rendered, bytes written).
+    """
+    out_dir = Path(root) / doc_key
+    out_dir.mkdir(parents=True, exist_ok=True)
+    doc = fitz.open(pdf_path)
+    rendered, written = 0, 0
+    try:
+        matrix = fitz.Matrix(zoom, zoom)
+        for page_num in pages:
+            path = out_dir / tile_name(page_num, zoom)
+            if path.exists():
+                continue
+            pix = doc.load_page(page_num).get_pixmap(matrix=matrix)
+            image = Image.frombytes("RGB" if pix.alpha == 0 else "RGBA", (pix.width, pix.height), pix.samples)
+            written += write_tile(path, image, compress_level)
+            rendered += 1
+    finally:
+        doc.close()
+    return rendered, written
@@ -0,0 +1,363 @@
+import re
+import csv
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from image_mapper import (DEFAULT_JSON_ROOT, DEFAULT_WORKERS, IMAGE_CATEGORIES, IMAGE_EXTENSIONS, JSON_FORMATS,
+                          ImageMapper, normalize_chapter_name, parse_image_name)
+from paper_index import build_paper_index
+
+try:
+    import openpyxl  # optional, only needed for .xlsx workbooks (.csv works without it)
+except ImportError:
+    openpyxl = None
+
+# --- Configuration ---
+# Header names are matched after lower-casing and turning spaces/dashes into "_"
+HEADER_ALIASES = {
+    "class": "class", "standard": "class", "std": "class",
+    "exam": "exam", "subject": "subject", "chapter": "chapter",
+    "id": "id", "q_id": "id", "question_id": "id",
+    "question": "question", "question_latex": "question_latex",
+    "options": "options", "answer": "answer", "solution": "solution",
+    "difficulty": "difficulty", "marks": "marks",
+    "question_images": "question_images", "option_images": "option_images", "solution_images": "solution_images",
+}
+REQUIRED_COLUMNS = ("exam", "class", "subject", "chapter", "id", "question", "answer", "difficulty", "marks")
+_OPTION_COLUMN_RE = re.compile(r"option_?([a-z]|\d+)")  # option_a .. option_d, option1 .. option4
+OPTION_SEPARATOR = "||"                 # options in one "options" cell
+IMAGE_SEPARATOR_RE = re.compile(r"[,;\n]+")
+DIFFICULTY_LEVELS = ("easy", "medium", "moderate", "hard")  # compared case-insensitively, stored as typed
+MIN_OPTIONS = 2
+IMPORT_BUFFER_ROWS = 2000               # rows held in memory before the biggest chapter is written out
+_HEADER_SEP_RE = re.compile(r"[\s\-]+")
+
+def _header_key(cell):
+    if cell is None:
+        return None
+    key = _HEADER_SEP_RE.sub("_", str(cell).strip().lower())
+    if key in HEADER_ALIASES:
+        return HEADER_ALIASES[key]
+    m = _OPTION_COLUMN_RE.fullmatch(key)
+    if m:
+        return ("option", m[1])
+    return None
+
+# --- Reading ---
+def iter_sheet_rows(path, sheets=None):
+    """
+    Yields (sheet name, row number, tuple of cell values) for every row of a
+    .xlsx workbook (openpyxl read-only mode, one row in memory at a time) or a .csv file.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row_num, row in enumerate(csv.reader(f), 1):
+                yield path.stem, row_num, tuple(row)
+        return
+    if openpyxl is None:
+        raise RuntimeError("openpyxl is not installed (pip install openpyxl); save the sheet as .csv instead")
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            if sheets and ws.title not in sheets:
+                continue
+            for row_num, row in enumerate(ws.iter_rows(values_only=True), 1):
+                yield ws.title, row_num, row
+    finally:
+        wb.close()
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Excel stores every number as a float
+    return str(value).strip()
+
+def _cell_int(value):
+    text = _cell_text(value)
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            number = float(text)
+        except ValueError:
+            return None
+        return int(number) if number.is_integer() else None
+
+def validate_row(cells, defaults=None):
+    """
+    Turns {column: raw cell} into (target, question, images) or raises ValueError.
+    target is (exam, class, subject, chapter); question holds the ImageMapper
+    schema fields; images maps each image category to a list of names.
+    """
+    values = dict(defaults or {})
+    values.update({k: v for k, v in cells.items() if _cell_text(v)})
+    missing = [c for c in REQUIRED_COLUMNS if not _cell_text(values.get(c))]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+
+    q_id = _cell_int(values["id"])
+    if q_id is None or q_id < 0:
+        raise ValueError(f"Invalid id: {_cell_text(values['id'])}")
+    marks = _cell_int(values["marks"])
+    if marks is None or marks < 0:
+        raise ValueError(f"Invalid marks: {_cell_text(values['marks'])}")
+    difficulty = _cell_text(values["difficulty"])
+    if difficulty.lower() not in DIFFICULTY_LEVELS:
+        raise ValueError(f"Invalid difficulty: {difficulty} (expected one of {', '.join(DIFFICULTY_LEVELS)})")
+
+    if "options" in values:
+        options = [o.strip() for o in _cell_text(values["options"]).split(OPTION_SEPARATOR)]
+    else:
+        option_keys = sorted((k for k in values if isinstance(k, tuple)), key=lambda k: (len(k[1]), k[1]))
+        options = [_cell_text(values[k]) for k in option_keys]
+    options = [o for o in options if o]
+    if len(options) < MIN_OPTIONS:
+        raise ValueError(f"Needs at least {MIN_OPTIONS} options, got {len(options)}")
+    answer = _cell_text(values["answer"])
+    letter = answer.rstrip(".").upper()
+    if not (answer in options or (len(letter) == 1 and 0 <= ord(letter) - ord("A") < len(options))
+            or (letter.isdigit() and 1 <= int(letter) <= len(options))):
+        raise ValueError(f"Answer '{answer}' is not an option, option letter or option number")
+
+    images = {}
+    for category in IMAGE_CATEGORIES:
+        names = [n.strip() for n in IMAGE_SEPARATOR_RE.split(_cell_text(values.get(category)))]
+        names = [n for n in names if n]
+        for name in names:
+            if Path(name).suffix.lower() not in IMAGE_EXTENSIONS:
+                raise ValueError(f"{category}: '{name}' is not an image file name")
+            parsed, _ = parse_image_name(name)
+            # Hand-named images are fine, but a conventional name must point at this row
+            if parsed and (parsed["q_id"] != q_id or parsed["category"] != category):
+                raise ValueError(f"{category}: '{name}' belongs to ID {parsed['q_id']} ({parsed['category']})")
+        images[category] = names
+
+    cls = _cell_text(values["class"])
+    target = (_cell_text(values["exam"]).upper(), re.sub(r"\D", "", cls) or cls,
+              _cell_text(values["subject"]), _cell_text(values["chapter"]))
+    question = {
+        "id": q_id,
+        "question": _cell_text(values["question"]),
+        "question_latex": _cell_text(values.get("question_latex")),  # "" keeps the file's value on update
+        "options": options,
+        "answer": answer,
+        "solution": _cell_text(values.get("solution")),
+        "difficulty": difficulty,
+        "marks": marks,
+    }
+    return target, question, images
+
+def resolve_chapter_json(data_root, target, create=False, cache=None):
+    """
+    data_root/<EXAM>/<CLASS>/<Subject>/<Chapter>.json for a row's target.
+    Subject and chapter match existing names loosely ("physics", "3. Error analysis").
+    Returns (json_path, chapter display name) or raises ValueError.
+    """
+    cache = {} if cache is None else cache
+    if target in cache:
+        return cache[target]
+    exam, cls, subject, chapter = target
+    class_dir = Path(data_root) / exam / cls
+    subject_dir = class_dir / subject
+    if class_dir.is_dir():
+        subject_dir = next((d for d in class_dir.iterdir() if d.is_dir() and d.name.lower() == subject.lower()),
+                           subject_dir)
+    norm = normalize_chapter_name(chapter)
+    existing = next((f for f in sorted(subject_dir.glob("*.json")) if normalize_chapter_name(f.stem) == norm), None)
+    if existing is None:
+        if not create:
+            raise ValueError(f"Unknown chapter {exam}/{cls}/{subject}/{chapter} (use --create-chapters to add it)")
+        existing = subject_dir / f"{re.sub(r'[^0-9A-Za-z]+', '_', norm.title()).strip('_')}.json"
+    display = re.sub(r"^[0-9.\s]+", "", chapter).replace("_", " ").strip() or existing.stem.replace("_", " ")
+    cache[target] = (existing, display)
+    return cache[target]
+
+# --- Writing ---
+def upsert_chapter(json_path, chapter_name, rows, dry_run=False, json_format="indent"):
+    """
+    Inserts or updates rows ([(question, images)]) by id in one chapter file and
+    maps their images through ImageMapper.apply_images, then saves once.
+    Module-level so it can run inside a worker process. Returns a result dict.
+    """
+    json_path = Path(json_path)
+    result = {"json": str(json_path), "status": "unchanged", "added": 0, "updated": 0, "unchanged": 0,
+              "images": 0, "message": ""}
+    mapper = ImageMapper(json_format=json_format)
+    created = not json_path.exists()
+    if created:
+        mapper.json_path = json_path
+        mapper.data = []
+        mapper.build_index()
+    else:
+        success, msg = mapper.set_json_path(json_path)
+        if not success:
+            result.update(status="error", message=f"FAILED to load JSON: {msg}")
+            return result
+
+    parsed_list = []
+    for question, images in rows:
+        existing = mapper.get_question(question["id"])
+        if existing is None:
+            # Same key order as the existing chapter files
+            new = {"id": question["id"], "chapter": chapter_name, "question": question["question"],
+                   "question_latex": question["question_latex"] or question["question"], "question_images": [],
+                   "options": question["options"], "option_images": [], "answer": question["answer"],
+                   "solution": question["solution"], "solution_images": [],
+                   "difficulty": question["difficulty"], "marks": question["marks"]}
+            mapper.add_question(new)
+            result["added"] += 1
+        else:
+            # Empty optional cells (solution, question_latex) keep what the file has
+            changes = {k: v for k, v in question.items() if v != "" and existing.get(k) != v}
+            existing.update(changes)
+            result["updated" if changes else "unchanged"] += 1
+        for category, names in images.items():
+            parsed_list.extend({"full_name": name, "q_id": question["id"], "type": "", "category": category,
+                                "num": 0} for name in names)
+
+    result["images"] = sum(1 for success, _ in mapper.apply_images(parsed_list, dry_run=dry_run) if success)
+    if not (result["added"] or result["updated"] or result["images"]):
+        result["message"] = "No changes needed."
+        return result
+    summary = f"{result['added']} added, {result['updated']} updated, {result['images']} images"
+    if dry_run:
+        result.update(status="dry_run", message=f"{summary} (DRY RUN)")
+        return result
+    if created:
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+    success, msg = mapper.save_json()
+    if success:
+        result.update(status="created" if created else "saved", message=f"{summary} -> {json_path.name}")
+    else:
+        result.update(status="error", message=f"ERROR saving {json_path.name}: {msg}")
+    return result
+
+def import_sheet(path, data_root=DEFAULT_JSON_ROOT, sheets=None, defaults=None, create=False, dry_run=False,
+                 workers=DEFAULT_WORKERS, json_format="indent", on_result=None):
+    """
+    Streams question rows from a workbook (or .csv) into the chapter JSONs.
+    A sheet's header row is the first one with "id" and "question" columns;
+    rows before it (titles, notes) are ignored. Invalid rows are reported and
+    skipped. Rows are buffered per chapter and written by a process pool, the
+    biggest chapter first whenever IMPORT_BUFFER_ROWS rows are held.
+    Returns a JSON-serializable report.
+    """
+    started = time.perf_counter()
+    report = {"source": str(path), "dry_run": dry_run, "rows": 0, "imported": 0, "invalid": [],
+              "chapters": [], "totals": {}}
+    chapter_cache = {}
+    buffers = {}   # json_path -> (chapter name, [(question, images)])
+    seen_ids = {}  # json_path -> {id: "sheet!row"}
+    buffered = 0
+    inflight = {}  # json_path -> future, so one chapter is never written by two workers at once
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def collect(result):
+        report["chapters"].append(result)
+        report["totals"][result["status"]] = report["totals"].get(result["status"], 0) + 1
+        if on_result:
+            on_result(result)
+
+    def flush(json_path):
+        nonlocal buffered
+        chapter_name, rows = buffers.pop(json_path)
+        buffered -= len(rows)
+        previous = inflight.pop(json_path, None)
+        if previous is not None:
+            collect(previous.result())
+        if executor is None:
+            collect(upsert_chapter(json_path, chapter_name, rows, dry_run, json_format))
+        else:
+            inflight[json_path] = executor.submit(upsert_chapter, json_path, chapter_name, rows, dry_run, json_format)
+
+    try:
+        columns = {}
+        for sheet, row_num, row in iter_sheet_rows(path, sheets):
+            if not any(_cell_text(c) for c in row):
+                continue
+            if sheet not in columns:
+                keys = [_header_key(c) for c in row]
+                if "id" in keys and "question" in keys:
+                    columns[sheet] = keys
+                continue
+            report["rows"] += 1
+            where = f"{sheet}!{row_num}"
+            cells = {key: value for key, value in zip(columns[sheet], row) if key is not None}
+            try:
+                target, question, images = validate_row(cells, defaults)
+                json_path, chapter_name = resolve_chapter_json(data_root, target, create, chapter_cache)
+                ids = seen_ids.setdefault(json_path, {})
+                if question["id"] in ids:
+                    raise ValueError(f"ID {question['id']} already imported from {ids[question['id']]}")
+                ids[question["id"]] = where
+            except ValueError as e:
+                report["invalid"].append({"row": where, "id": _cell_text(cells.get("id")) or None, "error": str(e)})
+                continue
+            buffers.setdefault(json_path, (chapter_name, []))[1].append((question, images))
+            buffered += 1
+            report["imported"] += 1
+            if buffered >= IMPORT_BUFFER_ROWS:
+                flush(max(buffers, key=lambda p: len(buffers[p][1])))
+        for json_path in list(buffers):
+            flush(json_path)
+        for future in inflight.values():
+            collect(future.result())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    report["sheets"] = list(columns)  # sheets where a header row was found
+    report["elapsed_sec"] = round(time.perf_counter() - started, 3)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import question rows from a workbook (.xlsx) or .csv into chapter JSONs.")
+    parser.add_argument("source", help="Workbook or CSV with one question per row")
+    parser.add_argument("--data-root", default=DEFAULT_JSON_ROOT)
+    parser.add_argument("--sheet", action="append", help="Only import this sheet (repeatable)")
+    parser.add_argument("--exam", help="Default for rows without an exam column")
+    parser.add_argument("--class", dest="cls", help="Default for rows without a class column")
+    parser.add_argument("--subject", help="Default for rows without a subject column")
+    parser.add_argument("--chapter", help="Default for rows without a chapter column")
+    parser.add_argument("--create-chapters", action="store_true", help="Create chapter files that do not exist yet")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--json-format", choices=JSON_FORMATS, default="indent")
+    parser.add_argument("--no-index", action="store_true", help="Do not update the paper-generation index")
+    parser.add_argument("--report", help="Write the JSON report to this path ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    defaults = {k: v for k, v in (("exam", args.exam), ("class", args.cls), ("subject", args.subject),
+                                  ("chapter", args.chapter)) if v}
+
+    def print_result(result):
+        print(f"[{result['status']}] {result['json']}: {result['message']}", file=sys.stderr)
+
+    report = import_sheet(args.source, args.data_root, sheets=args.sheet, defaults=defaults,
+                          create=args.create_chapters, dry_run=args.dry_run, workers=args.workers,
+                          json_format=args.json_format, on_result=print_result)
+    if not report["sheets"]:
+        print("No sheet has a header row with 'id' and 'question' columns.", file=sys.stderr)
+    for row in report["invalid"]:
+        print(f"[invalid] {row['row']} (id {row['id']}): {row['error']}", file=sys.stderr)
+    print(f"Done: {report['imported']}/{report['rows']} rows imported, {len(report['invalid'])} invalid, "
+          f"{report['totals']} in {report['elapsed_sec']}s", file=sys.stderr)
+    if not args.dry_run and not args.no_index and report["totals"].keys() & {"saved", "created"}:
+        report["paper_index"] = build_paper_index(args.data_root)
+        print(report["paper_index"]["message"], file=sys.stderr)
+
+    if args.report == "-":
+        json.dump(report, sys.stdout, indent=4)
+    elif args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    return 1 if report["invalid"] or report["totals"].get("error") or not report["sheets"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The tools are plain modules in Others/, imported the way the scripts import each other
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,82 @@
+import json
+import shutil
+
+import pytest
+from PIL import Image, ImageDraw
+
+from image_dedupe import DUPLICATES_DIR, BKTree, HashIndex, find_duplicate_groups, rewrite_references
+
+CHAPTER = "CET/11/Physics/1. Sound"
+
+@pytest.fixture
+def tree(tmp_path):
+    """data/CET/11/Physics/Sound.json and its image folder."""
+    data, images = tmp_path / "data", tmp_path / "img"
+    (data / "CET" / "11" / "Physics").mkdir(parents=True)
+    (images / CHAPTER).mkdir(parents=True)
+    return data, images
+
+def _image(images, name, text):
+    img = Image.new("RGB", (300, 80), "white")
+    ImageDraw.Draw(img).text((10, 30), text, fill="black")
+    img.save(images / CHAPTER / name)
+
+def _questions(data, questions):
+    path = data / "CET" / "11" / "Physics" / "Sound.json"
+    if questions is not None:
+        path.write_text(json.dumps(questions, indent=4), encoding="utf-8")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def _rewrite(data, images):
+    index = HashIndex(images)
+    index.refresh(workers=1)
+    return rewrite_references(find_duplicate_groups(index.images), data, images)
+
+def test_bktree_finds_items_within_radius():
+    tree = BKTree()
+    for h in (0b0000, 0b0001, 0b0111, 0b1111):
+        tree.add(h, h)
+    assert sorted(tree.query(0b0000, 1)) == [0b0000, 0b0001]
+
+def test_options_differing_in_one_digit_are_not_merged(tree):
+    data, images = tree
+    _image(images, "12_op_1.png", "x = 15 m/s")
+    _image(images, "12_op_2.png", "x = 16 m/s")
+    _questions(data, [{"id": 12, "option_images": ["12_op_1.png", "12_op_2.png"]}])
+    _rewrite(data, images)
+    assert _questions(data, None)[0]["option_images"] == ["12_op_1.png", "12_op_2.png"]
+    assert (images / CHAPTER / "12_op_2.png").exists()
+
+def test_exact_duplicate_of_another_question_is_rewritten_and_moved(tree):
+    data, images = tree
+    _image(images, "5_qu_1.png", "A diagram")
+    shutil.copy(images / CHAPTER / "5_qu_1.png", images / CHAPTER / "7_qu_1.png")
+    _questions(data, [{"id": 5, "question_images": ["5_qu_1.png"]}, {"id": 7, "question_images": ["7_qu_1.png"]}])
+    report = _rewrite(data, images)
+    assert _questions(data, None)[1]["question_images"] == ["5_qu_1.png"]
+    assert report["moved"] == 1
+    assert (images / CHAPTER / DUPLICATES_DIR / "7_qu_1.png").exists()
+
+def test_unreferenced_duplicate_is_left_in_place(tree):
+    # q2_qu_1.png is Q2's only image, not mapped yet: moving it away would lose it.
+    # A referenced pair in the same chapter makes the rewrite save and move files.
+    data, images = tree
+    _image(images, "q1_qu_1.png", "A diagram")
+    shutil.copy(images / CHAPTER / "q1_qu_1.png", images / CHAPTER / "q2_qu_1.png")
+    _image(images, "5_qu_1.png", "Another figure, wider text")
+    shutil.copy(images / CHAPTER / "5_qu_1.png", images / CHAPTER / "7_qu_1.png")
+    _questions(data, [{"id": 1, "question_images": ["q1_qu_1.png"]}, {"id": 2, "question_images": []},
+                      {"id": 5, "question_images": ["5_qu_1.png"]}, {"id": 7, "question_images": ["7_qu_1.png"]}])
+    report = _rewrite(data, images)
+    assert report["moved"] == 1 and report["unreferenced"] == 1
+    assert (images / CHAPTER / "q2_qu_1.png").exists()
+
+def test_nothing_is_moved_when_the_save_fails(tree, monkeypatch):
+    data, images = tree
+    _image(images, "5_qu_1.png", "A diagram")
+    shutil.copy(images / CHAPTER / "5_qu_1.png", images / CHAPTER / "7_qu_1.png")
+    _questions(data, [{"id": 5, "question_images": ["5_qu_1.png"]}, {"id": 7, "question_images": ["7_qu_1.png"]}])
+    monkeypatch.setattr("image_dedupe.ImageMapper.save_json", lambda self: (False, "disk full"))
+    report = _rewrite(data, images)
+    assert report["moved"] == 0 and report["errors"]
+    assert (images / CHAPTER / "7_qu_1.png").exists()
@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from image_mapper import ChapterFolderIndex, MappingManifest, default_manifest_path, discover_pairs, run_batch
+
+OTHERS = Path(__file__).resolve().parent.parent
+
+def _run_without_tk(code, *args):
+    # sys.modules["tkinter"] = None makes every "import tkinter" fail, as on a Python built without Tk
+    prelude = f"import sys; sys.modules['tkinter'] = None; sys.path.insert(0, {str(OTHERS)!r}); "
+    return subprocess.run([sys.executable, "-c", prelude + code, *args], capture_output=True, text=True, cwd=OTHERS)
+
+def test_engine_and_cli_import_without_tk(tmp_path):
+    done = _run_without_tk("import image_mapper, image_dedupe, image_watcher, paper_index; "
+                           "sys.exit(image_mapper.main(sys.argv[1:]))",
+                           "audit", "--data-root", str(tmp_path), "--image-root", str(tmp_path))
+    assert done.returncode == 0, done.stderr
+    assert "Audit:" in done.stderr
+
+def test_watch_options_go_to_the_watcher():
+    done = _run_without_tk("import image_mapper; sys.exit(image_mapper.main(sys.argv[1:]))", "watch", "--help")
+    assert done.returncode == 0, done.stderr
+    assert "--debounce" in done.stdout
+
+def _chapter(tmp_path, images, questions=(1, 2)):
+    """data/CET/11/Physics/Sound.json with the given question IDs, and its image folder holding images."""
+    data, image_root = tmp_path / "data", tmp_path / "img"
+    json_path = data / "CET" / "11" / "Physics" / "Sound.json"
+    json_path.parent.mkdir(parents=True)
+    json_path.write_text(json.dumps([{"id": q} for q in questions], indent=4), encoding="utf-8")
+    folder = image_root / "CET" / "11" / "Physics" / "1. Sound"
+    folder.mkdir(parents=True)
+    for name in images:
+        (folder / name).write_bytes(b"x")
+    return data, image_root, json_path, folder
+
+def _batch(data, image_root):
+    report = run_batch(data, image_root, workers=1, manifest_path=default_manifest_path(data))
+    assert not report["totals"].get("error"), report["files"]
+    return report["files"][0]
+
+def test_manifest_skips_unchanged_chapters_and_maps_only_new_images(tmp_path):
+    data, image_root, json_path, folder = _chapter(tmp_path, ["q1_qu_1.png"])
+    assert _batch(data, image_root)["changes"] == 1
+    assert _batch(data, image_root)["status"] == "up_to_date"
+
+    (folder / "2_so_1.png").write_bytes(b"x")
+    manifest = MappingManifest(default_manifest_path(data))
+    action, known = manifest.plan("CET/11/Physics/Sound.json", json_path, folder)
+    assert (action, sorted(known)) == ("partial", ["q1_qu_1.png"])
+    assert _batch(data, image_root)["changes"] == 1
+    assert json.loads(json_path.read_text(encoding="utf-8")) == [
+        {"id": 1, "question_images": ["q1_qu_1.png"]}, {"id": 2, "solution_images": ["2_so_1.png"]}]
+
+def test_manifest_rehashes_a_touched_json_and_remaps_a_changed_one(tmp_path):
+    data, image_root, json_path, folder = _chapter(tmp_path, ["q1_qu_1.png"])
+    _batch(data, image_root)
+    key = "CET/11/Physics/Sound.json"
+
+    st = json_path.stat()
+    os.utime(json_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))  # touched by a sync client, same bytes
+    assert MappingManifest(default_manifest_path(data)).plan(key, json_path, folder)[0] == "skip"
+
+    json_path.write_text(json.dumps([{"id": 1}, {"id": 2}, {"id": 3}]), encoding="utf-8")
+    assert MappingManifest(default_manifest_path(data)).plan(key, json_path, folder) == ("full", None)
+    assert _batch(data, image_root)["changes"] == 1
+
+def test_folder_index_matches_exact_then_alias_then_fuzzy(tmp_path):
+    subject = tmp_path / "img" / "CET" / "11" / "Physics"
+    for folder in ("1. Sound", "2. Motion in a Plane", "3. Gravitation", "4. Trigonometry 2"):
+        (subject / folder).mkdir(parents=True)
+    aliases = tmp_path / "chapterFolderMap.json"
+    aliases.write_text(json.dumps({"CET|11|Physics|kinematics": "2. Motion in a Plane"}), encoding="utf-8")
+
+    index = ChapterFolderIndex(tmp_path / "img", aliases)
+    matched = index.match_chapters("CET/11/Physics", ["Sound", "Kinematics", "Gravitaton", "Trigonometry_1"])
+    assert {stem: (folder.name, how) for stem, (folder, how) in matched.items()} == {
+        "Sound": ("1. Sound", "exact"),
+        "Kinematics": ("2. Motion in a Plane", "alias"),
+        "Gravitaton": ("3. Gravitation", "fuzzy"),
+    }  # Trigonometry_1 is not fuzzy-matched to a folder with another number
+
+def test_discover_pairs_reports_unmatched_chapters_and_subjects(tmp_path):
+    data, image_root, json_path, folder = _chapter(tmp_path, [])
+    (data / "CET" / "11" / "Physics" / "Optics.json").write_text("[]", encoding="utf-8")
+    (data / "CET" / "12" / "Biology").mkdir(parents=True)
+    (data / "CET" / "12" / "Biology" / "Cell.json").write_text("[]", encoding="utf-8")
+
+    pairs, skipped, inexact = discover_pairs(data, image_root, alias_path=None)
+    assert pairs == [(json_path, folder)]
+    assert inexact == []
+    assert sorted(Path(entry["json"]).name for entry in skipped) == ["Cell.json", "Optics.json"]
@@ -0,0 +1,54 @@
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+from image_optimizer import is_mostly_monochrome, optimize_file, optimize_tree, trim_whitespace
+
+def _line_figure(colors):
+    """A mostly white diagram: thin lines and a label in the given colours."""
+    img = Image.new("RGB", (900, 500), "white")
+    draw = ImageDraw.Draw(img)
+    for k, color in enumerate(colors):
+        draw.line((50, 60 + k * 120, 850, 400 - k * 90), fill=color, width=2)
+        draw.text((60, 20 + k * 150), f"F{k} = 10 N", fill=color)
+    return img
+
+def test_coloured_line_figure_is_not_monochrome():
+    assert not is_mostly_monochrome(_line_figure(["red", "blue"]))
+
+def test_black_line_figure_is_monochrome():
+    assert is_mostly_monochrome(_line_figure(["black", "black"]))
+
+def test_noisy_gray_scan_is_monochrome():
+    rng = random.Random(0)
+    img = _line_figure(["black"])
+    pixels = img.load()
+    for _ in range(20000):
+        x, y = rng.randrange(img.width), rng.randrange(img.height)
+        v = rng.randrange(180, 256)
+        pixels[x, y] = (v, max(0, v - rng.randrange(8)), v)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=60)  # chroma artefacts around the ink
+    assert is_mostly_monochrome(Image.open(buf))
+
+def test_optimize_file_keeps_colour(tmp_path):
+    path = tmp_path / "3_qu_1.png"
+    _line_figure(["red", "blue"]).save(path)
+    result = optimize_file(path)
+    assert result["status"] in ("optimized", "kept")
+    with Image.open(path) as img:
+        colors = {c for _, c in img.convert("RGB").getcolors(1 << 20)}
+    assert (255, 0, 0) in colors and (0, 0, 255) in colors
+
+def test_trim_keeps_padding_around_content():
+    img = Image.new("RGB", (200, 200), "white")
+    ImageDraw.Draw(img).rectangle((50, 60, 100, 120), fill="black")
+    assert trim_whitespace(img, pad=6).size == (51 + 12, 61 + 12)
+
+def test_optimize_tree_skips_dot_folders(tmp_path):
+    (tmp_path / "ch" / ".duplicates").mkdir(parents=True)
+    _line_figure(["black"]).save(tmp_path / "ch" / "1_qu_1.png")
+    _line_figure(["black"]).save(tmp_path / "ch" / ".duplicates" / "2_qu_1.png")
+    report = optimize_tree(tmp_path, workers=1, dry_run=True)
+    assert [r["path"] for r in report["files"]] == [str(tmp_path / "ch" / "1_qu_1.png")]
@@ -0,0 +1,55 @@
+from image_sync import DirectoryTarget, SyncManifest, file_md5, scan_images, sync_images
+
+def _write(root, rel, data):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+def _sync(image_root, target, manifest, **kwargs):
+    report = sync_images(image_root, target, manifest_path=manifest, workers=4, **kwargs)
+    assert not report["errors"], report["errors"]
+    return report
+
+def test_scan_images_skips_dot_folders_and_non_images(tmp_path):
+    _write(tmp_path, "CET/11/Physics/1. Sound/1_qu_1.png", b"a")
+    _write(tmp_path, "CET/11/Physics/1. Sound/.duplicates/2_qu_1.png", b"b")
+    _write(tmp_path, "CET/11/Physics/1. Sound/notes.txt", b"c")
+    assert list(scan_images(tmp_path, "P")) == ["P/CET/11/Physics/1. Sound/1_qu_1.png"]
+
+def test_second_sync_is_a_no_op(tmp_path):
+    images, bucket, manifest = tmp_path / "img", tmp_path / "bucket", tmp_path / "m.json"
+    _write(images, "CET/11/a.png", b"one")
+    _write(images, "CET/11/b.png", b"one")  # same bytes: copied server-side
+    first = _sync(images, DirectoryTarget(bucket), manifest)
+    assert (first["uploaded"], first["copied"]) == (1, 1)
+    second = _sync(images, DirectoryTarget(bucket), manifest)
+    assert (second["hashed"], second["uploaded"], second["copied"], second["unchanged"]) == (0, 0, 0, 2)
+
+def test_copy_source_is_not_a_key_changed_in_the_same_run(tmp_path):
+    # A's old content equals B's new content while A itself gets new bytes in the same run
+    images, bucket, manifest = tmp_path / "img", tmp_path / "bucket", tmp_path / "m.json"
+    a = _write(images, "CET/11/a.png", b"old a")
+    b = _write(images, "CET/11/b.png", b"old b")
+    _sync(images, DirectoryTarget(bucket), manifest)
+
+    a.write_bytes(b"new a, longer")
+    b.write_bytes(b"old a")
+    _sync(images, DirectoryTarget(bucket), manifest)
+
+    prefix = bucket / "Questions_Image_Data" / "CET" / "11"
+    assert (prefix / "a.png").read_bytes() == b"new a, longer"
+    assert (prefix / "b.png").read_bytes() == b"old a"
+    saved = SyncManifest(manifest, DirectoryTarget(bucket).name)
+    saved.load()
+    assert saved.remote["Questions_Image_Data/CET/11/b.png"] == file_md5(prefix / "b.png")
+
+def test_delete_removes_keys_gone_locally(tmp_path):
+    images, bucket, manifest = tmp_path / "img", tmp_path / "bucket", tmp_path / "m.json"
+    gone = _write(images, "CET/11/a.png", b"a")
+    _write(images, "CET/11/b.png", b"b")
+    _sync(images, DirectoryTarget(bucket), manifest)
+    gone.unlink()
+    report = _sync(images, DirectoryTarget(bucket), manifest, delete=True)
+    assert report["deleted"] == 1
+    assert not (bucket / "Questions_Image_Data" / "CET" / "11" / "a.png").exists()
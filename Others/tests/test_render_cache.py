@@ -0,0 +1,56 @@
+import os
+
+from PIL import Image
+
+import render_cache
+from render_cache import RenderCache, read_tile, write_tile
+
+def _image(color, mode="RGB", size=(40, 30)):
+    return Image.new(mode, size, color)
+
+def test_tile_round_trip_raw_and_compressed(tmp_path):
+    for level, mode, color in ((0, "RGB", (10, 20, 30)), (1, "RGB", (200, 0, 0)), (1, "RGBA", (0, 0, 255, 128))):
+        path = tmp_path / f"{level}{mode}.tile"
+        size = write_tile(path, _image(color, mode), level)
+        assert size == path.stat().st_size
+        tile = read_tile(path)
+        assert (tile.mode, tile.size, tile.getpixel((5, 5))) == (mode, (40, 30), color)
+
+def test_overwriting_a_tile_counts_only_the_size_difference(tmp_path, monkeypatch):
+    cache = RenderCache(tmp_path, compress_level=0)
+    evictions = []
+    monkeypatch.setattr(cache, "enforce_cap", lambda: evictions.append(1))
+    cache.put("doc", 0, 1.5, _image((1, 2, 3)))
+    tile_size = cache.tile_path("doc", 0, 1.5).stat().st_size
+    cache.max_bytes = tile_size  # a second copy of the tile would be over the cap
+    cache.put("doc", 0, 1.5, _image((4, 5, 6)))
+    assert cache.size == tile_size
+    assert not evictions
+    assert RenderCache(tmp_path).size == tile_size
+
+def test_enforce_cap_deletes_least_recently_used_tiles(tmp_path):
+    cache = RenderCache(tmp_path, compress_level=0)
+    for page in range(4):
+        cache.put("doc", page, 1.0, _image((page, 0, 0)))
+        os.utime(cache.tile_path("doc", page, 1.0), ns=(page * 10**9, page * 10**9))
+    assert cache.get("doc", 0, 1.0) is not None  # a hit makes page 0 the most recently used
+    tile_size = cache.tile_path("doc", 0, 1.0).stat().st_size
+    cache.max_bytes = 4 * tile_size  # evicts down to 90% of the cap: 3 tiles
+    cache.put("doc", 4, 1.0, _image((4, 0, 0)))
+    kept = sorted(page for page in range(5) if cache.tile_path("doc", page, 1.0).exists())
+    assert kept == [0, 3, 4]
+    assert cache.size == 3 * tile_size
+
+def test_document_key_hashes_a_pdf_once_until_it_changes(tmp_path, monkeypatch):
+    pdf = tmp_path / "paper.pdf"
+    pdf.write_bytes(b"%PDF-1.4 one")
+    hashed = []
+    real_hash = render_cache.file_hash
+    monkeypatch.setattr(render_cache, "file_hash", lambda path: hashed.append(path) or real_hash(path))
+    cache = RenderCache(tmp_path / "cache")
+    key = cache.document_key(pdf)
+    assert RenderCache(tmp_path / "cache").document_key(pdf) == key
+    assert len(hashed) == 1
+    pdf.write_bytes(b"%PDF-1.4 two, edited")
+    assert cache.document_key(pdf) != key
+    assert len(hashed) == 2
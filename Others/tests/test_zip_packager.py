@@ -0,0 +1,58 @@
+import os
+import stat
+import zipfile
+
+from zip_packager import default_zip_path, package_data_zip
+
+def _data_root(tmp_path):
+    data = tmp_path / "data"
+    (data / "CET" / "11").mkdir(parents=True)
+    (data / "CET" / "11" / "Sound.json").write_text('[{"id": 1}]', encoding="utf-8")
+    (data / "CET" / "11" / "Optics.json").write_text('[{"id": 2}]' * 50, encoding="utf-8")
+    (data / "CET" / "11" / ".Sound.json.tmp").write_text("partial write", encoding="utf-8")
+    return data
+
+def _contents(zip_path):
+    with zipfile.ZipFile(zip_path) as zf:
+        return {name: zf.read(name) for name in zf.namelist() if not name.endswith("/")}
+
+def test_package_creates_archive_next_to_the_data_root_without_dot_files(tmp_path):
+    data = _data_root(tmp_path)
+    report = package_data_zip(data)
+    assert report["status"] == "created"
+    assert default_zip_path(data) == tmp_path / "data.zip"
+    assert _contents(tmp_path / "data.zip") == {
+        "data/CET/11/Optics.json": b'[{"id": 2}]' * 50,
+        "data/CET/11/Sound.json": b'[{"id": 1}]',
+    }
+
+def test_package_reuses_unchanged_members_and_drops_removed_ones(tmp_path):
+    data = _data_root(tmp_path)
+    zip_path = tmp_path / "data.zip"
+    package_data_zip(data)
+    os.chmod(zip_path, 0o640)
+
+    again = package_data_zip(data)
+    assert (again["status"], again["reused"], again["recompressed"]) == ("unchanged", 2, 0)
+
+    (data / "CET" / "11" / "Sound.json").write_text('[{"id": 1, "question_images": ["q1_qu_1.png"]}]', encoding="utf-8")
+    (data / "CET" / "11" / "Optics.json").unlink()
+    (data / "CET" / "11" / "Waves.json").write_text("[]", encoding="utf-8")
+    report = package_data_zip(data)
+    assert (report["status"], report["reused"], report["recompressed"], report["removed"]) == ("rebuilt", 0, 2, 1)
+    assert _contents(zip_path) == {
+        "data/CET/11/Sound.json": b'[{"id": 1, "question_images": ["q1_qu_1.png"]}]',
+        "data/CET/11/Waves.json": b"[]",
+    }
+    assert stat.S_IMODE(zip_path.stat().st_mode) == 0o640
+
+def test_reused_members_are_copied_without_recompressing(tmp_path):
+    data = _data_root(tmp_path)
+    zip_path = tmp_path / "data.zip"
+    package_data_zip(data)
+    (data / "CET" / "11" / "Sound.json").write_text('[{"id": 3}]', encoding="utf-8")
+    report = package_data_zip(data)
+    assert (report["reused"], report["recompressed"]) == (1, 1)
+    with zipfile.ZipFile(zip_path) as zf:
+        assert zf.testzip() is None
+        assert zf.read("data/CET/11/Optics.json") == b'[{"id": 2}]' * 50
@@ -0,0 +1,177 @@
+import os
+import copy
+import time
+import shutil
+import struct
+import zlib
+import zipfile
+import tempfile
+from pathlib import Path
+
+# --- Configuration ---
+CHUNK_SIZE = 1 << 20
+SKIP_PREFIXES = (".",)  # temp files from atomic writes, manifests, editor droppings
+NEW_FILE_MODE = 0o644
+_LOCAL_HEADER_SIZE = 30
+_FLAG_DATA_DESCRIPTOR = 0x08
+
+def default_zip_path(data_root):
+    """backend/data/data -> backend/data/data.zip (where zipLoader.js looks first)."""
+    data_root = Path(data_root)
+    return data_root.parent / f"{data_root.name}.zip"
+
+def file_crc32(path):
+    """CRC32 and size of a file, streamed."""
+    crc = 0
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+    return crc, size
+
+def _walk_sources(data_root):
+    """Yields (arcname, path or None for directories) in a stable order."""
+    data_root = Path(data_root)
+    prefix = data_root.name
+    yield f"{prefix}/", None
+    for dirpath, dirnames, filenames in os.walk(data_root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(SKIP_PREFIXES))
+        rel = Path(dirpath).relative_to(data_root).as_posix()
+        base = prefix if rel == "." else f"{prefix}/{rel}"
+        for d in dirnames:
+            yield f"{base}/{d}/", None
+        for name in sorted(filenames):
+            if not name.startswith(SKIP_PREFIXES):
+                yield f"{base}/{name}", Path(dirpath) / name
+
+def _copy_raw_member(src_fp, old_info, dst):
+    """
+    Copies an already-compressed member from the old archive into dst without
+    recompressing it. zipfile has no public API for this, so the local header is
+    written through ZipInfo.FileHeader and the member is registered on dst the
+    same way ZipFile.write does internally.
+    """
+    info = copy.copy(old_info)
+    info.flag_bits &= ~_FLAG_DATA_DESCRIPTOR  # sizes/CRC go in the local header
+    info.extra = b''
+    info.header_offset = dst.fp.tell()
+    dst.fp.write(info.FileHeader())
+
+    src_fp.seek(old_info.header_offset)
+    header = src_fp.read(_LOCAL_HEADER_SIZE)
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    src_fp.seek(name_len + extra_len, os.SEEK_CUR)
+    remaining = old_info.compress_size
+    while remaining:
+        chunk = src_fp.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member {old_info.filename}")
+        dst.fp.write(chunk)
+        remaining -= len(chunk)
+
+    dst.filelist.append(info)
+    dst.NameToInfo[info.filename] = info
+    dst.start_dir = dst.fp.tell()
+
+def package_data_zip(data_root, zip_path=None, compresslevel=None):
+    """
+    Rebuilds data.zip from data_root, reusing the compressed bytes of every
+    member whose CRC32 and size are unchanged and streaming the rest through
+    the compressor. The archive is replaced atomically, and not at all when
+    nothing changed. Returns a JSON-serializable report dict.
+    """
+    started = time.perf_counter()
+    data_root = Path(data_root)
+    zip_path = Path(zip_path) if zip_path else default_zip_path(data_root)
+    report = {
+        "zip": str(zip_path),
+        "status": "unchanged",
+        "reused": 0,
+        "recompressed": 0,
+        "removed": 0,
+        "reused_bytes": 0,        # uncompressed bytes that skipped compression
+        "recompressed_bytes": 0,
+        "old_size": zip_path.stat().st_size if zip_path.exists() else 0,
+        "new_size": 0,
+        "message": "",
+    }
+
+    old_zip = None
+    old_members = {}
+    if zip_path.exists():
+        try:
+            old_zip = zipfile.ZipFile(zip_path, 'r')
+            old_members = {i.filename: i for i in old_zip.infolist() if not i.is_dir()}
+        except zipfile.BadZipFile:
+            old_zip = None
+            old_members = {}
+
+    # 1. Plan: which members can be reused as-is
+    plan = []
+    seen = set()
+    for arcname, path in _walk_sources(data_root):
+        if path is None:
+            plan.append((arcname, None, None))
+            continue
+        seen.add(arcname)
+        crc, size = file_crc32(path)
+        old_info = old_members.get(arcname)
+        reusable = (old_info is not None and old_info.CRC == crc and old_info.file_size == size
+                    and not old_info.flag_bits & 0x01)  # never reuse encrypted members
+        plan.append((arcname, path, old_info if reusable else None))
+
+    report["removed"] = len(set(old_members) - seen)
+    changed = sum(1 for _, path, old in plan if path is not None and old is None)
+    if old_zip and not changed and not report["removed"]:
+        old_zip.close()
+        report["reused"] = len(seen)
+        report["reused_bytes"] = sum(old_members[a].file_size for a in seen)
+        report["new_size"] = report["old_size"]
+        report["message"] = f"{zip_path.name} is up to date."
+        report["elapsed_sec"] = round(time.perf_counter() - started, 3)
+        return report
+
+    # 2. Write the new archive next to the old one, then swap it in
+    fd, tmp_name = tempfile.mkstemp(dir=zip_path.parent, prefix=f".{zip_path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(tmp_name, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as dst:
+            for arcname, path, old_info in plan:
+                if path is None:
+                    dst.writestr(zipfile.ZipInfo(arcname), b'')
+                elif old_info is not None:
+                    _copy_raw_member(old_zip.fp, old_info, dst)
+                    report["reused"] += 1
+                    report["reused_bytes"] += old_info.file_size
+                else:
+                    zinfo = zipfile.ZipInfo.from_file(path, arcname)
+                    zinfo.compress_type = zipfile.ZIP_DEFLATED
+                    with open(path, 'rb') as src, dst.open(zinfo, 'w') as out:
+                        shutil.copyfileobj(src, out, CHUNK_SIZE)
+                    report["recompressed"] += 1
+                    report["recompressed_bytes"] += zinfo.file_size
+        if old_zip:
+            old_zip.close()
+            old_zip = None
+        # mkstemp creates 0600 files; keep the old archive's mode
+        if zip_path.exists():
+            shutil.copymode(zip_path, tmp_name)
+        else:
+            os.chmod(tmp_name, NEW_FILE_MODE)
+        os.replace(tmp_name, zip_path)
+    except BaseException:
+        if old_zip:
+            old_zip.close()
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+    report["status"] = "rebuilt" if report["old_size"] else "created"
+    report["new_size"] = zip_path.stat().st_size
+    report["message"] = (f"{zip_path.name}: {report['recompressed']} recompressed, {report['reused']} reused "
+                         f"({report['reused_bytes']:,} bytes not recompressed), {report['removed']} removed.")
+    report["elapsed_sec"] = round(time.perf_counter() - started, 3)
+    return report